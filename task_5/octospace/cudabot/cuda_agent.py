@@ -312,8 +312,7 @@ def target_direction(ship: Ship, target: Ship):
     for direction in range(4):
         enemy_ships = [target]
         ship_vec = np.array([ship.pos_x, ship.pos_y], dtype=int)
-        target_vec = np.array([target.pos_x, target.pos_y]) + MOVEMENT_DIRECTIONS[direction] * MAX_SHIP_FIRE_RANGE
-        target_vec -= ship_vec
+        target_vec = MOVEMENT_DIRECTIONS[direction] * MAX_SHIP_FIRE_RANGE
         vec_to_other_ships = np.array([(ship.pos_x, ship.pos_y) for ship in enemy_ships], dtype=int)
         vec_to_other_ships = vec_to_other_ships - ship_vec
         vec_angles = [np.arccos(np.clip(np.dot(vec/np.linalg.norm(vec), target_vec/np.linalg.norm(target_vec)), -1.0, 1.0)) if np.linalg.norm(vec) != 0 else 0 for vec in vec_to_other_ships]
@@ -0,0 +1,282 @@
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+from importlib.machinery import SourceFileLoader
+
+import numpy as np
+
+from octospace.envs.octospace import OctoSpaceEnv
+
+"""
+Benchmarks of the engine, run from the directory with the agents:
+    python -m octospace.bench --output=bench.json --baseline=bench_baseline.json
+
+Every scripted agent plays against itself on the same fixed seeds, so the results only depend on the engine:
+    reset_ms: latency of OctoSpaceEnv.reset
+    steps_per_sec: OctoSpaceEnv.step calls per second, the agents' time is measured separately as agent_ms
+    obs_ms: time of building an observation of both players
+    phases_ms: time of every phase of step, per step, measured in separate runs with OctoSpaceEnv(profile=True)
+
+Every metric is the median of n_repeats timed runs and is reported with its spread, the interquartile range of the runs
+relative to the median. Compared with a baseline, a metric regresses when it is worse than the baseline by
+more than the threshold and by more than the spreads of both results together, then the benchmark exits with
+a non-zero status. Only the metrics listed in COMPARED_METRICS are compared, the phases are reported for information
+only, they are too short to be stable.
+"""
+
+# The idle agent, the aggressive bot and the bot, which also sends its ships to explore the map (src/explore_task.py)
+DEFAULT_AGENTS = ["dummy_agent.py", "src/aggro_agent.py", "src/braining_agent.py"]
+
+# Metrics compared with the baseline, with the sign of the change which is an improvement
+COMPARED_METRICS = {"reset_ms": -1, "steps_per_sec": 1, "obs_ms": -1}
+
+
+def _load_agent_class(agent_path: str):
+    module_name = "bench_" + os.path.splitext(os.path.basename(agent_path))[0]
+    return SourceFileLoader(module_name, agent_path).load_module().Agent
+
+
+def _median_and_spread(values: list) -> tuple:
+    """
+    Returns the median of the values and their spread, the interquartile range relative to the median, which unlike
+    the full range isn't blown up by a single disturbed run.
+    """
+    lower, median, upper = np.percentile(values, [25, 50, 75])
+    return float(median), float(upper - lower) / median if median else 0.0
+
+
+def bench_reset(seeds: list, n_repeats: int = 5) -> list:
+    """
+    Returns the latency of reset in milliseconds, the mean over the seeds, in each of n_repeats rounds.
+    """
+    env = OctoSpaceEnv(player_1_id=1, player_2_id=2)
+    env.reset(seed=seeds[0])
+
+    round_times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        for seed in seeds:
+            env.reset(seed=seed)
+        round_times.append((time.perf_counter() - start) / len(seeds) * 1e3)
+    return round_times
+
+
+def _record_games(agent_path: str, seeds: list, n_steps: int):
+    """
+    Plays the agent against itself for at most n_steps steps on every seed.
+    Returns the actions of every game and the mean time of the agents' decisions in milliseconds.
+    """
+    agent_class = _load_agent_class(agent_path)
+    env = OctoSpaceEnv(player_1_id=1, player_2_id=2, max_steps=n_steps)
+
+    games = []
+    agent_time = 0.0
+    for seed in seeds:
+        # The agents draw from the global generators
+        random.seed(seed)
+        np.random.seed(seed)
+        obs, info = env.reset(seed=seed)
+        agents = [agent_class(side=0), agent_class(side=1)]
+
+        game_actions = []
+        for _ in range(n_steps):
+            start = time.perf_counter()
+            # Some agents print their decisions, which would be timed with them
+            with contextlib.redirect_stdout(None):
+                actions = {"player_1": agents[0].get_action(obs["player_1"]),
+                           "player_2": agents[1].get_action(obs["player_2"])}
+            agent_time += time.perf_counter() - start
+
+            game_actions.append(actions)
+            obs, reward, terminated, truncated, info = env.step(actions)
+            if terminated or truncated or sum(reward.values()) != 0:
+                break
+        games.append(game_actions)
+    return games, agent_time / sum(map(len, games)) * 1e3
+
+
+def _time_games(seeds: list, games: list, profile: bool = False) -> dict:
+    """
+    Replays the recorded games and returns the total time of the steps and the observations in seconds,
+    with profile=True also the stats of the phases of step.
+    """
+    env = OctoSpaceEnv(player_1_id=1, player_2_id=2, max_steps=max(map(len, games)), profile=profile)
+    times = {"step": 0.0, "obs": 0.0}
+
+    # Like timeit, the garbage collector is paused, so that its runs don't land in random steps
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for seed, game_actions in zip(seeds, games):
+            env.reset(seed=seed)
+            for actions in game_actions:
+                start = time.perf_counter()
+                env.step(actions)
+                times["step"] += time.perf_counter() - start
+
+                # Observations are built inside step, so they are also timed on their own
+                start = time.perf_counter()
+                env._get_obs()
+                times["obs"] += time.perf_counter() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    if profile:
+        times["stats"] = env.stats()
+    return times
+
+
+def bench_agent(seeds: list, games: list, agent_ms: float, replays: list) -> dict:
+    """
+    Returns the metrics of the agent's recorded games from their timed replays. The metrics are the medians over
+    the replays, their spreads are returned in "spread". The phases are timed in one more replay, so that
+    the profiling doesn't slow down the measured steps.
+    """
+    total_steps = sum(map(len, games))
+    steps_per_sec, steps_per_sec_spread = _median_and_spread([total_steps / times["step"] for times in replays])
+    step_ms, step_ms_spread = _median_and_spread([times["step"] / total_steps * 1e3 for times in replays])
+    obs_ms, obs_ms_spread = _median_and_spread([times["obs"] / total_steps * 1e3 for times in replays])
+    phases = _time_games(seeds, games, profile=True)["stats"]["phases"]
+
+    return {
+        "steps": total_steps,
+        "steps_per_sec": steps_per_sec,
+        "step_ms": step_ms,
+        "obs_ms": obs_ms,
+        "agent_ms": agent_ms,
+        "phases_ms": {phase: phase_stats["total_ms"] / total_steps for phase, phase_stats in phases.items()},
+        "spread": {"steps_per_sec": steps_per_sec_spread, "step_ms": step_ms_spread, "obs_ms": obs_ms_spread},
+    }
+
+
+def run_benchmarks(agent_paths: list, seeds: list, n_steps: int, n_repeats: int = 7) -> dict:
+    """
+    Plays every agent against itself for at most n_steps steps on every seed and returns the results.
+
+    The agents play only once, their actions are recorded and the games are replayed n_repeats times, so that the
+    slow agents don't make the benchmark slow. The repeats of all benchmarks are interleaved: when the machine slows
+    down for a part of the run, it widens the spreads of all metrics instead of shifting some of them.
+    """
+    recorded = {agent_path: _record_games(agent_path, seeds=seeds, n_steps=n_steps) for agent_path in agent_paths}
+
+    reset_times = []
+    replays = {agent_path: [] for agent_path in agent_paths}
+    for _ in range(n_repeats):
+        reset_times += bench_reset(seeds, n_repeats=5)
+        for agent_path, (games, _) in recorded.items():
+            replays[agent_path].append(_time_games(seeds, games))
+
+    reset_ms, reset_spread = _median_and_spread(reset_times)
+    results = {
+        "config": {"agents": agent_paths, "seeds": seeds, "steps": n_steps, "repeats": n_repeats},
+        "platform": {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+                     "processor": platform.processor()},
+        "reset_ms": reset_ms,
+        "reset_spread": reset_spread,
+        "agents": {},
+    }
+    for agent_path, (games, agent_ms) in recorded.items():
+        results["agents"][agent_path] = bench_agent(seeds, games, agent_ms=agent_ms, replays=replays[agent_path])
+    return results
+
+
+def _compared_metrics(results: dict) -> dict:
+    """
+    Returns the compared metrics of the results with their spreads, 0 for the results without one.
+    """
+    metrics = {"reset_ms": (results["reset_ms"], results.get("reset_spread", 0.0))}
+    for agent_path, agent_results in results["agents"].items():
+        for metric in COMPARED_METRICS:
+            if metric in agent_results:
+                metrics[f"{agent_path}:{metric}"] = (agent_results[metric],
+                                                     agent_results.get("spread", {}).get(metric, 0.0))
+    return metrics
+
+
+def compare_results(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Prints the change of every compared metric and returns the names of the metrics, which regressed by more than
+    the threshold (a fraction of the baseline value) and by more than the noise, the spreads of both results together.
+    Metrics missing in either of the results are skipped.
+    """
+    if results["config"] != baseline["config"]:
+        print(f'Warning: the baseline was run with a different configuration {baseline["config"]}')
+
+    current, previous = _compared_metrics(results), _compared_metrics(baseline)
+    regressions = []
+    for name, (value, spread) in current.items():
+        if name not in previous or previous[name][0] == 0:
+            continue
+        previous_value, previous_spread = previous[name]
+        change = (value - previous_value) / previous_value
+        noise = spread + previous_spread
+        regressed = COMPARED_METRICS[name.rsplit(":", 1)[-1]] * change < -max(threshold, noise)
+        print(f'{name}: {previous_value:.4g} -> {value:.4g} ({change:+.1%}, noise +/-{noise:.1%})'
+              f'{" REGRESSION" if regressed else ""}')
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def _print_results(results: dict):
+    print(f'reset: {results["reset_ms"]:.3f} ms (spread {results["reset_spread"]:.1%})')
+    for agent_path, agent_results in results["agents"].items():
+        spread = agent_results["spread"]
+        print(f'{agent_path}: {agent_results["steps_per_sec"]:.1f} steps/s (spread {spread["steps_per_sec"]:.1%}), '
+              f'step {agent_results["step_ms"]:.3f} ms, obs {agent_results["obs_ms"]:.3f} ms '
+              f'(spread {spread["obs_ms"]:.1%}), agents {agent_results["agent_ms"]:.3f} ms')
+        print('    ' + ', '.join(f'{phase} {phase_ms:.3f}' for phase, phase_ms in agent_results["phases_ms"].items()))
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Benchmark the engine with scripted agents')
+    parser.add_argument('--agents', type=str, nargs='+', default=DEFAULT_AGENTS, help="Paths to the agents' files")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2, 3, 4], help='Seeds of the games')
+    parser.add_argument('--steps', type=int, default=500, help='Maximum number of steps of every game')
+    parser.add_argument('--repeats', type=int, default=7,
+                        help='Number of timed replays of every game, the median of them is reported')
+    parser.add_argument('--output', type=str, default=None, help='File, where the results are written as JSON')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Smallest relative change of a metric, which is reported as a regression, larger changes '
+                             'are only reported when they are also beyond the spread of the runs')
+    parser.add_argument('--update_baseline', action='store_true',
+                        help='Write the results to the baseline file instead of comparing with it')
+    return parser
+
+
+if __name__ == '__main__':
+    parse = get_parser()
+    args = parse.parse_args()
+
+    results = run_benchmarks(agent_paths=args.agents, seeds=args.seeds, n_steps=args.steps,
+                             n_repeats=args.repeats)
+    _print_results(results)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline is not None:
+        if args.update_baseline or not os.path.exists(args.baseline):
+            with open(args.baseline, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f'Baseline written to {args.baseline}')
+        else:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            if compare_results(results, baseline, threshold=args.threshold):
+                sys.exit(1)
+
+    """
+    Example execution:
+        python -m octospace.bench --update_baseline --baseline=bench_baseline.json
+        python -m octospace.bench --baseline=bench_baseline.json --threshold=0.05 --output=bench.json
+    """
@@ -1 +1,2 @@
-from octospace.envs.octospace import OctoSpaceEnv
\ No newline at end of file
+from octospace.envs.octospace import OctoSpaceEnv
+from octospace.envs.vector import OctoSpaceVecEnv
@@ -0,0 +1,314 @@
+import numpy as np
+
+from octospace.envs.game_config import (SHIP_DAMAGE, BASE_SHIP_SPEED, IONIZED_FIELD_SPEED_FACTOR, BOARD_SIZE,
+                                        MOVEMENT_DIRECTIONS, SHIP_COST, PLAYER_1_ORIGIN, PLAYER_2_ORIGIN,
+                                        OCCUPATION_SPEED, SHIP_HEALING_SPEED, FIRING_COOLDOWN,
+                                        MOVE_COOLDOWN, ASTEROID_DAMAGE, MAX_RESOURCES, RESOURCE_PRODUCTION_DIVISOR)
+from octospace.envs.game_logic import (PLAYER_KEYS, OWNERSHIP_BITS, VISION_OFFSETS_X, VISION_OFFSETS_Y,
+                                       _get_closest_ships_in_sight, _change_ownership_of_planets)
+from octospace.envs.ships import BatchShipStore
+
+"""
+Batched versions of the game_logic.py phases, which advance N independent games at once.
+
+Per-game state is stacked along the first axis:
+    maps: (N, BOARD_SIZE, BOARD_SIZE)
+    visibility_masks: (N, 2, BOARD_SIZE, BOARD_SIZE)
+    planets_centers: (N, n_planets, 2)
+    planets_lookups: (N, BOARD_SIZE, BOARD_SIZE), see _build_planets_lookup
+    planets_occupation_progress, planets_ongoing_occupation: (N, n_planets)
+    resources, occupied_rf: (N, 2, 4)
+    ships: BatchShipStore with (N, 2, capacity) ship tables
+
+Every phase follows the rules (and their order of resolution) of its game_logic.py counterpart.
+"""
+
+SHIPS_ORIGINS = np.array([PLAYER_1_ORIGIN, PLAYER_2_ORIGIN], dtype=int)
+
+
+def _batch_decode_actions(actions: list, ships: BatchShipStore):
+    """
+    Converts the actions of every game into arrays of valid fire and move commands.
+
+    Like in the single game, a ship executes at most one command per turn: its first fire command if it has any,
+    otherwise its first move command, and only if it exists and has no move cooldown.
+
+    :return: fire commands (games, players, slots, directions) and
+             move commands (games, players, slots, directions, velocities)
+    """
+    fire = ([], [], [], [])
+    move = ([], [], [], [], [])
+    for game, game_actions in enumerate(actions):
+        for player in range(2):
+            fire_commands = {}
+            move_commands = {}
+            for command in game_actions[PLAYER_KEYS[player]]["ships_actions"]:
+                if command[1] == 1:
+                    ship_id, act, direction = command
+                    slot = ships.slot_of(game, player, ship_id)
+                    if slot != -1 and ships.move_cooldown[game, player, slot] == 0:
+                        fire_commands.setdefault(slot, direction)
+                elif command[1] == 0:
+                    ship_id, act, direction, velocity = command
+                    slot = ships.slot_of(game, player, ship_id)
+                    if slot != -1 and ships.move_cooldown[game, player, slot] == 0:
+                        move_commands.setdefault(slot, (direction, velocity))
+
+            for slot, direction in fire_commands.items():
+                for values, value in zip(fire, (game, player, slot, direction)):
+                    values.append(value)
+
+            for slot, (direction, velocity) in move_commands.items():
+                if slot in fire_commands:
+                    continue
+                for values, value in zip(move, (game, player, slot, direction, velocity)):
+                    values.append(value)
+
+    return tuple(np.array(values, dtype=int) for values in fire), tuple(np.array(values, dtype=int) for values in move)
+
+
+def _batch_decrease_cooldowns(ships: BatchShipStore):
+    np.maximum(ships.fire_cooldown - 1, 0, out=ships.fire_cooldown)
+    np.maximum(ships.move_cooldown - 1, 0, out=ships.move_cooldown)
+
+
+def _batch_ship_firing(
+    ships: BatchShipStore,
+    games: np.ndarray,
+    players: np.ndarray,
+    slots: np.ndarray,
+    directions: np.ndarray
+):
+    if len(slots) == 0:
+        return
+
+    # Every shooter is compared with the whole row of the opponent's ships in its game
+    enemies = 1 - players
+    offset_x = ships.x[games, enemies] - ships.x[games, players, slots][:, None]
+    offset_y = ships.y[games, enemies] - ships.y[games, players, slots][:, None]
+    targets = _get_closest_ships_in_sight(offset_x, offset_y, directions, valid=ships.alive[games, enemies])
+
+    ships.fire_cooldown[games, players, slots] = FIRING_COOLDOWN
+
+    hit = targets != -1
+    np.subtract.at(ships.hp, (games[hit], enemies[hit], targets[hit]), SHIP_DAMAGE)
+    ships.facing[games[hit], players[hit], slots[hit]] = directions[hit]
+
+
+def _batch_ship_movement(
+    maps: np.ndarray,
+    ships: BatchShipStore,
+    games: np.ndarray,
+    players: np.ndarray,
+    slots: np.ndarray,
+    directions: np.ndarray,
+    velocities: np.ndarray
+):
+    if len(slots) == 0:
+        return
+
+    ships_x, ships_y = ships.x[games, players, slots], ships.y[games, players, slots]
+
+    # Ships on the ionized fields can travel further
+    max_movement = np.where(maps[games, ships_y, ships_x] == 4,
+                            int(BASE_SHIP_SPEED * IONIZED_FIELD_SPEED_FACTOR), BASE_SHIP_SPEED)
+    velocities = np.clip(velocities, 0, max_movement)
+    movement_vec = MOVEMENT_DIRECTIONS[directions] * velocities[:, None]
+
+    new_x = np.clip(ships_x + movement_vec[:, 0], 0, BOARD_SIZE - 1)
+    new_y = np.clip(ships_y + movement_vec[:, 1], 0, BOARD_SIZE - 1)
+    ships.x[games, players, slots] = new_x
+    ships.y[games, players, slots] = new_y
+    ships.facing[games, players, slots] = directions
+
+    # Ships which stumbled upon asteroid field get a move cooldown
+    asteroids = maps[games, new_y, new_x] == 2
+    ships.move_cooldown[games[asteroids], players[asteroids], slots[asteroids]] = MOVE_COOLDOWN
+    ships.hp[games[asteroids], players[asteroids], slots[asteroids]] -= ASTEROID_DAMAGE
+
+
+def _batch_ship_construction(
+    ships: BatchShipStore,
+    construction: np.ndarray,
+    resources: np.ndarray
+):
+    # As many ships as requested, but no more than the resources allow
+    affordable = np.min(resources // SHIP_COST, axis=2)
+    n_built = np.where(construction > 0, np.minimum(construction, affordable), 0)
+    if not n_built.any():
+        return
+
+    resources -= n_built[:, :, None] * SHIP_COST
+
+    games, players = np.nonzero(n_built)
+    counts = n_built[games, players]
+    games, players = np.repeat(games, counts), np.repeat(players, counts)
+    ships.add(games, players, x=SHIPS_ORIGINS[players, 0], y=SHIPS_ORIGINS[players, 1], facing=0)
+
+
+def _batch_change_ownership_of_planets(
+    maps: np.ndarray,
+    planets_centers: np.ndarray,
+    planets_cells: np.ndarray,
+    planets_rf: np.ndarray,
+    planets_occupation_progress: np.ndarray,
+    occupied_rf: np.ndarray,
+    visibility_masks: np.ndarray
+):
+    """
+    Returns the games, in which some planet changed the owner.
+    """
+    # Captures are rare, so only the games with a pending ownership change run the single game logic
+    centers_values = np.take_along_axis(
+        maps.reshape(len(maps), -1), planets_centers[:, :, 0] * BOARD_SIZE + planets_centers[:, :, 1], axis=1
+    )
+    captured = (((planets_occupation_progress == 0) & (centers_values & 64 != 64)) |
+                ((planets_occupation_progress == 100) & (centers_values & 128 != 128)))
+
+    games = np.flatnonzero(captured.any(axis=1))
+    for game in games:
+        _change_ownership_of_planets(game_map=maps[game], planets_centers=planets_centers[game],
+                                     planets_cells=planets_cells[game], planets_rf=planets_rf[game],
+                                     planets_occupation_progress=planets_occupation_progress[game],
+                                     player_1_occupied_rf=occupied_rf[game, 0], player_2_occupied_rf=occupied_rf[game, 1],
+                                     player_1_visibility_mask=visibility_masks[game, 0],
+                                     player_2_visibility_mask=visibility_masks[game, 1],
+                                     effects=None, turn_on_music=False, volume=0.0)
+    return games
+
+
+def _batch_resource_production(resources: np.ndarray, occupied_rf: np.ndarray):
+    np.clip(resources + occupied_rf // RESOURCE_PRODUCTION_DIVISOR, 0, MAX_RESOURCES, out=resources)
+
+
+def _batch_occupation_progress(
+    planets_occupation_progress: np.ndarray,
+    planets_ongoing_occupation: np.ndarray
+):
+    ongoing = planets_ongoing_occupation != 0
+    planets_occupation_progress[ongoing] = np.clip(
+        planets_occupation_progress[ongoing] + planets_ongoing_occupation[ongoing] * OCCUPATION_SPEED, 0, 100
+    )
+
+    # If the planet got occupied, reset the occupation speed counter
+    occupied = ongoing & ((planets_occupation_progress == 0) | (planets_occupation_progress == 100))
+    planets_ongoing_occupation[occupied] = 0
+
+
+def _batch_ship_land_interaction(
+    maps: np.ndarray,
+    planets_lookups: np.ndarray,
+    planets_occupation_progress: np.ndarray,
+    planets_ongoing_occupation: np.ndarray,
+    ships: BatchShipStore
+):
+    n_planets = planets_occupation_progress.shape[1]
+    for player in range(2):
+        games, slots = np.nonzero(ships.alive[:, player])
+        if len(slots) == 0:
+            continue
+        ships_x, ships_y = ships.x[games, player, slots], ships.y[games, player, slots]
+
+        # Heal the ships, which are on the player's tiles
+        owner_bit = OWNERSHIP_BITS[player]
+        hp = ships.hp[games, player, slots]
+        healed = (maps[games, ships_y, ships_x] & owner_bit == owner_bit) & (hp != 100)
+        ships.hp[games[healed], player, slots[healed]] = np.clip(hp[healed] + SHIP_HEALING_SPEED, 1, 100)
+
+        # Planet within the occupation range of every ship
+        planet_ids = planets_lookups[games, ships_y, ships_x]
+        on_planet = planet_ids != -1
+        if not on_planet.any():
+            continue
+        games, slots, planet_ids = games[on_planet], slots[on_planet], planet_ids[on_planet].astype(int)
+
+        n_ships = np.zeros_like(planets_occupation_progress)
+        np.add.at(n_ships, (games, planet_ids), 1)
+        n_landed = _batch_land_ships(player, n_ships, planets_occupation_progress, planets_ongoing_occupation)
+
+        # The first n_landed ships (in the order of creation) of every planet are used up
+        group = games * n_planets + planet_ids
+        order = np.argsort(group, kind="stable")
+        rank = np.empty(len(group), dtype=int)
+        rank[order] = np.arange(len(group)) - np.searchsorted(group[order], group[order])
+        landed = rank < n_landed[games, planet_ids]
+        ships.remove(games[landed], player, slots[landed])
+
+
+def _batch_land_ships(
+    player: int,
+    n_ships: np.ndarray,
+    planets_occupation_progress: np.ndarray,
+    planets_ongoing_occupation: np.ndarray
+):
+    """
+    Closed form of game_logic._land_ships for all planets of all games at once.
+    Returns the number of ships of the player used up for every planet.
+    """
+    own_progress, enemy_progress, sign = (0, 100, -1) if player == 0 else (100, 0, 1)
+    progress, ongoing = planets_occupation_progress, planets_ongoing_occupation
+
+    landing = n_ships > 0
+    contested = landing & _batch_is_planet_contested(progress, ongoing)
+    unoccupied = landing & ~contested & (progress == -1)
+    enemy = landing & ~contested & (progress == enemy_progress)
+
+    n_landed = np.zeros_like(n_ships)
+
+    # The first ship captures an unoccupied planet or starts a fight for the enemy planet
+    progress[unoccupied] = own_progress
+    progress[enemy] = enemy_progress + sign * OCCUPATION_SPEED
+    ongoing[enemy] += sign
+    n_landed[unoccupied | enemy] = 1
+
+    # Every other ship joins the ongoing fight for the planet
+    joining = landing & _batch_is_planet_contested(progress, ongoing)
+    ongoing[joining] += sign * (n_ships[joining] - n_landed[joining])
+    n_landed[joining] = n_ships[joining]
+    return n_landed
+
+
+def _batch_is_planet_contested(planets_occupation_progress: np.ndarray, planets_ongoing_occupation: np.ndarray):
+    return ((planets_ongoing_occupation != 0) | ((planets_occupation_progress != -1) & (planets_occupation_progress != 0)
+                                                 & (planets_occupation_progress != 100)))
+
+
+def _batch_handle_ship_death(ships: BatchShipStore):
+    games, players, slots = np.nonzero(ships.alive & (ships.hp <= 0))
+    ships.remove(games, players, slots)
+
+
+def _batch_handle_visibility(ships: BatchShipStore, visibility_masks: np.ndarray, unseen_tiles: np.ndarray):
+    """
+    Adds the vision of the ships, which moved since they last added it, like _handle_visibility.
+    unseen_tiles: (N, 2) numbers of the tiles not visible to the players, updated here
+    """
+    games, players, slots = np.nonzero(ships.alive & (unseen_tiles != 0)[:, :, None] &
+                                       ((ships.x != ships.seen_x) | (ships.y != ships.seen_y)))
+    if len(slots) == 0:
+        return
+    ships_x, ships_y = ships.x[games, players, slots], ships.y[games, players, slots]
+    ships.seen_x[games, players, slots] = ships_x
+    ships.seen_y[games, players, slots] = ships_y
+
+    cells_x = ships_x[:, None] + VISION_OFFSETS_X[None, :]
+    cells_y = ships_y[:, None] + VISION_OFFSETS_Y[None, :]
+    on_board = (cells_x >= 0) & (cells_x < BOARD_SIZE) & (cells_y >= 0) & (cells_y < BOARD_SIZE)
+    rows = np.broadcast_to((games * 2 + players)[:, None], on_board.shape)[on_board]
+    cells = (rows * BOARD_SIZE + cells_y[on_board]) * BOARD_SIZE + cells_x[on_board]
+
+    # The vision of different ships may overlap, every revealed tile is counted once
+    flat_masks = visibility_masks.reshape(-1)
+    revealed = np.unique(cells[~flat_masks[cells]])
+    flat_masks[revealed] = True
+    unseen_tiles -= np.bincount(revealed // BOARD_SIZE ** 2, minlength=unseen_tiles.size).reshape(unseen_tiles.shape)
+
+
+def _batch_check_victory_conditions(maps: np.ndarray, planets_centers: np.ndarray):
+    games = np.arange(len(maps))
+    player_1_center = planets_centers[:, 0]
+    player_2_center = planets_centers[:, 1]
+
+    player_1_victory = maps[games, player_2_center[:, 0], player_2_center[:, 1]] & 128 != 128
+    player_2_victory = maps[games, player_1_center[:, 0], player_1_center[:, 1]] & 64 != 64
+    return player_1_victory, player_2_victory
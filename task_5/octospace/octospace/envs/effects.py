@@ -0,0 +1,102 @@
+import numpy as np
+
+"""
+Visual effects produced by the game logic and drained by the renderer.
+
+Short animations (death, firing, capture, space jump) live in a fixed-capacity ring buffer of typed records, when it
+is full the oldest effects are overwritten. Healing effects last as long as the ship stays on its player's tiles,
+so they are kept separately, keyed by (player, ship_id), and removed in O(1) when the ship leaves, lands or dies.
+Memory of the queue stays bounded no matter how long the game runs or how many times it is reset.
+"""
+
+DEATH_EFFECT = 0
+HEALING_EFFECT = 1
+FIRING_EFFECT = 2
+CAPTURE_EFFECT = 3
+SPACE_JUMP_EFFECT = 4
+
+# Number of frames of every effect's animation, in the order of their ids
+EFFECT_FRAMES = np.array([15, 15, 5, 12, 9], dtype=np.int16)
+
+EFFECT_DTYPE = np.dtype([
+    ("kind", np.int8),
+    ("x", np.int16),
+    ("y", np.int16),
+    ("facing", np.int8),        # only used by the firing effect
+    ("frame", np.int16),
+])
+
+MAX_EFFECTS = 1024
+
+
+class EffectsQueue:
+    def __init__(self, capacity: int = MAX_EFFECTS):
+        self.capacity = capacity
+        self._buffer = np.zeros(capacity, dtype=EFFECT_DTYPE)
+        self._start = 0
+        self._size = 0
+
+        # Frame of the healing animation of every healed ship, keyed by (player, ship_id)
+        self.healing = {}
+
+    def __len__(self):
+        return self._size + len(self.healing)
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+        self.healing.clear()
+
+    def add(self, kind: int, x: int, y: int, facing: int = 0):
+        self.add_many(kind, [x], [y], [facing])
+
+    def add_many(self, kind: int, x: np.ndarray, y: np.ndarray, facing: np.ndarray = 0):
+        """
+        Appends effects of one kind at the given positions, overwriting the oldest effects if the queue is full.
+        """
+        x, y, facing = np.broadcast_arrays(np.asarray(x), np.asarray(y), np.asarray(facing))
+        n = len(x)
+        if n == 0:
+            return
+        if n > self.capacity:
+            x, y, facing = x[-self.capacity:], y[-self.capacity:], facing[-self.capacity:]
+            n = self.capacity
+
+        positions = (self._start + self._size + np.arange(n)) % self.capacity
+        effects = self._buffer[positions]
+        effects["kind"] = kind
+        effects["x"] = x
+        effects["y"] = y
+        effects["facing"] = facing
+        effects["frame"] = 0
+        self._buffer[positions] = effects
+
+        overflow = max(self._size + n - self.capacity, 0)
+        self._start = (self._start + overflow) % self.capacity
+        self._size += n - overflow
+
+    def start_healing(self, player: int, ship_id: int):
+        self.healing.setdefault((player, ship_id), 0)
+
+    def stop_healing(self, player: int, ship_id: int):
+        self.healing.pop((player, ship_id), None)
+
+    def active(self) -> np.ndarray:
+        """
+        Returns a copy of the short effects, from the oldest to the newest.
+        """
+        positions = (self._start + np.arange(self._size)) % self.capacity
+        return self._buffer[positions]
+
+    def next_frame(self):
+        """
+        Advances the short effects to the next frame and drops those, whose animation has ended.
+        Healing frames are advanced by the renderer, only for the ships it has drawn.
+        """
+        effects = self.active()
+        effects["frame"] += 1
+        effects = effects[effects["frame"] < EFFECT_FRAMES[effects["kind"]]]
+
+        self._buffer[:len(effects)] = effects
+        self._start = 0
+        self._size = len(effects)
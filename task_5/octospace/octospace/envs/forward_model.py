@@ -0,0 +1,221 @@
+from typing import Optional
+
+import numpy as np
+
+from octospace.envs.batch_logic import (_batch_decrease_cooldowns, _batch_ship_firing, _batch_ship_movement,
+                                        _batch_occupation_progress, _batch_ship_land_interaction,
+                                        _batch_handle_ship_death)
+from octospace.envs.map_generation import _build_planets_lookup
+from octospace.envs.ships import BatchShipStore
+
+"""
+Forward model of the game for the agents, built from a single player's observation.
+
+It advances the ships through the same phases as the game, in the same order and with the same rules, because it
+runs the batch_logic.py phases: cooldowns, firing, movement, occupation progress, land interaction and death.
+Construction, ownership changes, resource production and visibility are left out, an agent can't predict them from
+its observation anyway.
+
+The model only knows what the player sees:
+    - the tiles the player hasn't seen yet are taken for empty space,
+    - only the visible enemy ships and planets take part, the ongoing occupations of the planets are unknown
+      and taken for 0 unless they are given,
+    - the facing of the ships isn't observed, it doesn't affect the game.
+
+Many candidate joint actions are evaluated in a single call: every candidate is played in its own game of the batch,
+so the cost of a call hardly depends on the number of candidates. Commands are given as arrays of
+[command, direction, velocity] rows, one row for every ship in the order of the observation's ship arrays,
+see encode_actions.
+"""
+
+NO_COMMAND = -1
+MOVE_COMMAND = 0
+FIRE_COMMAND = 1
+
+
+def encode_actions(ships_actions: list, ships: np.ndarray) -> np.ndarray:
+    """
+    Converts ships actions in the game's format into an (n_ships, 3) array of [command, direction, velocity] rows
+    for the given ships (allied_ships or enemy_ships of an observation), in their order.
+
+    Like in the game, a ship executes its first fire command if it has any, otherwise its first move command.
+    Commands of the ships, which aren't among the given ones, are ignored.
+    """
+    ships = np.asarray(ships, dtype=int).reshape(-1, 6)
+    rows = {ship_id: row for row, ship_id in enumerate(ships[:, 0].tolist())}
+
+    commands = np.zeros((len(ships), 3), dtype=int)
+    commands[:, 0] = NO_COMMAND
+    for command in ships_actions:
+        row = rows.get(int(command[0]), -1)
+        if row == -1 or commands[row, 0] == FIRE_COMMAND:
+            continue
+        if command[1] == FIRE_COMMAND:
+            commands[row] = (FIRE_COMMAND, command[2], 0)
+        elif command[1] == MOVE_COMMAND and commands[row, 0] == NO_COMMAND:
+            commands[row] = (MOVE_COMMAND, command[2], command[3])
+    return commands
+
+
+class ForwardModel:
+    """
+    A batch of games seen from the point of view of one player.
+
+    A model built from an observation holds a single game. simulate doesn't modify the model, it returns a new one
+    with a game for every candidate, which can be simulated further, for example to look more turns ahead.
+
+    Ships keep the rows of the observation they were built from: the results for allied ship i (enemy ship j) are in
+    column i (j) of the (n_games, n_ships) result arrays, also after it has died or landed on a planet.
+    """
+
+    def __init__(
+        self,
+        observation: dict,
+        player: int,
+        planets_ongoing_occupation: Optional[np.ndarray] = None
+    ):
+        """
+        :param observation: observation of the player
+        :param player: 0 for the 1st player, 1 for the 2nd one
+        :param planets_ongoing_occupation: optional ongoing occupation of the planets in planets_occupation
+        """
+        self.player = player
+
+        game_map = np.array(observation["map"], dtype=int)
+        game_map[game_map == -1] = 0
+        self._map = game_map
+
+        planets = np.asarray(observation["planets_occupation"], dtype=int).reshape(-1, 3)
+        self._planets_lookup = _build_planets_lookup(planets[:, :2])
+        self.planets_occupation_progress = planets[None, :, 2].copy()
+        if planets_ongoing_occupation is None:
+            planets_ongoing_occupation = np.zeros(len(planets), dtype=int)
+        self.planets_ongoing_occupation = np.array(planets_ongoing_occupation, dtype=int).reshape(1, -1)
+
+        player_ships = [None, None]
+        player_ships[player] = np.asarray(observation["allied_ships"], dtype=int).reshape(-1, 6)
+        player_ships[1 - player] = np.asarray(observation["enemy_ships"], dtype=int).reshape(-1, 6)
+        self._n_ships = tuple(len(rows) for rows in player_ships)
+
+        self.ships = BatchShipStore(n_games=1, capacity=max(*self._n_ships, 1))
+        max_id = max(int(rows[:, 0].max(initial=-1)) for rows in player_ships)
+        if max_id >= self.ships._slot_of_id.shape[2]:
+            self.ships._grow_ids(max_id + 1)
+        for row_player, rows in enumerate(player_ships):
+            n = len(rows)
+            for column, field in enumerate(("ship_id", "x", "y", "hp", "fire_cooldown", "move_cooldown")):
+                getattr(self.ships, field)[0, row_player, :n] = rows[:, column]
+            self.ships.alive[0, row_player, :n] = True
+            self.ships._slot_of_id[0, row_player, rows[:, 0]] = np.arange(n)
+            self.ships.size[0, row_player] = n
+
+    @property
+    def n_games(self) -> int:
+        return self.ships.n_games
+
+    def simulate(self, allied_commands: np.ndarray, enemy_commands: Optional[np.ndarray] = None) -> "ForwardModel":
+        """
+        Plays one turn of every candidate and returns the model of the results, with a game for every candidate.
+
+        :param allied_commands: (n_candidates, n_allied_ships, 3) or (n_allied_ships, 3) commands of the player
+        :param enemy_commands: (n_candidates, n_enemy_ships, 3) or (n_enemy_ships, 3) hypothesized commands of the
+            enemy, by default the enemy ships do nothing
+        :return: model with n_candidates games, a model with many games is only simulated with as many candidates
+        """
+        enemy = 1 - self.player
+        if enemy_commands is None:
+            enemy_commands = np.full((self._n_ships[enemy], 3), NO_COMMAND, dtype=int)
+
+        player_commands = [None, None]
+        player_commands[self.player] = np.asarray(allied_commands, dtype=int)
+        player_commands[enemy] = np.asarray(enemy_commands, dtype=int)
+        for player, commands in enumerate(player_commands):
+            if commands.ndim == 2:
+                player_commands[player] = commands = commands[None]
+            if commands.shape[1:] != (self._n_ships[player], 3):
+                raise ValueError(f"Expected commands of shape (n_candidates, {self._n_ships[player]}, 3), "
+                                 f"got {commands.shape}")
+
+        n_candidates = [len(commands) for commands in player_commands]
+        n_games = max(self.n_games, *n_candidates)
+        if any(n not in (1, n_games) for n in (self.n_games, *n_candidates)):
+            raise ValueError(f"Can't simulate {n_candidates} candidates of the players in a model with "
+                             f"{self.n_games} games")
+
+        model = self._branch(n_games)
+        ships = model.ships
+
+        # Commands of every slot, the slots of the ships are the rows of the observation
+        commands = np.full((n_games, 2, ships.capacity, 3), NO_COMMAND, dtype=int)
+        for player, player_command in enumerate(player_commands):
+            commands[:, player, :self._n_ships[player]] = player_command
+
+        _batch_decrease_cooldowns(ships)
+
+        # Like in the game, only the existing ships without a move cooldown execute their command
+        ready = ships.alive & (ships.move_cooldown == 0)
+        games, players, slots = np.nonzero(ready & (commands[..., 0] == FIRE_COMMAND))
+        _batch_ship_firing(ships, games, players, slots, directions=commands[games, players, slots, 1])
+
+        maps = np.broadcast_to(self._map, (n_games, *self._map.shape))
+        games, players, slots = np.nonzero(ready & (commands[..., 0] == MOVE_COMMAND))
+        _batch_ship_movement(maps, ships, games, players, slots, directions=commands[games, players, slots, 1],
+                             velocities=commands[games, players, slots, 2])
+
+        _batch_occupation_progress(model.planets_occupation_progress, model.planets_ongoing_occupation)
+        _batch_ship_land_interaction(
+            maps=maps, planets_lookups=np.broadcast_to(self._planets_lookup, (n_games, *self._planets_lookup.shape)),
+            planets_occupation_progress=model.planets_occupation_progress,
+            planets_ongoing_occupation=model.planets_ongoing_occupation, ships=ships
+        )
+        _batch_handle_ship_death(ships)
+        return model
+
+    def _branch(self, n_games: int) -> "ForwardModel":
+        games = np.zeros(n_games, dtype=int) if self.n_games == 1 else np.arange(n_games)
+        model = ForwardModel.__new__(ForwardModel)
+        model.player = self.player
+        model._map = self._map
+        model._planets_lookup = self._planets_lookup
+        model._n_ships = self._n_ships
+        model.planets_occupation_progress = self.planets_occupation_progress[games]
+        model.planets_ongoing_occupation = self.planets_ongoing_occupation[games]
+        model.ships = self.ships.take(games)
+        return model
+
+    def _alive(self, player: int) -> np.ndarray:
+        return self.ships.alive[:, player, :self._n_ships[player]]
+
+    def _hp(self, player: int) -> np.ndarray:
+        return np.where(self._alive(player), self.ships.hp[:, player, :self._n_ships[player]], 0)
+
+    @property
+    def allied_alive(self) -> np.ndarray:
+        """
+        (n_games, n_allied_ships) mask of the allied ships, which neither died nor landed on a planet.
+        """
+        return self._alive(self.player)
+
+    @property
+    def enemy_alive(self) -> np.ndarray:
+        return self._alive(1 - self.player)
+
+    @property
+    def allied_hp(self) -> np.ndarray:
+        """
+        (n_games, n_allied_ships) health points of the allied ships, 0 for the ships, which are gone.
+        """
+        return self._hp(self.player)
+
+    @property
+    def enemy_hp(self) -> np.ndarray:
+        return self._hp(1 - self.player)
+
+    def allied_ships(self, game: int = 0) -> np.ndarray:
+        """
+        Returns the remaining allied ships of the game in the observation format.
+        """
+        return self.ships.to_array(game, self.player)
+
+    def enemy_ships(self, game: int = 0) -> np.ndarray:
+        return self.ships.to_array(game, 1 - self.player)
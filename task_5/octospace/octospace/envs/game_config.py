@@ -68,6 +68,9 @@ EFFECT_CAPTURE_SIZE = 50
 EFFECT_CAPTURE_ADJUSTMENT = TILE_SIZE//2 - EFFECT_CAPTURE_SIZE//2
 EFFECT_SPACE_JUMP_SIZE = 40
 EFFECT_SPACE_JUMP_ADJUSTMENT = TILE_SIZE//2 - EFFECT_SPACE_JUMP_SIZE//2
+N_LAND_SPRITES = 13
+N_ASTEROID_SPRITES = 12
+N_IONIZED_FIELD_FRAMES = 12
 
 """
 Each map field is coded on 8 bits.
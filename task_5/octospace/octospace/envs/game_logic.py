@@ -2,240 +2,194 @@ import numpy as np
 
 from octospace.envs.game_config import (MAX_SHIP_FIRE_RANGE, SHIP_DAMAGE, BASE_SHIP_SPEED,
                          IONIZED_FIELD_SPEED_FACTOR, BOARD_SIZE, MOVEMENT_DIRECTIONS, SHIP_COST, PLAYER_1_ORIGIN, \
-    PLAYER_2_ORIGIN, OCCUPATION_SPEED, SHIP_HEALING_SPEED, SHIP_OCCUPATION_RANGE, FIRING_COOLDOWN, MOVE_COOLDOWN,
+    PLAYER_2_ORIGIN, OCCUPATION_SPEED, SHIP_HEALING_SPEED, FIRING_COOLDOWN, MOVE_COOLDOWN,
                          ASTEROID_DAMAGE, VISION_RANGE, VISION_ADD_MASK)
-from octospace.envs.schemes import PLANET_MASK
+from octospace.envs.effects import (EffectsQueue, DEATH_EFFECT, FIRING_EFFECT, CAPTURE_EFFECT,
+                                    SPACE_JUMP_EFFECT)
+from octospace.envs.ships import ShipStore
 from octospace.envs.sound import play_space_jump_sound, play_capture_sound, play_ship_explosion_sound, play_shoot_sound
 
 
-player_1_ships_next_id = 1
-player_2_ships_next_id = 1
+PLAYER_KEYS = ("player_1", "player_2")
 
+# Bit marking the tiles owned by the given player
+OWNERSHIP_BITS = (64, 128)
 
-def _ship_firing(
-    actions: dict,
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
-    effects: list,
-    turn_on_music: bool,
-    volume: float,
-    ship_1_actions: list,
-    ship_2_actions: list
-):
-    for command in actions["player_1"]["ships_actions"]:
-        if command[1] == 1:
-            ship_id, act, direction = command
-
-            # If there is not such ship or the ship has an active firing cooldown
-            if ship_id not in player_1_ships.keys() or player_1_ships[ship_id][4] > 0 or ship_id not in ship_1_actions:
-                continue
+# Offsets of all tiles revealed by a ship, relative to its position
+VISION_OFFSETS_Y, VISION_OFFSETS_X = np.nonzero(VISION_ADD_MASK)
+VISION_OFFSETS_Y = VISION_OFFSETS_Y - VISION_RANGE
+VISION_OFFSETS_X = VISION_OFFSETS_X - VISION_RANGE
 
-            ship_1_actions.pop(ship_1_actions.index(ship_id))
 
-            # Play shoot sound
-            if turn_on_music:
-                play_shoot_sound(volume=volume)
-
-            target_id = _get_target(
-                ship_x=player_1_ships[ship_id][0],
-                ship_y=player_1_ships[ship_id][1],
-                direction=direction,
-                player=0,
-                player_1_ships=player_1_ships,
-                player_2_ships=player_2_ships
-            )
-
-            effects.append([2, player_1_ships[ship_id][0], player_1_ships[ship_id][1], player_1_ships_facing[ship_id], 0])
-            player_1_ships[ship_id][3] = FIRING_COOLDOWN    # Set firing cooldown for this ship
+def _decode_actions(
+    actions: dict,
+    player_1_ships: ShipStore,
+    player_2_ships: ShipStore
+):
+    """
+    Converts the actions of both players into arrays of valid fire and move commands, in a single pass over them.
 
-            if target_id == -1:
-                continue
-            player_2_ships[target_id][2] -= SHIP_DAMAGE  # Damage the enemy ship
-            player_1_ships_facing[ship_id] = direction
+    A ship executes at most one command per turn: its first fire command if it has any, otherwise its first move
+    command, and only if it exists and has no move cooldown.
 
-    for command in actions["player_2"]["ships_actions"]:
-        if command[1] == 1:
-            ship_id, act, direction = command
+    :return: for both players fire commands (slots, directions) and move commands (slots, directions, velocities)
+    """
+    fire_commands = []
+    move_commands = []
+    for player, ships in enumerate((player_1_ships, player_2_ships)):
+        # Ordered by the first valid command of every ship
+        fire = {}
+        move = {}
+        for command in actions[PLAYER_KEYS[player]]["ships_actions"]:
+            if command[1] == 1:
+                ship_id, act, direction = command
+                slot = ships.slot_of(ship_id)
+                if slot != -1 and ships.move_cooldown[slot] == 0:
+                    fire.setdefault(slot, direction)
+            elif command[1] == 0:
+                ship_id, act, direction, velocity = command
+                slot = ships.slot_of(ship_id)
+                if slot != -1 and ships.move_cooldown[slot] == 0:
+                    move.setdefault(slot, (direction, velocity))
+
+        for slot in fire:
+            move.pop(slot, None)
+
+        fire_commands.append((np.fromiter(fire.keys(), dtype=int, count=len(fire)),
+                              np.fromiter(fire.values(), dtype=int, count=len(fire))))
+        move_commands.append((np.fromiter(move.keys(), dtype=int, count=len(move)),
+                              np.array([direction for direction, velocity in move.values()], dtype=int),
+                              np.array([velocity for direction, velocity in move.values()], dtype=int)))
+    return fire_commands, move_commands
 
-            # If there is not such ship or the ship has an active firing cooldown
-            if ship_id not in player_2_ships.keys() or player_2_ships[ship_id][4] > 0 or ship_id not in ship_2_actions:
-                continue
 
-            ship_2_actions.pop(ship_2_actions.index(ship_id))
+def _ship_firing(
+    player_1_ships: ShipStore,
+    player_2_ships: ShipStore,
+    fire_commands: list,
+    effects: EffectsQueue,
+    turn_on_music: bool,
+    volume: float
+):
+    for player, ships, enemy_ships in ((0, player_1_ships, player_2_ships), (1, player_2_ships, player_1_ships)):
+        shooters_slots, directions = fire_commands[player]
+        if len(shooters_slots) == 0:
+            continue
 
-            # Play shoot sound
-            if turn_on_music:
-                play_shoot_sound(volume=volume)
+        # Play shoot sound
+        if turn_on_music:
+            play_shoot_sound(volume=volume)
 
-            target_id = _get_target(
-                ship_x=player_2_ships[ship_id][0],
-                ship_y=player_2_ships[ship_id][1],
-                direction=direction,
-                player=1,
-                player_1_ships=player_1_ships,
-                player_2_ships=player_2_ships
-            )
+        target_slots = _get_targets(
+            ships_x=ships.x[shooters_slots],
+            ships_y=ships.y[shooters_slots],
+            directions=directions,
+            enemy_ships=enemy_ships
+        )
 
-            effects.append([2, player_2_ships[ship_id][0], player_2_ships[ship_id][1], player_2_ships_facing[ship_id], 0])
-            player_2_ships[ship_id][3] = FIRING_COOLDOWN
+        if effects is not None:
+            effects.add_many(FIRING_EFFECT, ships.x[shooters_slots], ships.y[shooters_slots],
+                             ships.facing[shooters_slots])
+        ships.fire_cooldown[shooters_slots] = FIRING_COOLDOWN    # Set firing cooldown for these ships
 
-            if target_id == -1:
-                continue
-            player_1_ships[target_id][2] -= SHIP_DAMAGE
-            player_2_ships_facing[ship_id] = direction
+        # Damage the enemy ships, a single ship may be hit by many shooters
+        hit = target_slots != -1
+        np.subtract.at(enemy_ships.hp, target_slots[hit], SHIP_DAMAGE)
+        ships.facing[shooters_slots[hit]] = directions[hit]
 
 
 def _handle_ship_death(
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
-    effects: list,
+    player_1_ships: ShipStore,
+    player_2_ships: ShipStore,
+    effects: EffectsQueue,
     turn_on_music: bool,
     volume: float
 ):
-    for ship_id in list(player_1_ships.keys()):
+    for player, ships in enumerate((player_1_ships, player_2_ships)):
         # If the damaged ship's health points are below 0, then remove it from the board
-        if player_1_ships[ship_id][2] <= 0:
-            _delete_ship(player_1_ships=player_1_ships, player_2_ships=player_2_ships, player_1_ships_facing=player_1_ships_facing,
-                         player_2_ships_facing=player_2_ships_facing, player=0, ship_id=ship_id, turn_on_music=turn_on_music,
-                         volume=volume, effects=effects)
+        dead_slots = np.flatnonzero(ships.alive[:ships.size] & (ships.hp[:ships.size] <= 0))
+        if len(dead_slots) == 0:
+            continue
 
-    for ship_id in list(player_2_ships.keys()):
-        # If the damaged ship's health points are below 0, then remove it from the board
-        if player_2_ships[ship_id][2] <= 0:
-            _delete_ship(player_1_ships=player_1_ships, player_2_ships=player_2_ships,
-                         player_1_ships_facing=player_1_ships_facing,
-                         player_2_ships_facing=player_2_ships_facing, player=1, ship_id=ship_id,
-                         turn_on_music=turn_on_music,
-                         volume=volume, effects=effects)
+        _delete_ships(ships=ships, player=player, slots=dead_slots, effects=effects)
+
+        if turn_on_music:
+            play_ship_explosion_sound(volume=volume)
 
 
 def _ship_movement(
     game_map: np.ndarray,
-    actions: dict,
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
-    effects: list,
+    player_1_ships: ShipStore,
+    player_2_ships: ShipStore,
+    move_commands: list,
+    effects: EffectsQueue,
     turn_on_music: bool,
-    volume: float,
-    ship_1_actions: list,
-    ship_2_actions: list
+    volume: float
 ):
-    for command in actions["player_1"]["ships_actions"]:
-        if command[1] == 0:
-            ship_id, act, direction, velocity = command
-            if ship_id not in player_1_ships.keys() or player_1_ships[ship_id][4] > 0 or ship_id not in ship_1_actions:
-                continue
-
-            ship_1_actions.pop(ship_1_actions.index(ship_id))
-            ship_x, ship_y = player_1_ships[ship_id][0], player_1_ships[ship_id][1]
-
-            # Calculate max distance the ship can travel
-            max_movement = BASE_SHIP_SPEED
-            if game_map[ship_y, ship_x] == 4:
-                max_movement = int(max_movement * IONIZED_FIELD_SPEED_FACTOR)
-                if velocity == max_movement:
-                    effects.append([4, ship_x, ship_y, 0])
-                    if turn_on_music:
-                        play_space_jump_sound(volume=volume)
-
-            # If it's too far, then clip it to the maximum speed for the ship
-            velocity = np.clip(velocity, 0, max_movement)
-            movement_vec = MOVEMENT_DIRECTIONS[direction] * velocity
-
-            # Move the ship in that direction
-            player_1_ships[ship_id][0] = np.clip(player_1_ships[ship_id][0] + movement_vec[0], 0, BOARD_SIZE - 1)
-            player_1_ships[ship_id][1] = np.clip(player_1_ships[ship_id][1] + movement_vec[1], 0, BOARD_SIZE - 1)
-
-            # Update ship's direction
-            player_1_ships_facing[ship_id] = direction
-
-            # If the ship stumbled upon asteroid field, add a move cooldown
-            if game_map[player_1_ships[ship_id][1], player_1_ships[ship_id][0]] == 2:
-                player_1_ships[ship_id][4] = MOVE_COOLDOWN
-                player_1_ships[ship_id][2] -= ASTEROID_DAMAGE
-
-            # If the ship entered one of player's tiles, start the healing effect
-            if game_map[player_1_ships[ship_id][1], player_1_ships[ship_id][0]] & 64 == 64 and game_map[ship_y, ship_x] & 64 != 64:
-                effects.append([1, 0, ship_id, 0])
-
-            # If the ship left player's tile, stop the healing effect
-            if game_map[player_1_ships[ship_id][1], player_1_ships[ship_id][0]] & 64 != 64 and game_map[ship_y, ship_x] & 64 == 64:
-                _delete_healing_effect(0, ship_id, effects)
-
-    for command in actions["player_2"]["ships_actions"]:
-        if command[1] == 0:
-            ship_id, act, direction, velocity = command
-            if ship_id not in player_2_ships.keys() or player_2_ships[ship_id][4] > 0 or ship_id not in ship_2_actions:
-                continue
-
-            ship_2_actions.pop(ship_2_actions.index(ship_id))
-            ship_x, ship_y = player_2_ships[ship_id][0], player_2_ships[ship_id][1]
-
-            # Calculate max distance the ship can travel
-            max_movement = BASE_SHIP_SPEED
-            if game_map[ship_y, ship_x] == 4:
-                max_movement = int(max_movement * IONIZED_FIELD_SPEED_FACTOR)
-                if velocity == max_movement:
-                    effects.append([4, ship_x, ship_y, 0])
-                    if turn_on_music:
-                        play_space_jump_sound(volume=volume)
-
-            # If it's too far, then don't do anything
-            velocity = np.clip(velocity, 0, max_movement)
-            movement_vec = MOVEMENT_DIRECTIONS[direction] * velocity
-
-            # Move the ship in that direction
-            player_2_ships[ship_id][0] = np.clip(player_2_ships[ship_id][0] + movement_vec[0], 0, BOARD_SIZE - 1)
-            player_2_ships[ship_id][1] = np.clip(player_2_ships[ship_id][1] + movement_vec[1], 0, BOARD_SIZE - 1)
-
-            # Update ship's direction
-            player_2_ships_facing[ship_id] = direction
-
-            # If the ship stumbled upon asteroid field, add a move cooldown
-            if game_map[player_2_ships[ship_id][1], player_2_ships[ship_id][0]] == 2:
-                player_2_ships[ship_id][4] = MOVE_COOLDOWN
-                player_2_ships[ship_id][2] -= ASTEROID_DAMAGE
-
-            # If the ship entered one of player's tiles, start the healing effect
-            if game_map[player_2_ships[ship_id][1], player_2_ships[ship_id][0]] & 128 == 128 and game_map[ship_y, ship_x] & 128 != 128:
-                effects.append([1, 1, ship_id, 0])
-
-            # If the ship left player's tile, stop the healing effect
-            if game_map[player_2_ships[ship_id][1], player_2_ships[ship_id][0]] & 128 != 128 and game_map[ship_y, ship_x] & 128 == 128:
-                _delete_healing_effect(1, ship_id, effects)
+    for player, ships in enumerate((player_1_ships, player_2_ships)):
+        slots, directions, velocities = move_commands[player]
+        if len(slots) == 0:
+            continue
+
+        ships_x, ships_y = ships.x[slots], ships.y[slots]
+
+        # Calculate max distance the ships can travel, ships on the ionized fields can travel further
+        on_ionized_field = game_map[ships_y, ships_x] == 4
+        max_movement = np.where(on_ionized_field, int(BASE_SHIP_SPEED * IONIZED_FIELD_SPEED_FACTOR), BASE_SHIP_SPEED)
+        jumped = on_ionized_field & (velocities == max_movement)
+
+        # If it's too far, then clip it to the maximum speed for the ship
+        movement_vec = MOVEMENT_DIRECTIONS[directions] * np.clip(velocities, 0, max_movement)[:, None]
+
+        # Move the ships in those directions
+        new_x = ships.x[slots] = np.clip(ships_x + movement_vec[:, 0], 0, BOARD_SIZE - 1)
+        new_y = ships.y[slots] = np.clip(ships_y + movement_vec[:, 1], 0, BOARD_SIZE - 1)
+
+        # Update ships' direction
+        ships.facing[slots] = directions
+
+        # If the ship stumbled upon asteroid field, add a move cooldown
+        asteroids = slots[game_map[new_y, new_x] == 2]
+        ships.move_cooldown[asteroids] = MOVE_COOLDOWN
+        ships.hp[asteroids] -= ASTEROID_DAMAGE
+
+        if turn_on_music and jumped.any():
+            play_space_jump_sound(volume=volume)
+
+        if effects is None:
+            continue
+
+        effects.add_many(SPACE_JUMP_EFFECT, ships_x[jumped], ships_y[jumped])
+
+        owner_bit = OWNERSHIP_BITS[player]
+        was_owned = game_map[ships_y, ships_x] & owner_bit == owner_bit
+        is_owned = game_map[new_y, new_x] & owner_bit == owner_bit
+
+        # If the ship entered one of player's tiles, start the healing effect
+        for ship_id in ships.ship_id[slots[is_owned & ~was_owned]].tolist():
+            effects.start_healing(player, ship_id)
+
+        # If the ship left player's tile, stop the healing effect
+        for ship_id in ships.ship_id[slots[was_owned & ~is_owned]].tolist():
+            effects.stop_healing(player, ship_id)
 
 
 def _ship_construction(
     actions: dict,
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
+    player_1_ships: ShipStore,
+    player_2_ships: ShipStore,
     player_1_resources: np.ndarray,
     player_2_resources: np.ndarray,
 
 ):
-    if actions["player_1"]["construction"] > 0:
-        for i in range(actions["player_1"]["construction"]):
-            if np.all([player_1_resources[i] >= SHIP_COST[i] for i in range(4)]):
-                new_ship_id = _get_player_next_id(0)
-                player_1_ships[new_ship_id] = [PLAYER_1_ORIGIN[0], PLAYER_1_ORIGIN[1], 100, 0, 0]
-                player_1_ships_facing[new_ship_id] = 0
-                player_1_resources -= SHIP_COST
-
-    if actions["player_2"]["construction"] > 0:
-        for i in range(actions["player_2"]["construction"]):
-            if np.all([player_2_resources[i] >= SHIP_COST[i] for i in range(4)]):
-                new_ship_id = _get_player_next_id(1)
-                player_2_ships[new_ship_id] = [PLAYER_2_ORIGIN[0], PLAYER_2_ORIGIN[1], 100, 0, 0]
-                player_2_ships_facing[new_ship_id] = 0
-                player_2_resources -= SHIP_COST
+    for player, ships, resources, origin in ((0, player_1_ships, player_1_resources, PLAYER_1_ORIGIN),
+                                             (1, player_2_ships, player_2_resources, PLAYER_2_ORIGIN)):
+        construction = actions[PLAYER_KEYS[player]]["construction"]
+        if construction > 0:
+            for i in range(construction):
+                if np.all(resources >= SHIP_COST):
+                    ships.add(x=origin[0], y=origin[1])
+                    resources -= SHIP_COST
 
 
 def _occupation_progress(
@@ -256,199 +210,215 @@ def _occupation_progress(
 def _change_ownership_of_planets(
     game_map: np.ndarray,
     planets_centers: np.ndarray,
+    planets_cells: np.ndarray,
+    planets_rf: np.ndarray,
     planets_occupation_progress: np.ndarray,
     player_1_occupied_rf: np.ndarray,
     player_2_occupied_rf: np.ndarray,
     player_1_visibility_mask: np.ndarray,
     player_2_visibility_mask: np.ndarray,
-    effects: list,
+    effects: EffectsQueue,
     turn_on_music: bool,
     volume: float
 ):
+    """
+    Returns the ids of the planets, which changed the owner.
+    The planets' tiles and resource fields come from _build_planets_index.
+    """
+    # View of the map, through which the planets' tiles are updated
+    flat_map = game_map.reshape(-1)
+
+    captured = []
     for e, center in enumerate(planets_centers):
         if planets_occupation_progress[e] == 0 and game_map[center[0], center[1]] & 64 != 64:
-            map_mask = np.zeros((BOARD_SIZE, BOARD_SIZE))
-            map_mask[center[0] - 4: center[0] + 5, center[1] - 4: center[1] + 5] = PLANET_MASK
-
             # If the planet was already occupied by the other player, delete his ownership
             if game_map[center[0], center[1]] & 128 == 128:
-                game_map[map_mask.astype(bool)] -= 128
-
-            val, rf_cnt = np.unique(game_map[center[0] - 4: center[0] + 5, center[1] - 4: center[1] + 5],
-                                    return_counts=True)
-            rf_counts = dict(zip(val, rf_cnt))
-            try:
-                rf_counts = np.array([rf_counts[9], rf_counts[17], rf_counts[25], rf_counts[57]])
-            except KeyError:
-                print(val, rf_cnt)
-                exit()
+                flat_map[planets_cells[e]] -= 128
 
             if game_map[center[1], center[0]] & 128 == 128:
-                player_2_occupied_rf -= rf_counts
+                player_2_occupied_rf -= planets_rf[e]
 
-            player_1_occupied_rf += rf_counts
+            player_1_occupied_rf += planets_rf[e]
 
             # Add planet ownership to player_1
-            game_map[map_mask.astype(bool)] |= 64
+            flat_map[planets_cells[e]] |= 64
 
             # Add capture effect
-            effects.append([3, center[1], center[0], 0])
+            if effects is not None:
+                effects.add(CAPTURE_EFFECT, center[1], center[0])
             if turn_on_music:
                 play_capture_sound(volume=volume)
 
             # Add area around the planet to the player's visibility mask
             _add_planet_visibility(center[1], center[0], player_1_visibility_mask)
+            captured.append(e)
 
         elif planets_occupation_progress[e] == 100 and game_map[center[0], center[1]] & 128 != 128:
-            map_mask = np.zeros((BOARD_SIZE, BOARD_SIZE))
-            map_mask[center[0] - 4: center[0] + 5, center[1] - 4: center[1] + 5] = PLANET_MASK
-
             # If the planet was already occupied by the other player, delete his ownership
             if game_map[center[0], center[1]] & 64 == 64:
-                game_map[map_mask.astype(bool)] -= 64
-
-            val, rf_cnt = np.unique(game_map[center[0] - 4: center[0] + 5, center[1] - 4: center[1] + 5],
-                                    return_counts=True)
-            rf_counts = dict(zip(val, rf_cnt))
-            rf_counts = np.array([rf_counts[9], rf_counts[17], rf_counts[25], rf_counts[57]])
+                flat_map[planets_cells[e]] -= 64
 
             if game_map[center[1], center[0]] & 64 == 64:
-                player_1_occupied_rf -= rf_counts
+                player_1_occupied_rf -= planets_rf[e]
 
-            player_2_occupied_rf += rf_counts
+            player_2_occupied_rf += planets_rf[e]
 
             # Add planet ownership to player_2
-            game_map[map_mask.astype(bool)] |= 128
+            flat_map[planets_cells[e]] |= 128
 
             # Add capture effect
-            effects.append([3, center[1], center[0], 0])
+            if effects is not None:
+                effects.add(CAPTURE_EFFECT, center[1], center[0])
             if turn_on_music:
                 play_capture_sound(volume=volume)
 
             _add_planet_visibility(center[1], center[0], player_2_visibility_mask)
+            captured.append(e)
+
+    return captured
 
 
 def _ship_land_interaction(
     game_map: np.ndarray,
-    planets_centers: np.ndarray,
+    planets_lookup: np.ndarray,
     planets_occupation_progress: np.ndarray,
     planets_ongoing_occupation: np.ndarray,
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
-    effects: list
+    player_1_ships: ShipStore,
+    player_2_ships: ShipStore,
+    effects: EffectsQueue
+):
+    for player, ships in enumerate((player_1_ships, player_2_ships)):
+        slots = ships.active_slots()
+        if len(slots) == 0:
+            continue
+
+        ships_x, ships_y = ships.x[slots], ships.y[slots]
+
+        # Heal the ships, which are on the player's tiles
+        owner_bit = OWNERSHIP_BITS[player]
+        healed = slots[(game_map[ships_y, ships_x] & owner_bit == owner_bit) & (ships.hp[slots] != 100)]
+        ships.hp[healed] = np.clip(ships.hp[healed] + SHIP_HEALING_SPEED, 1, 100)
+
+        # Planet within the occupation range of every ship, see _build_planets_lookup
+        planet_ids = planets_lookup[ships_y, ships_x]
+        landed_slots = []
+        for planet_id in np.unique(planet_ids[planet_ids != -1]):
+            planet_slots = slots[planet_ids == planet_id]
+            n_landed = _land_ships(player=player, planet_id=planet_id, n_ships=len(planet_slots),
+                                   planets_occupation_progress=planets_occupation_progress,
+                                   planets_ongoing_occupation=planets_ongoing_occupation)
+            landed_slots.append(planet_slots[:n_landed])
+
+        # Delete the ships afterward
+        if landed_slots:
+            _delete_ships(ships=ships, player=player, slots=np.concatenate(landed_slots), effects=effects,
+                          death_effect=False)
+
+
+def _land_ships(
+    player: int,
+    planet_id: int,
+    n_ships: int,
+    planets_occupation_progress: np.ndarray,
+    planets_ongoing_occupation: np.ndarray
 ):
-    ship_ids_to_delete_1 = []
-    for ship_id, (ship_x, ship_y, hp, firing_cooldown, move_cooldown) in player_1_ships.items():
-        if game_map[ship_y, ship_x] & 64 == 64 and hp != 100:
-            player_1_ships[ship_id][2] = np.clip(player_1_ships[ship_id][2] + SHIP_HEALING_SPEED, 1, 100)
-
-        planet_id = _get_planet_id_by_ship_position(ship_x, ship_y, planets_centers=planets_centers)
-        if planet_id != -1:
-            # If there is an ongoing fight for this planet
-            if planets_ongoing_occupation[planet_id] != 0 or planets_occupation_progress[planet_id] not in [-1, 0, 100]:
-                planets_ongoing_occupation[planet_id] -= 1
-                ship_ids_to_delete_1.append(ship_id)
-
-            # If planet is unoccupied
-            elif planets_occupation_progress[planet_id] == -1:
-                planets_occupation_progress[planet_id] = 0
-                ship_ids_to_delete_1.append(ship_id)
-
-            # If the planet belongs to the other player
-            elif planets_occupation_progress[planet_id] == 100:
-                planets_occupation_progress[planet_id] = 100 - OCCUPATION_SPEED
-                planets_ongoing_occupation[planet_id] -= 1
-                ship_ids_to_delete_1.append(ship_id)
-
-    # Delete the ship afterward
-    for ship_id in ship_ids_to_delete_1:
-        _delete_ship(player_1_ships=player_1_ships, player_2_ships=player_2_ships,
-                     player_1_ships_facing=player_1_ships_facing,
-                     player_2_ships_facing=player_2_ships_facing, player=0, ship_id=ship_id,
-                     turn_on_music=False,
-                     volume=0.0, effects=effects, death_effect=False)
-
-    ship_ids_to_delete_2 = []
-    for ship_id, (ship_x, ship_y, hp, firing_cooldown, move_cooldown) in player_2_ships.items():
-        if game_map[ship_y, ship_x] & 128 == 128 and hp != 100:
-            player_2_ships[ship_id][2] = np.clip(player_2_ships[ship_id][2] + SHIP_HEALING_SPEED, 1, 100)
-
-        planet_id = _get_planet_id_by_ship_position(ship_x, ship_y, planets_centers=planets_centers)
-        if planet_id != -1:
-            # If there is an ongoing fight for this planet
-            if planets_ongoing_occupation[planet_id] != 0 or planets_occupation_progress[planet_id] not in [-1, 0, 100]:
-                planets_ongoing_occupation[planet_id] += 1
-                ship_ids_to_delete_2.append(ship_id)
-
-            # If planet is unoccupied
-            elif planets_occupation_progress[planet_id] == -1:
-                planets_occupation_progress[planet_id] = 100
-                ship_ids_to_delete_2.append(ship_id)
-
-            # If the planet belongs to the other player
-            elif planets_occupation_progress[planet_id] == 0:
-                planets_occupation_progress[planet_id] = OCCUPATION_SPEED
-                planets_ongoing_occupation[planet_id] += 1
-                ship_ids_to_delete_2.append(ship_id)
-
-    # Delete the ship afterward
-    for ship_id in ship_ids_to_delete_2:
-        _delete_ship(player_1_ships=player_1_ships, player_2_ships=player_2_ships,
-                     player_1_ships_facing=player_1_ships_facing,
-                     player_2_ships_facing=player_2_ships_facing, player=1, ship_id=ship_id,
-                     turn_on_music=False,
-                     volume=0.0, effects=effects, death_effect=False)
+    """
+    Applies the landing of player's ships on the planet, one after another in the order of their creation.
+    Returns the number of the first ships that were used up for the planet capture.
+    """
+    own_progress, enemy_progress, sign = (0, 100, -1) if player == 0 else (100, 0, 1)
+
+    n_landed = 0
+    if not _is_planet_contested(planet_id, planets_occupation_progress, planets_ongoing_occupation):
+        # If planet is unoccupied
+        if planets_occupation_progress[planet_id] == -1:
+            planets_occupation_progress[planet_id] = own_progress
+
+        # If the planet belongs to the other player
+        elif planets_occupation_progress[planet_id] == enemy_progress:
+            planets_occupation_progress[planet_id] = enemy_progress + sign * OCCUPATION_SPEED
+            planets_ongoing_occupation[planet_id] += sign
+
+        # The planet already belongs to the player, so none of the ships lands
+        else:
+            return 0
+        n_landed = 1
+
+    # Every other ship joins the ongoing fight for this planet
+    if _is_planet_contested(planet_id, planets_occupation_progress, planets_ongoing_occupation):
+        planets_ongoing_occupation[planet_id] += sign * (n_ships - n_landed)
+        n_landed = n_ships
+    return n_landed
+
+
+def _is_planet_contested(planet_id, planets_occupation_progress, planets_ongoing_occupation):
+    return planets_ongoing_occupation[planet_id] != 0 or planets_occupation_progress[planet_id] not in [-1, 0, 100]
 
 
 def _decrease_cooldowns(
-    player_1_ships: dict,
-    player_2_ships: dict,
+    player_1_ships: ShipStore,
+    player_2_ships: ShipStore,
 ):
-    for key in player_1_ships.keys():
-        player_1_ships[key][3] = max(player_1_ships[key][3] - 1, 0)
-        player_1_ships[key][4] = max(player_1_ships[key][4] - 1, 0)
-
-    for key in player_2_ships.keys():
-        player_2_ships[key][3] = max(player_2_ships[key][3] - 1, 0)
-        player_2_ships[key][4] = max(player_2_ships[key][4] - 1, 0)
+    for ships in (player_1_ships, player_2_ships):
+        np.maximum(ships.fire_cooldown[:ships.size] - 1, 0, out=ships.fire_cooldown[:ships.size])
+        np.maximum(ships.move_cooldown[:ships.size] - 1, 0, out=ships.move_cooldown[:ships.size])
 
 
 def _handle_visibility(
-    player_1_ships: dict,
-    player_2_ships: dict,
+    player_1_ships: ShipStore,
+    player_2_ships: ShipStore,
     player_1_visibility_mask: np.ndarray,
-    player_2_visibility_mask: np.ndarray
+    player_2_visibility_mask: np.ndarray,
+    unseen_tiles: np.ndarray
 ):
-    for ship_id in player_1_ships.keys():
-        ship_x, ship_y = player_1_ships[ship_id][0], player_1_ships[ship_id][1]
-        start_x = max(ship_x - VISION_RANGE, 0)
-        end_x = min(ship_x + VISION_RANGE + 1, BOARD_SIZE)
-        start_y = max(ship_y - VISION_RANGE, 0)
-        end_y = min(ship_y + VISION_RANGE + 1, BOARD_SIZE)
-
-        vision_add_start_x = start_x - ship_x + VISION_RANGE
-        vision_add_end_x = end_x - ship_x + VISION_RANGE
-        vision_add_start_y = start_y - ship_y + VISION_RANGE
-        vision_add_end_y = end_y - ship_y + VISION_RANGE
-
-        player_1_visibility_mask[start_y:end_y, start_x:end_x] = player_1_visibility_mask[start_y:end_y, start_x:end_x] | VISION_ADD_MASK[vision_add_start_y:vision_add_end_y, vision_add_start_x:vision_add_end_x]
-
-    for ship_id in player_2_ships.keys():
-        ship_x, ship_y = player_2_ships[ship_id][0], player_2_ships[ship_id][1]
-        start_x = max(ship_x - VISION_RANGE, 0)
-        end_x = min(ship_x + VISION_RANGE + 1, BOARD_SIZE)
-        start_y = max(ship_y - VISION_RANGE, 0)
-        end_y = min(ship_y + VISION_RANGE + 1, BOARD_SIZE)
+    """
+    Returns for both players the (y, x) coordinates of the tiles revealed in this turn.
 
-        vision_add_start_x = start_x - ship_x + VISION_RANGE
-        vision_add_end_x = end_x - ship_x + VISION_RANGE
-        vision_add_start_y = start_y - ship_y + VISION_RANGE
-        vision_add_end_y = end_y - ship_y + VISION_RANGE
+    The visibility masks only grow, so only the ships, which changed their position since they last added their vision,
+    can reveal anything. unseen_tiles holds the number of tiles not visible to each player and is updated here,
+    a player with the whole map revealed is skipped.
+    """
+    revealed = []
+    for player, (ships, visibility_mask) in enumerate(((player_1_ships, player_1_visibility_mask),
+                                                       (player_2_ships, player_2_visibility_mask))):
+        if unseen_tiles[player] == 0:
+            revealed.append((np.empty(0, dtype=int), np.empty(0, dtype=int)))
+            continue
+
+        slots = ships.active_slots()
+        slots = slots[(ships.x[slots] != ships.seen_x[slots]) | (ships.y[slots] != ships.seen_y[slots])]
+        ships.seen_x[slots] = ships.x[slots]
+        ships.seen_y[slots] = ships.y[slots]
+
+        cells_y, cells_x = _add_ships_visibility(ships.x[slots], ships.y[slots], visibility_mask)
+        unseen_tiles[player] -= len(cells_y)
+        revealed.append((cells_y, cells_x))
+    return revealed
+
+
+def _add_ships_visibility(
+    ships_x: np.ndarray,
+    ships_y: np.ndarray,
+    visibility_mask: np.ndarray
+):
+    """
+    Stamps VISION_ADD_MASK around every given ship position at once.
+    Returns the (y, x) coordinates of the tiles, which were not visible before, every tile once.
+    """
+    cells_x = ships_x[:, None] + VISION_OFFSETS_X[None, :]
+    cells_y = ships_y[:, None] + VISION_OFFSETS_Y[None, :]
+    on_board = (cells_x >= 0) & (cells_x < BOARD_SIZE) & (cells_y >= 0) & (cells_y < BOARD_SIZE)
+    cells_y, cells_x = cells_y[on_board], cells_x[on_board]
+
+    revealed = ~visibility_mask[cells_y, cells_x]
+    if len(ships_x) > 1:
+        # The vision of different ships may overlap
+        cells_y, cells_x = np.divmod(np.unique(cells_y[revealed] * BOARD_SIZE + cells_x[revealed]), BOARD_SIZE)
+    else:
+        cells_y, cells_x = cells_y[revealed], cells_x[revealed]
 
-        player_2_visibility_mask[start_y:end_y, start_x:end_x] = player_2_visibility_mask[start_y:end_y, start_x:end_x] | VISION_ADD_MASK[vision_add_start_y:vision_add_end_y,
-                                                                                                                          vision_add_start_x:vision_add_end_x]
+    visibility_mask[cells_y, cells_x] = True
+    return cells_y, cells_x
 
 
 def _check_victory_conditions(
@@ -482,99 +452,73 @@ def _add_planet_visibility(
                                                                   vision_add_start_y:vision_add_end_y]
 
 
-def _get_target(
-    ship_x: int,
-    ship_y: int,
-    direction: int,
-    player: int,
-    player_1_ships: dict,
-    player_2_ships: dict
+def _get_targets(
+    ships_x: np.ndarray,
+    ships_y: np.ndarray,
+    directions: np.ndarray,
+    enemy_ships: ShipStore
 ):
     """
-    Returns id of the first ship, that player's ship is facing, if it is in firing range
+    Returns for every shooter the slot of the first enemy ship it is facing, if it is in firing range, otherwise -1.
+    All shooters are resolved at once on a (shooters, enemies) matrix of offsets.
     """
-    if player == 0:
-        enemy_ships = player_2_ships
-    else:
-        enemy_ships = player_1_ships
-
-    if len(enemy_ships.keys()) == 0:
-        return -1
-
-    ship_vec = np.array([ship_x, ship_y], dtype=int)
-    target_vec = np.array([ship_x, ship_y], dtype=int) + MOVEMENT_DIRECTIONS[direction] * MAX_SHIP_FIRE_RANGE
-    target_vec -= ship_vec
-    vec_to_other_ships = np.array([(x, y) for ship_id, (x, y, hp, firing_cooldown, move_cooldown) in enemy_ships.items()], dtype=int)
-    vec_to_other_ships = vec_to_other_ships - ship_vec
-    vec_angles = [np.arccos(np.clip(np.dot(vec/np.linalg.norm(vec), target_vec/np.linalg.norm(target_vec)), -1.0, 1.0)) if np.linalg.norm(vec) != 0 else 0 for vec in vec_to_other_ships]
-
-    target_id = -1
-    min_dist = MAX_SHIP_FIRE_RANGE + 1
-    for i in range(len(enemy_ships.keys())):
-
-        # Get all ships between -15 and 15 degrees
-        if -np.pi/12 <= vec_angles[i] <= np.pi/12 and min_dist > np.linalg.norm(vec_to_other_ships[i]):
-            target_id = list(enemy_ships.keys())[i]
-            min_dist = np.linalg.norm(vec_to_other_ships[i])
-    return target_id
-
-
-def _get_player_next_id(player: int):
-    global player_1_ships_next_id, player_2_ships_next_id
-    if player == 0:
-        player_1_ships_next_id += 1
-        return player_1_ships_next_id - 1
-    else:
-        player_2_ships_next_id += 1
-        return player_2_ships_next_id - 1
+    target_slots = np.full(len(ships_x), -1, dtype=int)
+    enemy_slots = enemy_ships.active_slots()
+    if len(enemy_slots) == 0:
+        return target_slots
+
+    offset_x = enemy_ships.x[enemy_slots][None, :] - ships_x[:, None]
+    offset_y = enemy_ships.y[enemy_slots][None, :] - ships_y[:, None]
+    targets = _get_closest_ships_in_sight(offset_x, offset_y, directions, valid=None)
+    has_target = targets != -1
+    target_slots[has_target] = enemy_slots[targets[has_target]]
+    return target_slots
+
+
+def _get_closest_ships_in_sight(
+    offset_x: np.ndarray,
+    offset_y: np.ndarray,
+    directions: np.ndarray,
+    valid: np.ndarray = None
+):
+    """
+    Firing rule shared by all engines. offset_x and offset_y are (shooters, ships) offsets from every shooter to every
+    candidate ship, valid optionally masks out the candidates that don't exist. Returns for every shooter the column
+    of the closest ship between -15 and 15 degrees of its firing direction and in firing range, otherwise -1.
+    """
+    dist = np.sqrt(offset_x ** 2 + offset_y ** 2)
 
+    target_vec = MOVEMENT_DIRECTIONS[directions] * MAX_SHIP_FIRE_RANGE
+    target_vec = target_vec / np.linalg.norm(target_vec, axis=1, keepdims=True)
 
-def _get_planet_id_by_ship_position(ship_x, ship_y, planets_centers):
-    for e, center in enumerate(planets_centers):
-        if np.linalg.norm([ship_x - center[1], ship_y - center[0]]) <= SHIP_OCCUPATION_RANGE:
-            return e
-    return -1
+    # Angle between the firing direction and every ship (0 for the ships on the same tile)
+    same_tile = dist == 0
+    safe_dist = np.where(same_tile, 1.0, dist)
+    cos = (offset_x / safe_dist) * target_vec[:, 0, None] + (offset_y / safe_dist) * target_vec[:, 1, None]
+    vec_angles = np.where(same_tile, 0.0, np.arccos(np.clip(cos, -1.0, 1.0)))
 
+    # Get all ships between -15 and 15 degrees, which are in the firing range
+    in_sight = (-np.pi/12 <= vec_angles) & (vec_angles <= np.pi/12) & (dist < MAX_SHIP_FIRE_RANGE + 1)
+    if valid is not None:
+        in_sight &= valid
 
-def _delete_healing_effect(
-        player: int,
-        ship_id: int,
-        effects: list
-):
-    i = 0
-    while i < len(effects):
-        if effects[i][0] == 1 and effects[i][1] == player and effects[i][2] == ship_id:
-            effects.pop(i)
-        i += 1
-
-
-def _delete_ship(
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
+    # The closest one is the target, ties are resolved in favor of the older ship
+    closest = np.argmin(np.where(in_sight, dist, np.inf), axis=1)
+    return np.where(in_sight.any(axis=1), closest, -1)
+
+
+def _delete_ships(
+    ships: ShipStore,
     player: int,
-    ship_id: int,
-    turn_on_music: bool,
-    volume: float,
-    effects: list,
+    slots: np.ndarray,
+    effects: EffectsQueue,
     death_effect: bool = True
 ):
-    if player == 0:
-        ship_list = player_1_ships
-        ship_list_facing = player_1_ships_facing
-    else:
-        ship_list = player_2_ships
-        ship_list_facing = player_2_ships_facing
-
-    if death_effect:
-        effects.append([0, ship_list[ship_id][0], ship_list[ship_id][1], 0])
-
-    _delete_healing_effect(player, ship_id, effects)
-
-    del ship_list[ship_id]
-    del ship_list_facing[ship_id]
+    if effects is not None:
+        if death_effect:
+            effects.add_many(DEATH_EFFECT, ships.x[slots], ships.y[slots])
 
-    if turn_on_music:
-        play_ship_explosion_sound(volume=volume)
+        for ship_id in ships.ship_id[slots].tolist():
+            effects.stop_healing(player, ship_id)
 
+    ships.remove(slots)
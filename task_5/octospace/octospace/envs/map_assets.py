@@ -6,90 +6,133 @@ from octospace.envs.game_config import (SHIP_SIZE, SIDE_SHIP_SIZE, TILE_SIZE, PL
                          EFFECT_IONIZED_FIELD_SIZE, RF_MARKER_SIZE, RF_ICON_SIZE, RF_BAR_SIZE, GUI_SIZE, BORDER_WIDTH,
                          PLAYER_ICON_TEAM_NAME_SIZE, FLAG_SIZE, OCCUPATION_BAR_SIZE, EFFECT_DEATH_SIZE,
                          EFFECT_FIRING_SIZE, EFFECT_HEALING_SIZE, EFFECT_CAPTURE_SIZE, EFFECT_SPACE_JUMP_SIZE,
-                         ASTEROID_SIZE)
+                         ASTEROID_SIZE, N_LAND_SPRITES, N_ASTEROID_SPRITES, N_IONIZED_FIELD_FRAMES)
+
+
+class AssetCache:
+    """
+    Table of assets indexed by consecutive ids, where every asset is loaded and scaled only on its first access.
+    """
+    def __init__(self, loader, n_assets: int):
+        self._loader = loader
+        self._n_assets = n_assets
+        self._assets = {}
+
+    def __getitem__(self, asset_id):
+        asset_id = int(asset_id)
+        asset = self._assets.get(asset_id)
+        if asset is None:
+            if not 0 <= asset_id < self._n_assets:
+                raise KeyError(asset_id)
+            asset = self._assets[asset_id] = self._loader(asset_id)
+        return asset
+
+    def __len__(self):
+        return self._n_assets
+
+
+def _load_scaled(path: str, size: tuple, angle: float = 0):
+    image = pygame.transform.scale(pygame.image.load(path), size=size)
+    if angle:
+        image = pygame.transform.rotate(image, angle=angle)
+    return image
+
+
+# Single images are loaded on the first access to the module attribute (see __getattr__ below)
+_SINGLE_ASSETS = {
+    "BACKGROUND": lambda: pygame.image.load('assets/background.jpg'),
+    "BORDER": lambda: _load_scaled('assets/border_long.png', (WINDOW_SIZE + 2*BORDER_WIDTH, WINDOW_SIZE)),
+    "BORDER_SCORE": lambda: _load_scaled('assets/scoreboard.png', (WINDOW_SIZE + 2*BORDER_WIDTH - 50, WINDOW_SIZE - 300)),
+    "PLAYER_ICON": lambda: _load_scaled('assets/tentacle_white_ring.png', (PLAYER_ICON_TEAM_NAME_SIZE, PLAYER_ICON_TEAM_NAME_SIZE)),
+    "OCCUPATION_FLAG": lambda: _load_scaled('assets/flag_small.png', (FLAG_SIZE, FLAG_SIZE)),
+    "OCCUPATION_FLAG_CROSSED": lambda: _load_scaled('assets/flag_small_crossed.png', (FLAG_SIZE, FLAG_SIZE)),
+    "ROUGH_TERRAIN_FLAG": lambda: _load_scaled('assets/planets/rough_terrain_flag.png', (TILE_SIZE, TILE_SIZE)),
+    "BAR_EMPTY": lambda: _load_scaled('assets/rf_bars/bar_empty.png', (OCCUPATION_BAR_SIZE, OCCUPATION_BAR_SIZE//5)),
+}
 
 
-BACKGROUND = pygame.image.load('assets/background.jpg')
-BORDER = pygame.transform.scale(pygame.image.load('assets/border_long.png'), (WINDOW_SIZE + 2*BORDER_WIDTH, WINDOW_SIZE))
-BORDER_SCORE = pygame.transform.scale(pygame.image.load('assets/scoreboard.png'), (WINDOW_SIZE + 2*BORDER_WIDTH - 50, WINDOW_SIZE - 300))
-LAND = {
-    i: pygame.transform.scale(pygame.image.load(f'assets/planets/land_{i}.png'), size=(TILE_SIZE, TILE_SIZE))
-    for i in range(13)
-}
-ASTEROIDS = {
-    i: pygame.transform.scale(pygame.image.load(f'assets/asteroids/asteroid_{i}.png'), size=(ASTEROID_SIZE, ASTEROID_SIZE))
-    for i in range(12)
-}
+def __getattr__(name: str):
+    if name in _SINGLE_ASSETS:
+        asset = globals()[name] = _SINGLE_ASSETS[name]()
+        return asset
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-PLAYER_ICON = pygame.transform.scale(pygame.image.load('assets/tentacle_white_ring.png'), size=(PLAYER_ICON_TEAM_NAME_SIZE, PLAYER_ICON_TEAM_NAME_SIZE))
-OCCUPATION_FLAG = pygame.transform.scale(pygame.image.load('assets/flag_small.png'), size=(FLAG_SIZE, FLAG_SIZE))
-OCCUPATION_FLAG_CROSSED = pygame.transform.scale(pygame.image.load('assets/flag_small_crossed.png'), size=(FLAG_SIZE, FLAG_SIZE))
 
-ROUGH_TERRAIN = {
-    i: pygame.transform.rotate(pygame.transform.scale(pygame.image.load('assets/planets/rough_terrain.png'), size=(TILE_SIZE, TILE_SIZE)), angle=i*90)
-    for i in range(4)
-}
-ROUGH_TERRAIN_FLAG = pygame.transform.scale(pygame.image.load('assets/planets/rough_terrain_flag.png'), size=(TILE_SIZE, TILE_SIZE))
+LAND = AssetCache(
+    lambda i: _load_scaled(f'assets/planets/land_{i}.png', (TILE_SIZE, TILE_SIZE)),
+    n_assets=N_LAND_SPRITES
+)
+ASTEROIDS = AssetCache(
+    lambda i: _load_scaled(f'assets/asteroids/asteroid_{i}.png', (ASTEROID_SIZE, ASTEROID_SIZE)),
+    n_assets=N_ASTEROID_SPRITES
+)
 
-ROUGH_TERRAIN_CORNER = {
-    i: pygame.transform.rotate(
-        pygame.transform.scale(pygame.image.load('assets/planets/rough_terrain_corner.png'), size=(TILE_SIZE, TILE_SIZE)),
-        angle=i * 90)
-    for i in range(4)
-}
+ROUGH_TERRAIN = AssetCache(
+    lambda i: _load_scaled('assets/planets/rough_terrain.png', (TILE_SIZE, TILE_SIZE), angle=i*90),
+    n_assets=4
+)
 
-RESOURCE_FIELDS_MARKERS = {
-    i: pygame.transform.scale(pygame.image.load(f'assets/rf_icons/rf_{i}.png'), size=(RF_MARKER_SIZE, RF_MARKER_SIZE)) for i in range(4)
-}
+ROUGH_TERRAIN_CORNER = AssetCache(
+    lambda i: _load_scaled('assets/planets/rough_terrain_corner.png', (TILE_SIZE, TILE_SIZE), angle=i*90),
+    n_assets=4
+)
 
-RESOURCE_FIELDS_ICONS = {
-    i: pygame.transform.scale(pygame.image.load(f'assets/rf_icons/rf_icon_{i}.png'), size=(RF_ICON_SIZE, RF_ICON_SIZE)) for i in range(4)
-}
+RESOURCE_FIELDS_MARKERS = AssetCache(
+    lambda i: _load_scaled(f'assets/rf_icons/rf_{i}.png', (RF_MARKER_SIZE, RF_MARKER_SIZE)),
+    n_assets=4
+)
+
+RESOURCE_FIELDS_ICONS = AssetCache(
+    lambda i: _load_scaled(f'assets/rf_icons/rf_icon_{i}.png', (RF_ICON_SIZE, RF_ICON_SIZE)),
+    n_assets=4
+)
 
 RESOURCE_FIELDS_BARS = [
-    {i: pygame.transform.scale(pygame.image.load(f'assets/rf_bars/bar_{color}_{i}.png'), size=(RF_BAR_SIZE, RF_BAR_SIZE//5)) for i in range(10)}
+    AssetCache(
+        lambda i, color=color: _load_scaled(f'assets/rf_bars/bar_{color}_{i}.png', (RF_BAR_SIZE, RF_BAR_SIZE//5)),
+        n_assets=10
+    )
     for color in ['gray', 'green', 'brown', 'blue']
 ]
 
-BAR_EMPTY = pygame.transform.scale(pygame.image.load('assets/rf_bars/bar_empty.png'), size=(OCCUPATION_BAR_SIZE, OCCUPATION_BAR_SIZE//5))
-
-IONIZED_FIELDS = {
-    i: pygame.transform.scale(pygame.image.load(f'assets/effects/ionized_field_animation/ionized_field_blue_{i}.png'),
-                              size=(EFFECT_IONIZED_FIELD_SIZE, EFFECT_IONIZED_FIELD_SIZE))
-    for i in range(12)
-}
-
-DEATH_EFFECT_ANIMATION = {
-    i: pygame.transform.scale(pygame.image.load(f'assets/effects/death_animation/death_animation_{i}.png'),
-                              size=(EFFECT_DEATH_SIZE, EFFECT_DEATH_SIZE))
-    for i in range(15)
-}
-
-HEALING_EFFECT_ANIMATION = {
-    i: pygame.transform.scale(pygame.image.load(f'assets/effects/healing_animation/healing_animation_{i}.png'),
-                              size=(EFFECT_HEALING_SIZE, EFFECT_HEALING_SIZE))
-    for i in range(15)
-}
-
-FIRING_EFFECT_ANIMATION = {
-    direction: {
-        i: pygame.transform.rotate(pygame.transform.scale(pygame.image.load(f'assets/effects/firing_animation/firing_animation_{i}.png'),
-                              size=(EFFECT_FIRING_SIZE, EFFECT_FIRING_SIZE)), angle=65-90*direction)
-        for i in range(5)
-    } for direction in range(4)
-}
-
-CAPTURE_EFFECT_ANIMATION = {
-    i: pygame.transform.scale(pygame.image.load(f'assets/effects/capture_animation/capture_animation_{i}.png'),
-                              size=(EFFECT_CAPTURE_SIZE, EFFECT_CAPTURE_SIZE))
-    for i in range(12)
-}
-
-SPACE_JUMP_EFFECT_ANIMATION = {
-    i: pygame.transform.scale(pygame.image.load(f'assets/effects/space_jump/space_jump_{i}.png'),
-                              size=(EFFECT_SPACE_JUMP_SIZE, EFFECT_SPACE_JUMP_SIZE))
-    for i in range(9)
-}
+IONIZED_FIELDS = AssetCache(
+    lambda i: _load_scaled(f'assets/effects/ionized_field_animation/ionized_field_blue_{i}.png',
+                           (EFFECT_IONIZED_FIELD_SIZE, EFFECT_IONIZED_FIELD_SIZE)),
+    n_assets=N_IONIZED_FIELD_FRAMES
+)
+
+DEATH_EFFECT_ANIMATION = AssetCache(
+    lambda i: _load_scaled(f'assets/effects/death_animation/death_animation_{i}.png',
+                           (EFFECT_DEATH_SIZE, EFFECT_DEATH_SIZE)),
+    n_assets=15
+)
+
+HEALING_EFFECT_ANIMATION = AssetCache(
+    lambda i: _load_scaled(f'assets/effects/healing_animation/healing_animation_{i}.png',
+                           (EFFECT_HEALING_SIZE, EFFECT_HEALING_SIZE)),
+    n_assets=15
+)
+
+FIRING_EFFECT_ANIMATION = AssetCache(
+    lambda direction: AssetCache(
+        lambda i: _load_scaled(f'assets/effects/firing_animation/firing_animation_{i}.png',
+                               (EFFECT_FIRING_SIZE, EFFECT_FIRING_SIZE), angle=65-90*direction),
+        n_assets=5
+    ),
+    n_assets=4
+)
+
+CAPTURE_EFFECT_ANIMATION = AssetCache(
+    lambda i: _load_scaled(f'assets/effects/capture_animation/capture_animation_{i}.png',
+                           (EFFECT_CAPTURE_SIZE, EFFECT_CAPTURE_SIZE)),
+    n_assets=12
+)
+
+SPACE_JUMP_EFFECT_ANIMATION = AssetCache(
+    lambda i: _load_scaled(f'assets/effects/space_jump/space_jump_{i}.png',
+                           (EFFECT_SPACE_JUMP_SIZE, EFFECT_SPACE_JUMP_SIZE)),
+    n_assets=9
+)
 
 TEAM_COLORS = {
     0: Color(233, 47, 137, 255),
@@ -145,11 +188,10 @@ TEAM_COLORS = {
     50: Color("violetred4"),
 }
 
-TEAM_ICONS = {
-    team_id: pygame.transform.scale(
-        pygame.image.load(f'assets/player_icons/octopus_{team_id}.png'), size=(PLAYER_ICON_SIZE, PLAYER_ICON_SIZE)
-    ) for team_id in range(51)
-}
+TEAM_ICONS = AssetCache(
+    lambda team_id: _load_scaled(f'assets/player_icons/octopus_{team_id}.png', (PLAYER_ICON_SIZE, PLAYER_ICON_SIZE)),
+    n_assets=51
+)
 
 """
 Different images are going to be rendered based on which side is the ship currently facing.
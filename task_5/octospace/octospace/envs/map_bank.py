@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from octospace.envs.game_config import BOARD_SIZE, N_PLANETS
+from octospace.envs.map_generation import N_IONIZED_FIELDS, _generate_map, _generate_state_map
+
+"""
+Map bank: maps pre-generated for a range of consecutive seeds and stored on disk, so that resetting an environment
+only copies a map instead of generating it.
+
+The map for the seed s is exactly the map generated by _generate_map and _generate_state_map with
+np.random.default_rng(s), which is also the first map of OctoSpaceEnv(seed=s).
+
+A bank is a directory with:
+    bank.json: first seed, number of maps and the board parameters the maps were generated for
+    maps.npy: (n_maps, BOARD_SIZE, BOARD_SIZE) uint8 game maps
+    planets_centers.npy: (n_maps, N_PLANETS, 2) int16 centers of the unoccupied planets
+    ionized_fields.npy: (n_maps, N_IONIZED_FIELDS, 3) int16 rows of (y, x, animation frame)
+    n_ionized_fields.npy: (n_maps,) int16 number of the ionized fields of every map, a map with fewer fields than
+        N_IONIZED_FIELDS (see _add_ionized_fields) has its rows padded with -1
+    state_ids.npy: (n_maps, BOARD_SIZE, BOARD_SIZE) uint8 sprite ids of the tiles
+All arrays are memory-mapped, so only the maps that are actually used are read from the disk.
+"""
+
+_ARRAYS = {
+    "maps": (np.uint8, (BOARD_SIZE, BOARD_SIZE)),
+    "planets_centers": (np.int16, (N_PLANETS, 2)),
+    "ionized_fields": (np.int16, (N_IONIZED_FIELDS, 3)),
+    "n_ionized_fields": (np.int16, ()),
+    "state_ids": (np.uint8, (BOARD_SIZE, BOARD_SIZE)),
+}
+
+
+class MapBank:
+    def __init__(self, path: str):
+        with open(os.path.join(path, "bank.json")) as f:
+            meta = json.load(f)
+        assert meta["board_size"] == BOARD_SIZE and meta["n_planets"] == N_PLANETS, \
+            "The map bank was generated for a different board"
+
+        self.path = path
+        self.first_seed = meta["first_seed"]
+        self.n_maps = meta["n_maps"]
+        self._arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in _ARRAYS}
+
+    def __len__(self):
+        return self.n_maps
+
+    def __contains__(self, seed: int) -> bool:
+        return self.first_seed <= seed < self.first_seed + self.n_maps
+
+    def get(self, seed: int):
+        """
+        Returns a copy of the map generated for the seed, in the format of _generate_map plus the state ids map:
+        (game_map, planets_centers, ionized_field_id, state_ids)
+        """
+        if seed not in self:
+            raise KeyError(f"There is no map for the seed {seed} in the map bank")
+
+        i = seed - self.first_seed
+        game_map = self._arrays["maps"][i].astype(int)
+        planets_centers = self._arrays["planets_centers"][i].astype(int)
+        ionized_fields = self._arrays["ionized_fields"][i, :self._arrays["n_ionized_fields"][i]]
+        ionized_field_id = {(y, x): frame for y, x, frame in ionized_fields.tolist()}
+        state_ids = self._arrays["state_ids"][i].astype(int)
+        return game_map, planets_centers, ionized_field_id, state_ids
+
+    def sample(self, rng: np.random.Generator):
+        """
+        Returns a copy of a map drawn uniformly from the bank.
+        """
+        return self.get(self.first_seed + int(rng.integers(self.n_maps)))
+
+
+def _generate_maps(path: str, first_seed: int, start: int, stop: int):
+    """
+    Generates the maps start:stop of the bank into its preallocated files.
+    """
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r+") for name in _ARRAYS}
+    for i in range(start, stop):
+        rng = np.random.default_rng(first_seed + i)
+        game_map, planets_centers, ionized_field_id = _generate_map(rng=rng)
+        state_ids = _generate_state_map(game_map=game_map, rng=rng)
+
+        arrays["maps"][i] = game_map
+        arrays["planets_centers"][i] = planets_centers
+        ionized_fields = np.array([(y, x, frame) for (y, x), frame in ionized_field_id.items()]).reshape(-1, 3)
+        arrays["ionized_fields"][i] = -1
+        arrays["ionized_fields"][i, :len(ionized_fields)] = ionized_fields
+        arrays["n_ionized_fields"][i] = len(ionized_fields)
+        arrays["state_ids"][i] = state_ids
+
+    for array in arrays.values():
+        array.flush()
+    return stop - start
+
+
+def generate_map_bank(path: str, n_maps: int, first_seed: int = 0, n_workers: int = None, chunk_size: int = 1000):
+    """
+    Generates maps for the seeds first_seed, ..., first_seed + n_maps - 1 on a pool of processes.
+    """
+    os.makedirs(path, exist_ok=True)
+
+    # The bank becomes valid only after all the maps are written
+    meta_path = os.path.join(path, "bank.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    for name, (dtype, shape) in _ARRAYS.items():
+        np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode="w+", dtype=dtype, shape=(n_maps, *shape))
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [executor.submit(_generate_maps, path, first_seed, start, min(start + chunk_size, n_maps))
+                   for start in range(0, n_maps, chunk_size)]
+        n_generated = 0
+        for future in futures:
+            n_generated += future.result()
+            print(f"Generated {n_generated}/{n_maps} maps")
+
+    with open(meta_path, "w") as f:
+        json.dump({"first_seed": first_seed, "n_maps": n_maps, "board_size": BOARD_SIZE, "n_planets": N_PLANETS}, f)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Pre-generate a bank of maps')
+    parser.add_argument('path', type=str, help='Directory of the map bank')
+    parser.add_argument('--n_maps', type=int, default=10000, help='Number of maps to generate')
+    parser.add_argument('--first_seed', type=int, default=0, help='Seed of the first map')
+    parser.add_argument('--n_workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    return parser
+
+
+if __name__ == '__main__':
+    parse = get_parser()
+    args = parse.parse_args()
+
+    generate_map_bank(path=args.path, n_maps=args.n_maps, first_seed=args.first_seed, n_workers=args.n_workers)
+
+    """
+    Example execution:
+        python -m octospace.envs.map_bank maps/ --n_maps=1000000 --n_workers=16
+
+    The bank is then used by OctoSpaceEnv(..., map_bank="maps/") and OctoSpaceVecEnv(..., map_bank="maps/")
+    """
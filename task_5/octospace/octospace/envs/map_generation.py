@@ -2,17 +2,65 @@ import numpy as np
 
 from octospace.envs.game_config import (PLANETS_DIAMETER, PLANETS_OFFSET, PLANETS_DISTANCE,
                          RF_ID_TO_CODING, RF_COORDS, FRAC_OF_ASTEROID_AREA, FRAC_OF_IONIZED_AREA, BOARD_SIZE,
-                         PLAYER_1_ORIGIN, PLAYER_2_ORIGIN, N_PLANETS)
-from octospace.envs.map_assets import (IONIZED_FIELDS, LAND, ASTEROIDS)
+                         PLAYER_1_ORIGIN, PLAYER_2_ORIGIN, N_PLANETS, N_LAND_SPRITES, N_ASTEROID_SPRITES,
+                         N_IONIZED_FIELD_FRAMES, SHIP_OCCUPATION_RANGE)
 from octospace.envs.schemes import (STARTING_PLANET_SCHEME, EMPTY_PLANET_SCHEME, ASTEROID_ID_TO_SCHEME, ASTEROID_AREA, PLANET_MASK)
-from scipy.spatial.distance import cdist
 from octospace.envs.utils import NoSpaceOnMapException
 
 
-def _generate_map():
+# Number of the ionized fields on a map, a map, which has fewer empty tiles, has fewer fields
+N_IONIZED_FIELDS = int(BOARD_SIZE ** 2 * FRAC_OF_IONIZED_AREA)
+
+# Possible coordinates of the centers of the unoccupied planets
+PLANET_CANDIDATES = np.arange(PLANETS_OFFSET, BOARD_SIZE - PLANETS_OFFSET)
+
+# Coordinates of all asteroid tiles of every asteroid scheme, in the order of their ids
+ASTEROID_CELLS = [np.nonzero(ASTEROID_ID_TO_SCHEME[i]) for i in range(len(ASTEROID_ID_TO_SCHEME))]
+
+# The blocked top-left corners of every asteroid scheme are kept in (n_schemes, PADDED_SIZE, PADDED_SIZE) masks,
+# padded on every side, so that the corners around an object at the edge of the board still fall into the masks
+ASTEROID_PADDING = max(max(ASTEROID_ID_TO_SCHEME[i].shape) for i in range(len(ASTEROID_ID_TO_SCHEME)))
+PADDED_SIZE = BOARD_SIZE + 2 * ASTEROID_PADDING
+
+# Offsets of all planet tiles, relative to the planet's center
+PLANET_OFFSETS_Y, PLANET_OFFSETS_X = np.nonzero(PLANET_MASK)
+PLANET_OFFSETS_Y = PLANET_OFFSETS_Y - PLANETS_DIAMETER // 2
+PLANET_OFFSETS_X = PLANET_OFFSETS_X - PLANETS_DIAMETER // 2
+
+# Offsets of all tiles within SHIP_OCCUPATION_RANGE, relative to the planet's center
+OCCUPATION_OFFSETS_Y, OCCUPATION_OFFSETS_X = np.nonzero(
+    np.add.outer(np.arange(-SHIP_OCCUPATION_RANGE, SHIP_OCCUPATION_RANGE + 1) ** 2,
+                 np.arange(-SHIP_OCCUPATION_RANGE, SHIP_OCCUPATION_RANGE + 1) ** 2) <= SHIP_OCCUPATION_RANGE ** 2
+)
+OCCUPATION_OFFSETS_Y = OCCUPATION_OFFSETS_Y - SHIP_OCCUPATION_RANGE
+OCCUPATION_OFFSETS_X = OCCUPATION_OFFSETS_X - SHIP_OCCUPATION_RANGE
+
+
+def _blocked_corners(cells_y: np.ndarray, cells_x: np.ndarray):
+    """
+    Returns the flat indices into the padded masks of the corners of all asteroid schemes, at which the scheme
+    overlaps an object with the given tiles, placed with its top-left corner at (0, 0).
+    """
+    corners = []
+    for asteroid_id, (scheme_y, scheme_x) in enumerate(ASTEROID_CELLS):
+        y = np.subtract.outer(cells_y, scheme_y).ravel() + ASTEROID_PADDING
+        x = np.subtract.outer(cells_x, scheme_x).ravel() + ASTEROID_PADDING
+        corners.append(np.unique((asteroid_id * PADDED_SIZE + y) * PADDED_SIZE + x))
+    return np.concatenate(corners)
+
+
+# Corners blocked by a planet and by every asteroid scheme, relative to their top-left corners. The base occupation
+# marks the whole square of a starting planet, so it blocks the square
+PLANET_BLOCKED_CORNERS = _blocked_corners(*np.nonzero(PLANET_MASK))
+STARTING_PLANET_BLOCKED_CORNERS = _blocked_corners(*np.nonzero(np.ones((PLANETS_DIAMETER, PLANETS_DIAMETER))))
+ASTEROID_BLOCKED_CORNERS = [_blocked_corners(*cells) for cells in ASTEROID_CELLS]
+
+
+def _generate_map(rng: np.random.Generator):
     """
     Function generates a new map.
 
+    :param rng: random generator of the environment
     :return: np.ndarray of shape (BOARD_SIZE, BOARD_SIZE)
     """
     game_map = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=int)
@@ -27,79 +75,125 @@ def _generate_map():
     centers = [PLAYER_1_ORIGIN, PLAYER_2_ORIGIN]
 
     # Generate unoccupied planets
-    for _ in range(N_PLANETS):
-        new_planet_center = np.random.randint(PLANETS_OFFSET, BOARD_SIZE - PLANETS_OFFSET, size=2, dtype=int)
-
-        if len(centers) == 0:
-            centers.append(new_planet_center)
-            continue
-
-        intra_dist = np.min(cdist([new_planet_center], centers))
-        failed_attempts = 0
-        while intra_dist <= PLANETS_DISTANCE:
-            if failed_attempts >= 1000:
-                raise NoSpaceOnMapException("There's no space to place that many planets on the map")
-
-            new_planet_center = np.random.randint(PLANETS_OFFSET, BOARD_SIZE - PLANETS_OFFSET, size=2, dtype=int)
-            intra_dist = np.min(cdist([new_planet_center], centers))
-            failed_attempts += 1
-        centers.append(new_planet_center)
+    centers.extend(_sample_planet_centers(centers, N_PLANETS, rng))
 
     # Add base planet occupation
     _add_base_planet_occupation(game_map=game_map, centers=centers)
 
     # Delete the points for starting planets
-    centers = np.array(centers[2:], dtype=int)
+    all_centers = np.array(centers, dtype=int)
+    centers = all_centers[2:]
 
     for planet_center in centers:
         left_upper = (planet_center[0] - 4, planet_center[1] - 4)
         game_map[left_upper[0]:left_upper[0] + PLANETS_DIAMETER, left_upper[1]:left_upper[1] + PLANETS_DIAMETER] = (
-            _generate_planet())
+            _generate_planet(rng))
 
     # Generate asteroids
+    _add_asteroids(game_map, all_centers, rng)
+
+    # Generate ionized fields (speed boost for ships)
+    ionized_field_id = _add_ionized_fields(game_map, rng)
+
+    return game_map, centers, ionized_field_id
+
+
+def _sample_planet_centers(centers: list, n_planets: int, rng: np.random.Generator):
+    """
+    Draws the centers of new planets one after another, each uniformly from all positions further than
+    PLANETS_DISTANCE from the planets placed so far. Raises NoSpaceOnMapException if there is no such position,
+    a planet placed any closer could overlap another one.
+    """
+    # Squared distance from every candidate position to the closest planet
+    min_distances = np.full((len(PLANET_CANDIDATES), len(PLANET_CANDIDATES)), np.iinfo(int).max)
+    for center in centers:
+        _update_min_distances(min_distances, center)
+
+    new_centers = []
+    for _ in range(n_planets):
+        valid = np.flatnonzero(min_distances > PLANETS_DISTANCE ** 2)
+        if len(valid) == 0:
+            raise NoSpaceOnMapException("There's no space to place that many planets on the map")
+        position = valid[rng.integers(len(valid))]
+
+        y, x = np.divmod(position, len(PLANET_CANDIDATES))
+        center = np.array([PLANET_CANDIDATES[y], PLANET_CANDIDATES[x]], dtype=int)
+        new_centers.append(center)
+        _update_min_distances(min_distances, center)
+    return new_centers
+
+
+def _update_min_distances(min_distances: np.ndarray, center: np.ndarray):
+    distances_y = (PLANET_CANDIDATES - center[0]) ** 2
+    distances_x = (PLANET_CANDIDATES - center[1]) ** 2
+    np.minimum(min_distances, distances_y[:, None] + distances_x[None, :], out=min_distances)
+
+
+def _add_asteroids(game_map: np.ndarray, planets_centers: np.ndarray, rng: np.random.Generator):
+    """
+    Places asteroid fields until they cover FRAC_OF_ASTEROID_AREA of the board. Every asteroid is drawn uniformly from
+    the asteroid schemes and its position uniformly from the positions where it doesn't overlap anything.
+
+    The positions, at which every scheme would overlap the planets or the asteroids placed so far, are kept in masks,
+    a placed object only marks the corners around itself instead of the masks being rebuilt.
+
+    :param planets_centers: centers of all planets, the starting planets first
+    """
+    blocked = np.zeros((len(ASTEROID_CELLS), PADDED_SIZE, PADDED_SIZE), dtype=bool)
+    blocked_flat = blocked.reshape(-1)
+    for i, (top, left) in enumerate((planets_centers - PLANETS_DIAMETER // 2).tolist()):
+        planet_corners = STARTING_PLANET_BLOCKED_CORNERS if i < 2 else PLANET_BLOCKED_CORNERS
+        blocked_flat[planet_corners + (top * PADDED_SIZE + left)] = True
+
     area_left = int(BOARD_SIZE ** 2 * FRAC_OF_ASTEROID_AREA)
     max_asteroid_area = np.max(list(ASTEROID_AREA.values()))
     while area_left >= max_asteroid_area:
-        asteroid_id = np.random.randint(0, len(ASTEROID_AREA.keys()), size=1, dtype=int)[0]
-        asteroid_scheme = ASTEROID_ID_TO_SCHEME[asteroid_id]
-        left_upper = (np.random.randint(0, BOARD_SIZE - asteroid_scheme.shape[0], size=1, dtype=int)[0],
-                      np.random.randint(0, BOARD_SIZE - asteroid_scheme.shape[1], size=1, dtype=int)[0])
+        asteroid_id = rng.integers(0, len(ASTEROID_AREA.keys()))
+        free = _free_asteroid_positions(blocked, asteroid_id)
+        positions = np.flatnonzero(free)
 
-        failed_attempts = 0
-        while np.sum(asteroid_scheme * game_map[left_upper[0]:left_upper[0] + asteroid_scheme.shape[0],
-                                       left_upper[1]:left_upper[1] + asteroid_scheme.shape[1]]) != 0:
-            if failed_attempts >= 1000:
-                raise NoSpaceOnMapException("There's no space to place next asteroid field")
-            left_upper = (np.random.randint(0, BOARD_SIZE - asteroid_scheme.shape[0], size=1, dtype=int)[0],
-                          np.random.randint(0, BOARD_SIZE - asteroid_scheme.shape[1], size=1, dtype=int)[0])
-            failed_attempts += 1
+        # If the asteroid doesn't fit anywhere anymore, take one of those that still do
+        if len(positions) == 0:
+            fitting = [i for i in range(len(ASTEROID_CELLS)) if _free_asteroid_positions(blocked, i).any()]
+            if not fitting:
+                break
+            asteroid_id = fitting[rng.integers(len(fitting))]
+            free = _free_asteroid_positions(blocked, asteroid_id)
+            positions = np.flatnonzero(free)
 
-        game_map[left_upper[0]:left_upper[0] + asteroid_scheme.shape[0],
-        left_upper[1]:left_upper[1] + asteroid_scheme.shape[1]] += asteroid_scheme
+        top, left = np.divmod(positions[rng.integers(len(positions))], free.shape[1])
 
+        asteroid_scheme = ASTEROID_ID_TO_SCHEME[asteroid_id]
+        game_map[top:top + asteroid_scheme.shape[0], left:left + asteroid_scheme.shape[1]] += asteroid_scheme
+        blocked_flat[ASTEROID_BLOCKED_CORNERS[asteroid_id] + (top * PADDED_SIZE + left)] = True
         area_left -= ASTEROID_AREA[asteroid_id]
 
-    # Generate ionized fields (speed boost for ships)
-    n_ionized_fields = int(BOARD_SIZE ** 2 * FRAC_OF_IONIZED_AREA)
-    ionized_field_id = {}
-    failed_attempts = 0
-    while n_ionized_fields > 0:
-        if failed_attempts >= 10000:
-            raise NoSpaceOnMapException("There's no space to place next ionized field")
-
-        field_position = np.random.randint(0, BOARD_SIZE, size=2, dtype=int)
-        failed_attempts += 1
-
-        if not game_map[field_position[0], field_position[1]]:
-            failed_attempts = 0
-            game_map[field_position[0], field_position[1]] = 4
-            ionized_field_id[(field_position[0], field_position[1])] = np.random.randint(0, len(IONIZED_FIELDS.keys()) - 1)
-            n_ionized_fields -= 1
 
-    return game_map, centers, ionized_field_id
+def _free_asteroid_positions(blocked: np.ndarray, asteroid_id: int):
+    """
+    Returns the free-space mask of the asteroid scheme: top-left corners, at which none of its tiles overlaps an
+    occupied tile. The range of the corners is the same as in the original rejection sampling.
+    """
+    scheme_height, scheme_width = ASTEROID_ID_TO_SCHEME[asteroid_id].shape
+    return ~blocked[asteroid_id, ASTEROID_PADDING:ASTEROID_PADDING + BOARD_SIZE - scheme_height,
+                    ASTEROID_PADDING:ASTEROID_PADDING + BOARD_SIZE - scheme_width]
+
+
+def _add_ionized_fields(game_map: np.ndarray, rng: np.random.Generator):
+    """
+    Places the ionized fields on distinct empty tiles drawn uniformly, at most N_IONIZED_FIELDS of them, fewer only
+    if there aren't enough empty tiles. Returns the animation frames of the fields.
+    """
+    empty = np.flatnonzero(game_map == 0)
+    n_ionized_fields = min(N_IONIZED_FIELDS, len(empty))
+    fields_y, fields_x = np.divmod(rng.choice(empty, size=n_ionized_fields, replace=False), BOARD_SIZE)
+    frames = rng.integers(0, N_IONIZED_FIELD_FRAMES - 1, size=n_ionized_fields)
 
+    game_map[fields_y, fields_x] = 4
+    return {(y, x): frame for y, x, frame in zip(fields_y.tolist(), fields_x.tolist(), frames.tolist())}
 
-def _generate_planet():
+
+def _generate_planet(rng: np.random.Generator):
     """
     Function generates a 9x9 scheme of a new planet, with random ratio of resource fields.
     There are in total 16 resource fields on a planet, and there needs to be at least 1 of each field.
@@ -109,7 +203,7 @@ def _generate_planet():
     resource_fields = []
     fields_left = 16
     for i in range(3):
-        resource_fields.append(np.random.randint(1, fields_left - (3 - i)))
+        resource_fields.append(rng.integers(1, fields_left - (3 - i)))
         fields_left -= resource_fields[-1]
     resource_fields.append(fields_left)
 
@@ -133,16 +227,49 @@ def _add_base_planet_occupation(game_map: np.ndarray, centers:list):
     game_map[centers[1][0] - 4: centers[1][0] + 5, centers[1][1] - 4: centers[1][1] + 5] |= 128
 
 
-def _generate_state_map(game_map: np.ndarray):
+def _build_planets_index(game_map: np.ndarray, planets_centers: np.ndarray):
+    """
+    Function precomputes the tiles and the resource fields of every planet, so that changing the planet's owner
+    doesn't have to search the map.
+
+    :return: flat indices of the planets' tiles, np.ndarray with shape (n_planets, PLANET_MASK.sum()),
+        and the numbers of the planets' resource fields of every type, np.ndarray with shape (n_planets, 4)
+    """
+    planets_cells = ((planets_centers[:, 0, None] + PLANET_OFFSETS_Y) * BOARD_SIZE +
+                     planets_centers[:, 1, None] + PLANET_OFFSETS_X)
+
+    # Ownership bits are ignored
+    tiles = game_map.reshape(-1)[planets_cells] & 63
+    planets_rf = np.stack([np.count_nonzero(tiles == RF_ID_TO_CODING[rf_id], axis=1)
+                           for rf_id in range(len(RF_ID_TO_CODING))], axis=1)
+    return planets_cells, planets_rf
+
+
+def _build_planets_lookup(planets_centers: np.ndarray):
+    """
+    Function precomputes the id of the planet within SHIP_OCCUPATION_RANGE of every tile (-1 if there is none).
+    When the ranges of more planets overlap, the planet with the lowest id is taken.
+
+    :return: np.ndarray with shape (BOARD_SIZE, BOARD_SIZE), indexed by [y, x]
+    """
+    planets_lookup = np.full((BOARD_SIZE, BOARD_SIZE), -1, dtype=np.int16)
+    for planet_id in reversed(range(len(planets_centers))):
+        center_y, center_x = planets_centers[planet_id]
+        planets_lookup[(OCCUPATION_OFFSETS_Y + center_y).clip(0, BOARD_SIZE - 1),
+                       (OCCUPATION_OFFSETS_X + center_x).clip(0, BOARD_SIZE - 1)] = planet_id
+    return planets_lookup
+
+
+def _generate_state_map(game_map: np.ndarray, rng: np.random.Generator):
     state_id_map = np.zeros(shape=game_map.shape)
     land_mask = game_map & 3 == 1
     land_non_zero = np.count_nonzero(land_mask)
-    land_ids = np.random.randint(0, len(LAND.keys()), land_non_zero)
+    land_ids = rng.integers(0, N_LAND_SPRITES, land_non_zero)
     state_id_map[land_mask] = land_ids
 
     asteroid_mask = game_map & 3 == 2
     asteroid_non_zero = np.count_nonzero(asteroid_mask)
-    asteroid_ids = np.random.randint(0, len(ASTEROIDS.keys()), asteroid_non_zero)
+    asteroid_ids = rng.integers(0, N_ASTEROID_SPRITES, asteroid_non_zero)
     state_id_map[asteroid_mask] = asteroid_ids
 
     return state_id_map
@@ -0,0 +1,52 @@
+import numpy as np
+
+from octospace.envs.game_config import BOARD_SIZE, VISION_RANGE, PLANETS_DIAMETER
+
+"""
+Persistent per-player observation maps: the game map with -1 on the tiles the player has not seen yet.
+
+A masked map is built once on reset and afterward only the tiles, which could have changed, are patched:
+the tiles revealed by the player's ships and the surroundings of the captured planets (their ownership bits change
+and the capturing player gets the vision around them).
+"""
+
+
+def _build_masked_map(game_map: np.ndarray, visibility_mask: np.ndarray, masked_map: np.ndarray):
+    masked_map.fill(-1)
+    np.copyto(masked_map, game_map, where=visibility_mask)
+
+
+def _patch_revealed_tiles(game_map: np.ndarray, masked_map: np.ndarray, cells_y: np.ndarray, cells_x: np.ndarray):
+    masked_map[cells_y, cells_x] = game_map[cells_y, cells_x]
+
+
+def _patch_planet_surroundings(
+    game_map: np.ndarray,
+    visibility_mask: np.ndarray,
+    masked_map: np.ndarray,
+    planet_center: np.ndarray
+):
+    # The tiles of the planet itself
+    _patch_window(game_map, visibility_mask, masked_map, planet_center[0], planet_center[1], PLANETS_DIAMETER // 2)
+
+    # The area added to the visibility mask on capture, _add_planet_visibility gets the center's coordinates swapped
+    _patch_window(game_map, visibility_mask, masked_map, planet_center[1], planet_center[0], VISION_RANGE)
+
+
+def _patch_window(
+    game_map: np.ndarray,
+    visibility_mask: np.ndarray,
+    masked_map: np.ndarray,
+    center_y: int,
+    center_x: int,
+    radius: int
+):
+    window = np.s_[max(center_y - radius, 0):min(center_y + radius + 1, BOARD_SIZE),
+                   max(center_x - radius, 0):min(center_x + radius + 1, BOARD_SIZE)]
+    masked_map[window] = np.where(visibility_mask[window], game_map[window], -1)
+
+
+def _read_only_view(array: np.ndarray) -> np.ndarray:
+    view = array.view()
+    view.flags.writeable = False
+    return view
@@ -1,10 +1,12 @@
+import copy
+import json
 from typing import Any, Optional, Tuple
 
 import gymnasium as gym
 from gymnasium import spaces
-import pygame
 import numpy as np
 from gymnasium.core import RenderFrame
+from gymnasium.utils import seeding
 
 
 from octospace.envs.game_config import (MAX_RESOURCES, MAP_MAX_VALUE,
@@ -12,15 +14,19 @@ from octospace.envs.game_config import (MAX_RESOURCES, MAP_MAX_VALUE,
                                         BASE_SHIP_SPEED, SHIP_COST,
                                         PLAYER_1_ORIGIN, PLAYER_2_ORIGIN, N_PLANETS, FIRING_COOLDOWN, MOVE_COOLDOWN,
                                         RESOURCE_PRODUCTION_DIVISOR)
-from octospace.envs.map_assets import BORDER, BORDER_SCORE, generate_players_assets
-from octospace.envs.map_generation import _generate_map, _generate_state_map, _add_base_planet_occupation, _reset_planets_occupation
-from octospace.envs.rendering import (_render_planets, _render_planet_occupation, _render_ongoing_planet_capture, _render_players,
-                       _render_ships, _render_turn, _render_background, _render_team_names, _render_resources,
-                       _render_effects, _render_vision_debug, _render_score)
-from octospace.envs.game_logic import (_ship_firing, _ship_movement, _ship_construction, _occupation_progress,
+from octospace.envs.map_generation import (_generate_map, _generate_state_map, _add_base_planet_occupation,
+                                           _reset_planets_occupation, _build_planets_index, _build_planets_lookup)
+from octospace.envs.game_logic import (_decode_actions, _ship_firing, _ship_movement, _ship_construction, _occupation_progress,
                         _change_ownership_of_planets, _ship_land_interaction, _decrease_cooldowns, _handle_ship_death,
                         _handle_visibility, _add_planet_visibility, _check_victory_conditions)
-from octospace.envs.sound import setup_music_loop, get_new_track
+from octospace.envs.effects import EffectsQueue
+from octospace.envs.ships import ShipStore
+from octospace.envs.state import EngineState
+from octospace.envs.observation import (_build_masked_map, _patch_revealed_tiles, _patch_planet_surroundings,
+                                        _read_only_view)
+from octospace.envs.profiling import PhaseTimer
+from octospace.envs.raster import _raster_frame
+from octospace.envs.sound import setup_music_loop, play_next_track_if_ended, flush_sounds, stop_audio_worker
 
 
 class OctoSpaceEnv(gym.Env):
@@ -29,10 +35,17 @@ class OctoSpaceEnv(gym.Env):
         render_mode: type of visualization, available options: human and rgb_array
         turn_on_music: turn on music and sound effects
         volume: change the volume of music and sound effects
+        seed: seed of the environment's random generator, a seeded environment generates the same maps on every run.
+            reset(seed=...) reseeds it
+        map_bank: path to a map bank (see map_bank.py), new maps are drawn from it instead of being generated
+        raster_scale: with render_mode="rgb_array", frames are built directly in NumPy (see raster.py) with
+            raster_scale x raster_scale pixels per tile. They show only the tiles, the ships and the planets' owners,
+            in return no pygame or effects tracking is needed, so the environment stays headless
+        profile: time every phase of step, the times are returned by stats() (see profiling.py)
 
     Observation Space:
         game_map: whole grid of board_size, which already has applied visibility mask on it
-        allied_ships: an array of all currently available ships for the player. The ships are represented as a list:
+        allied_ships: an array of all currently available ships for the player. The ships are represented as rows:
             (ship id, position x, y, current health points, firing_cooldown, move_cooldown)
             - ship id: int [0, MAX_SHIPS]
             - position x: int [0, board_size]
@@ -48,6 +61,9 @@ class OctoSpaceEnv(gym.Env):
             Planets are represented as: (planet_x, planet_y, occupation_progress)
         resources: current resources available for building
 
+        The map and the ships are read-only arrays. The map is a view of the environment's state, which is updated
+        in place by the next step, so it has to be copied to be kept for later.
+
     Action Space:
         ships_actions: player can provide an action to be executed by every of his ships. The command looks as follows:
             (ship id, 0, direction, speed)
@@ -57,6 +73,16 @@ class OctoSpaceEnv(gym.Env):
         construction: int [0, MAX_RESOURCES // 100] - a number of ships to be constructed
 
     Construction of a new ship requires 100 units from each resource
+
+    reset(options={"map": (game_map, planets_centers, ionized_field_id, state_ids)}) starts the game on the given map
+    instead of a new one, the map is in the format of MapBank.get. It is used to play back recorded games (replay.py).
+
+    By default the environment is headless, it is a training mode, which only runs the game state transitions: with
+    render_mode=None (or frames built by NumPy, see raster_scale) and turn_on_music=False there is no rendering,
+    music, sound or effects tracking and pygame is never imported.
+
+    get_state() and set_state() save and restore the state of the game in microseconds and clone() returns a headless
+    copy of the environment, which is a forward model for lookahead search (see state.py).
     """
 
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 10}
@@ -68,11 +94,15 @@ class OctoSpaceEnv(gym.Env):
                  max_steps: int = 2000,
                  turn_on_music: bool = False,
                  volume: float = 0.25,
-                 seed: Optional[int] = None
+                 seed: Optional[int] = None,
+                 map_bank: Optional[str] = None,
+                 raster_scale: Optional[int] = None,
+                 profile: bool = False
                  ):
         assert BOARD_SIZE > 30
         assert N_PLANETS >= 2
         assert render_mode is None or render_mode in self.metadata['render_modes']
+        assert raster_scale is None or (render_mode == "rgb_array" and raster_scale > 0)
 
         self._turn_on_music = turn_on_music
         self.player_1_id = player_1_id
@@ -85,8 +115,16 @@ class OctoSpaceEnv(gym.Env):
         self.max_steps = max_steps
         self.volume = volume
         self.seed = seed
+        self._np_random, self._np_random_seed = seeding.np_random(seed)
         self.render_mode = render_mode
+        self._raster_scale = raster_scale
+        self._phase_timer = PhaseTimer() if profile else None
         self.debug = False
+        self._map_bank = None
+        if map_bank is not None:
+            # Imported here, so that the map bank module can also be run as a script
+            from octospace.envs.map_bank import MapBank
+            self._map_bank = MapBank(map_bank)
 
         self.observation_space = spaces.Dict({
             player: spaces.Dict({
@@ -159,6 +197,13 @@ class OctoSpaceEnv(gym.Env):
         self._state_ids = None
         self._planets_centers: np.ndarray = None
 
+        # Flat indices of the planets' tiles and the numbers of their resource fields, see _build_planets_index
+        self._planets_cells: np.ndarray = None
+        self._planets_rf: np.ndarray = None
+
+        # Id of the planet, which a ship at the given tile lands on, see _build_planets_lookup
+        self._planets_lookup: np.ndarray = None
+
         # Contain the values between 0 and 100, indicating the occupation progress
         # 0 means the whole planet belongs to 1st player
         # 100 means the whole planet belongs to 2nd player
@@ -174,21 +219,24 @@ class OctoSpaceEnv(gym.Env):
 
         self._player_1_visibility_mask: np.ndarray = None
         self._player_2_visibility_mask: np.ndarray = None
+
+        # The map as seen by the player (-1 on the tiles not visible), patched every step
+        self._player_1_masked_map = np.full((BOARD_SIZE, BOARD_SIZE), -1, dtype=int)
+        self._player_2_masked_map = np.full((BOARD_SIZE, BOARD_SIZE), -1, dtype=int)
+
+        # Number of tiles not visible to each player
+        self._unseen_tiles = np.zeros(2, dtype=int)
+
+        # Names of the arrays shared with saved states, see get_state
+        self._shared = set()
         self.ionized_field_id: dict = None
 
         self._player_1_score = 0
         self._player_2_score = 0
 
         # On start both players have 1 battleship at their base
-        self._player_1_ships: dict = None
-        self._player_2_ships: dict = None
-
-        self._player_1_ships_next_id: int = None
-        self._player_2_ships_next_id: int = None
-
-        # 0 - right, 1 - down, 2 - left, 3 - up
-        self._player_1_ships_facing: dict = None
-        self._player_2_ships_facing: dict = None
+        self._player_1_ships = ShipStore()
+        self._player_2_ships = ShipStore()
 
         self._player_1_resources: np.ndarray = None
         self._player_2_resources: np.ndarray = None
@@ -202,17 +250,22 @@ class OctoSpaceEnv(gym.Env):
         self.victorious_player = [False, False]
         self.terminated = False
 
-        self.window: pygame.Surface = None
-        self.clock: pygame.time.Clock = None
+        # pygame.Surface and pygame.time.Clock, created on the first rendered frame
+        self.window = None
+        self.clock = None
+
+        # Cached layers of the rendered frame: the terrain of the current map, the planets' flags and the canvas
+        # with the rectangles drawn over in the last frame
+        self._terrain_surface = None
+        self._occupation_flags = None
+        self._canvas = None
+        self._dirty_rects = []
 
         """
-        Death effect: (0, pos_x, pos_y, frame)
-        Healing effect: (1, player, ship_id, frame)
-        Firing effect: (2, ship_x, ship_y, facing, frame)
-        Capture effect: (3, pos_x, pos_y, frame)
-        Space jump effect: (4, pos_x, pos_y, frame)
+        Visual effects (death, healing, firing, capture and space jump animations), see effects.py.
+        They are drained by the renderer, so they are tracked only when the environment is rendered.
         """
-        self.effects = None
+        self.effects = None if render_mode is None or raster_scale is not None else EffectsQueue()
 
         self.turn: int = None
         self._round = 0
@@ -220,8 +273,6 @@ class OctoSpaceEnv(gym.Env):
         if self._turn_on_music:
             setup_music_loop(volume=volume)
 
-        pygame.display.set_caption(f"Octospace {VERSION}")
-
     def _get_info(self):
         return {}
 
@@ -247,25 +298,20 @@ class OctoSpaceEnv(gym.Env):
             }
 
     def _get_obs(self):
-        player_1_map = self._map.copy()
-        player_2_map = self._map.copy()
-        player_1_map[~(self._player_1_visibility_mask.astype(bool))] = -1
-        player_2_map[~(self._player_2_visibility_mask.astype(bool))] = -1
-
         return {
             "player_1": {
-                "map": player_1_map,
-                "allied_ships": [[ship_id] + ship for ship_id, ship in self._player_1_ships.items()],
-                "enemy_ships": [[ship_id] + ship for ship_id, ship in self._player_2_ships.items() if self._player_1_visibility_mask[ship[1], ship[0]]],
+                "map": _read_only_view(self._player_1_masked_map),
+                "allied_ships": self._player_1_ships.to_array(),
+                "enemy_ships": self._get_visible_ships(self._player_2_ships, self._player_1_visibility_mask),
                 "planets_occupation": [(planet_x, planet_y, occupation) for (planet_x, planet_y), occupation in
                                        zip(self._planets_centers, self._planets_occupation_progress) if
                                        self._player_1_visibility_mask[planet_x, planet_y]],
                 "resources": self._player_1_resources
             },
             "player_2": {
-                "map": player_2_map,
-                "allied_ships": [[ship_id] + ship for ship_id, ship in self._player_2_ships.items()],
-                "enemy_ships": [[ship_id] + ship for ship_id, ship in self._player_1_ships.items() if self._player_2_visibility_mask[ship[1], ship[0]]],
+                "map": _read_only_view(self._player_2_masked_map),
+                "allied_ships": self._player_2_ships.to_array(),
+                "enemy_ships": self._get_visible_ships(self._player_1_ships, self._player_2_visibility_mask),
                 "planets_occupation": [(planet_x, planet_y, occupation) for (planet_x, planet_y), occupation in
                                        zip(self._planets_centers, self._planets_occupation_progress) if
                                        self._player_2_visibility_mask[planet_x, planet_y]],
@@ -273,22 +319,52 @@ class OctoSpaceEnv(gym.Env):
             }
         }
 
+    @staticmethod
+    def _get_visible_ships(ships: ShipStore, visibility_mask: np.ndarray):
+        slots = ships.active_slots()
+        return ships.to_array(slots[visibility_mask[ships.y[slots], ships.x[slots]]])
+
+    def _update_masked_maps(self, captured: list, revealed: list):
+        """
+        Patches the players' masked maps with the tiles, which could have changed in this step.
+        """
+        if captured or any(len(cells_y) for cells_y, cells_x in revealed):
+            self._own("_player_1_masked_map", "_player_2_masked_map")
+        for masked_map, visibility_mask, (cells_y, cells_x) in zip(
+                (self._player_1_masked_map, self._player_2_masked_map),
+                (self._player_1_visibility_mask, self._player_2_visibility_mask), revealed):
+            _patch_revealed_tiles(self._map, masked_map, cells_y, cells_x)
+            for planet_id in captured:
+                _patch_planet_surroundings(self._map, visibility_mask, masked_map, self._planets_centers[planet_id])
+
+    def _has_pending_captures(self) -> bool:
+        """
+        Whether _change_ownership_of_planets is going to change the owner of any planet in this step.
+        """
+        centers = self._map[self._planets_centers[:, 0], self._planets_centers[:, 1]]
+        progress = np.array(self._planets_occupation_progress)
+        return bool(np.any(((progress == 0) & (centers & 64 != 64)) | ((progress == 100) & (centers & 128 != 128))))
+
+    def _count_unseen_tiles(self):
+        self._unseen_tiles[0] = np.count_nonzero(~self._player_1_visibility_mask)
+        self._unseen_tiles[1] = np.count_nonzero(~self._player_2_visibility_mask)
+
     def reset(
         self,
         *,
         seed: int = None,
         options: dict[str, Any] = None,
     ) -> Tuple[dict, dict]:
-        # On start both players have 1 battleship at their base
-        self._player_1_ships = {0: [PLAYER_1_ORIGIN[0] + 7, PLAYER_1_ORIGIN[1], 100, 0, 0]}
-        self._player_2_ships = {0: [PLAYER_2_ORIGIN[0] - 8, PLAYER_2_ORIGIN[1], 100, 0, 0]}
+        super().reset(seed=seed)
 
-        self._player_1_ships_next_id = 1
-        self._player_2_ships_next_id = 1
+        # The map and the masked maps are modified in place below
+        self._own(*self._shared)
 
-        # 0 - right, 1 - down, 2 - left, 3 - up
-        self._player_1_ships_facing = {0: 1}
-        self._player_2_ships_facing = {0: 3}
+        # On start both players have 1 battleship at their base
+        self._player_1_ships.clear()
+        self._player_2_ships.clear()
+        self._player_1_ships.add(x=PLAYER_1_ORIGIN[0] + 7, y=PLAYER_1_ORIGIN[1], facing=1)
+        self._player_2_ships.add(x=PLAYER_2_ORIGIN[0] - 8, y=PLAYER_2_ORIGIN[1], facing=3)
 
         self._player_1_visibility_mask = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=bool)
         self._player_2_visibility_mask = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=bool)
@@ -302,12 +378,15 @@ class OctoSpaceEnv(gym.Env):
         self.victorious_player = [False, False]
         self.terminated = False
 
-        self.effects = []
+        if self.effects is not None:
+            self.effects.clear()
 
         self.turn = 1
 
         # If it is the 2nd round, then don't generate a new map
-        if self._round % 2 == 0:
+        if options is not None and "map" in options:
+            self._set_map(*options["map"])
+        elif self._round % 2 == 0:
             self._generate_map()
 
         # Handle planets occupation
@@ -317,24 +396,48 @@ class OctoSpaceEnv(gym.Env):
         if self._round != 0:
             self._change_sides()
 
-        generate_players_assets(player_1_id=self.player_1_id, player_2_id=self.player_2_id)
+        # Assets are loaded only when the environment is actually rendered
+        if self.render_mode is not None and self._raster_scale is None:
+            from octospace.envs.map_assets import generate_players_assets
+            generate_players_assets(player_1_id=self.player_1_id, player_2_id=self.player_2_id)
 
         self._reset_planets_occupation_state()
 
+        # The owners of the planets and the players' colors have changed
+        self._occupation_flags = None
+        self._canvas = None
+
         self._round += 1
 
         _add_planet_visibility(self._planets_centers[0][1], self._planets_centers[0][0], self._player_1_visibility_mask)
         _add_planet_visibility(self._planets_centers[1][1], self._planets_centers[1][0], self._player_2_visibility_mask)
 
+        _build_masked_map(self._map, self._player_1_visibility_mask, self._player_1_masked_map)
+        _build_masked_map(self._map, self._player_2_visibility_mask, self._player_2_masked_map)
+        self._count_unseen_tiles()
+
         return self._get_obs(), self._get_info()
 
     def _generate_map(self):
-        self._map, new_planet_centers, ionized_field_id = _generate_map()
-        self._state_ids = _generate_state_map(game_map=self._map)
+        if self._map_bank is not None:
+            self._set_map(*self._map_bank.sample(self.np_random))
+        else:
+            game_map, new_planet_centers, ionized_field_id = _generate_map(rng=self.np_random)
+            state_ids = _generate_state_map(game_map=game_map, rng=self.np_random)
+            self._set_map(game_map, new_planet_centers, ionized_field_id, state_ids)
+
+    def _set_map(self, game_map: np.ndarray, new_planet_centers: np.ndarray, ionized_field_id: dict,
+                 state_ids: np.ndarray):
+        self._map = game_map
+        self._state_ids = state_ids
         self._planets_centers = [PLAYER_1_ORIGIN, PLAYER_2_ORIGIN]
         self._planets_centers.extend(new_planet_centers)
         self._planets_centers = np.array(self._planets_centers, dtype=int)
+        self._planets_cells, self._planets_rf = _build_planets_index(game_map=self._map,
+                                                                     planets_centers=self._planets_centers)
+        self._planets_lookup = _build_planets_lookup(planets_centers=self._planets_centers)
         self.ionized_field_id = ionized_field_id
+        self._terrain_surface = None
 
     def _reset_planets_occupation_state(self):
         self._planets_occupation_progress = [-1 for _ in range(len(self._planets_centers))]
@@ -342,70 +445,222 @@ class OctoSpaceEnv(gym.Env):
         self._planets_occupation_progress[1] = 100
         self._planets_ongoing_occupation = [0 for _ in range(len(self._planets_centers))]
 
+    def get_state(self) -> EngineState:
+        """
+        Returns a snapshot of the current game, which can be restored by set_state, see state.py.
+        The terrain, the planets and the players are not part of it, the state can only be restored into this
+        environment or its clones while they play the same game. Effects, which are purely visual, are not saved.
+        """
+        # The map and the masked maps are shared with the state, until the environment modifies them
+        self._shared.update(("_map", "_player_1_masked_map", "_player_2_masked_map"))
+        return EngineState(
+            turn=self.turn,
+            game_map=self._map,
+            visibility_masks=(self._player_1_visibility_mask.copy(), self._player_2_visibility_mask.copy()),
+            masked_maps=(self._player_1_masked_map, self._player_2_masked_map),
+            unseen_tiles=self._unseen_tiles.copy(),
+            resources=(self._player_1_resources.copy(), self._player_2_resources.copy()),
+            occupied_rf=(self._player_1_occupied_rf.copy(), self._player_2_occupied_rf.copy()),
+            planets_occupation_progress=tuple(self._planets_occupation_progress),
+            planets_ongoing_occupation=tuple(self._planets_ongoing_occupation),
+            victorious_player=tuple(self.victorious_player),
+            terminated=self.terminated,
+            scores=(self._player_1_score, self._player_2_score),
+            ships=(self._player_1_ships.get_state(), self._player_2_ships.get_state())
+        )
+
+    def set_state(self, state: EngineState):
+        self.turn = state.turn
+        self._map = state.game_map
+        self._player_1_masked_map, self._player_2_masked_map = state.masked_maps
+        self._shared.update(("_map", "_player_1_masked_map", "_player_2_masked_map"))
+
+        np.copyto(self._player_1_visibility_mask, state.visibility_masks[0])
+        np.copyto(self._player_2_visibility_mask, state.visibility_masks[1])
+        self._unseen_tiles[:] = state.unseen_tiles
+        self._player_1_resources = state.resources[0].copy()
+        self._player_2_resources = state.resources[1].copy()
+        self._player_1_occupied_rf = state.occupied_rf[0].copy()
+        self._player_2_occupied_rf = state.occupied_rf[1].copy()
+        self._planets_occupation_progress = list(state.planets_occupation_progress)
+        self._planets_ongoing_occupation = list(state.planets_ongoing_occupation)
+        self.victorious_player = list(state.victorious_player)
+        self.terminated = state.terminated
+        self._player_1_score, self._player_2_score = state.scores
+        self._player_1_ships.set_state(state.ships[0])
+        self._player_2_ships.set_state(state.ships[1])
+
+        if self.effects is not None:
+            self.effects.clear()
+        self._occupation_flags = None
+        self._canvas = None
+
+    def clone(self) -> "OctoSpaceEnv":
+        """
+        Returns a headless copy of the environment in the current state, for lookahead search. The clone shares the
+        terrain and the planets with the environment, states saved by either of them can be restored into the other.
+        The clone has its own random generator, seeded on the first use, so resetting it generates a random map.
+        The clone isn't profiled.
+        """
+        clone = copy.copy(self)
+        clone.render_mode = None
+        clone._turn_on_music = False
+        clone.effects = None
+        clone.window = None
+        clone.clock = None
+        clone._terrain_surface = None
+        clone._np_random = None
+        clone._phase_timer = None
+
+        clone._player_1_ships = ShipStore()
+        clone._player_2_ships = ShipStore()
+        clone._player_1_visibility_mask = np.empty_like(self._player_1_visibility_mask)
+        clone._player_2_visibility_mask = np.empty_like(self._player_2_visibility_mask)
+        clone._unseen_tiles = np.empty_like(self._unseen_tiles)
+        clone._shared = set()
+        clone.set_state(self.get_state())
+        return clone
+
+    def stats(self) -> dict:
+        """
+        Returns the number of steps timed so far and the number of calls, total and mean time of every phase of step.
+        Requires profile=True.
+        """
+        assert self._phase_timer is not None, "The environment isn't profiled, create it with profile=True"
+        return self._phase_timer.stats()
+
+    def clear_stats(self):
+        if self._phase_timer is not None:
+            self._phase_timer.clear()
+
+    def _own(self, *names: str):
+        """
+        Copies the arrays shared with saved states, which are about to be modified in place.
+        """
+        for name in self._shared.intersection(names):
+            setattr(self, name, getattr(self, name).copy())
+        self._shared.difference_update(names)
+
+    def _save_state(self) -> dict:
+        """
+        Returns the state of the current game as a flat dict of arrays, including the state of the random generator,
+        restored by _load_state. Used by the replay keyframes.
+        """
+        state = self.get_state().to_arrays()
+        state["rng_state"] = json.dumps(self.np_random.bit_generator.state)
+        return state
+
+    def _load_state(self, state: dict):
+        self.set_state(EngineState.from_arrays(state))
+        self.np_random.bit_generator.state = json.loads(str(state["rng_state"]))
+
     def step(
         self, actions: dict
     ) -> Tuple[dict, dict, bool, bool, dict]:
+        # Marks the end of every phase, if the environment is profiled
+        timer = self._phase_timer
+        if timer is not None:
+            timer.start()
+
         self.turn += 1
         # If the song has ended, play another one
-        if self._turn_on_music and not pygame.mixer.music.get_busy():
-            get_new_track()
+        if self._turn_on_music:
+            play_next_track_if_ended()
 
         # Decrease cooldowns
         _decrease_cooldowns(player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships)
+        if timer is not None:
+            timer.lap("cooldowns")
 
-        ship_1_actions = [ship_id for ship_id in self._player_1_ships.keys()]
-        ship_2_actions = [ship_id for ship_id in self._player_2_ships.keys()]
+        fire_commands, move_commands = _decode_actions(actions=actions, player_1_ships=self._player_1_ships,
+                                                       player_2_ships=self._player_2_ships)
+        if timer is not None:
+            timer.lap("decode")
 
         # Ships firing
-        _ship_firing(actions=actions, player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships,
-                     player_1_ships_facing=self._player_1_ships_facing, player_2_ships_facing=self._player_2_ships_facing,
-                     effects=self.effects, turn_on_music=self._turn_on_music, volume=self.volume, ship_1_actions=ship_1_actions,
-                     ship_2_actions=ship_2_actions)
+        _ship_firing(player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships,
+                     fire_commands=fire_commands, effects=self.effects, turn_on_music=self._turn_on_music,
+                     volume=self.volume)
+        if timer is not None:
+            timer.lap("firing")
 
         # Ship movement
-        _ship_movement(game_map=self._map, actions=actions, player_1_ships=self._player_1_ships,
-                       player_2_ships=self._player_2_ships, player_1_ships_facing=self._player_1_ships_facing,
-                       player_2_ships_facing=self._player_2_ships_facing, effects=self.effects, turn_on_music=self._turn_on_music,
-                       volume=self.volume, ship_1_actions=ship_1_actions, ship_2_actions=ship_2_actions)
+        _ship_movement(game_map=self._map, player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships,
+                       move_commands=move_commands, effects=self.effects, turn_on_music=self._turn_on_music,
+                       volume=self.volume)
+        if timer is not None:
+            timer.lap("movement")
 
         # Construction
         _ship_construction(actions=actions, player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships,
-                           player_1_ships_facing=self._player_1_ships_facing, player_2_ships_facing=self._player_2_ships_facing,
                            player_1_resources=self._player_1_resources, player_2_resources=self._player_2_resources)
+        if timer is not None:
+            timer.lap("construction")
 
         # Change the ownership of newly captured planets
-        _change_ownership_of_planets(game_map=self._map, planets_centers=self._planets_centers,
-                                     planets_occupation_progress=self._planets_occupation_progress, player_1_occupied_rf=self._player_1_occupied_rf,
-                                     player_2_occupied_rf=self._player_2_occupied_rf, player_1_visibility_mask=self._player_1_visibility_mask,
-                                     player_2_visibility_mask=self._player_2_visibility_mask, effects=self.effects,
-                                     turn_on_music=self._turn_on_music, volume=self.volume)
+        if "_map" in self._shared and self._has_pending_captures():
+            self._own("_map")
+        captured = _change_ownership_of_planets(game_map=self._map, planets_centers=self._planets_centers,
+                                                planets_cells=self._planets_cells, planets_rf=self._planets_rf,
+                                                planets_occupation_progress=self._planets_occupation_progress, player_1_occupied_rf=self._player_1_occupied_rf,
+                                                player_2_occupied_rf=self._player_2_occupied_rf, player_1_visibility_mask=self._player_1_visibility_mask,
+                                                player_2_visibility_mask=self._player_2_visibility_mask, effects=self.effects,
+                                                turn_on_music=self._turn_on_music, volume=self.volume)
+        if timer is not None:
+            timer.lap("ownership")
 
         # Resource production
         self._player_1_resources = np.clip(self._player_1_resources + self._player_1_occupied_rf // RESOURCE_PRODUCTION_DIVISOR, 0, MAX_RESOURCES)
         self._player_2_resources = np.clip(self._player_2_resources + self._player_2_occupied_rf // RESOURCE_PRODUCTION_DIVISOR, 0, MAX_RESOURCES)
+        if timer is not None:
+            timer.lap("production")
 
         # Occupation progress
         _occupation_progress(planets_centers=self._planets_centers, planets_occupation_progress=self._planets_occupation_progress,
                              planets_ongoing_occupation=self._planets_ongoing_occupation)
+        if timer is not None:
+            timer.lap("occupation")
 
         # Planet capture and ship healing
-        _ship_land_interaction(game_map=self._map, planets_centers=self._planets_centers, planets_occupation_progress=self._planets_occupation_progress,
+        _ship_land_interaction(game_map=self._map, planets_lookup=self._planets_lookup, planets_occupation_progress=self._planets_occupation_progress,
                                planets_ongoing_occupation=self._planets_ongoing_occupation,
                                player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships,
-                               player_1_ships_facing=self._player_1_ships_facing, player_2_ships_facing=self._player_2_ships_facing,
                                effects=self.effects)
+        if timer is not None:
+            timer.lap("land_interaction")
+
+        _handle_ship_death(player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships, effects=self.effects, turn_on_music=self._turn_on_music, volume=self.volume)
+        if timer is not None:
+            timer.lap("death")
 
-        _handle_ship_death(player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships, player_1_ships_facing=self._player_1_ships_facing,
-                           player_2_ships_facing=self._player_2_ships_facing, effects=self.effects, turn_on_music=self._turn_on_music, volume=self.volume)
+        # Captured planets reveal their surroundings
+        if captured:
+            self._count_unseen_tiles()
+            self._occupation_flags = None
 
-        _handle_visibility(player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships, player_1_visibility_mask=self._player_1_visibility_mask,
-                           player_2_visibility_mask=self._player_2_visibility_mask)
+        revealed = _handle_visibility(player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships, player_1_visibility_mask=self._player_1_visibility_mask,
+                                      player_2_visibility_mask=self._player_2_visibility_mask, unseen_tiles=self._unseen_tiles)
+        if timer is not None:
+            timer.lap("visibility")
+
+        self._update_masked_maps(captured=captured, revealed=revealed)
 
         self._victory_conditions()
 
-        return self._get_obs(), self._get_reward(), self.terminated, False, self._get_info()
+        # Play the sounds of this turn in the background
+        if self._turn_on_music:
+            flush_sounds()
+
+        obs = self._get_obs()
+        if timer is not None:
+            timer.lap("observation")
+        return obs, self._get_reward(), self.terminated, False, self._get_info()
 
     def render(self) -> RenderFrame:
+        if self._raster_scale is not None:
+            return _raster_frame(game_map=self._map, player_1_ships=self._player_1_ships,
+                                 player_2_ships=self._player_2_ships, pixels_per_tile=self._raster_scale)
+
         if self.render_mode == "rgb_array":
             return self._render_frame()
 
@@ -413,45 +668,72 @@ class OctoSpaceEnv(gym.Env):
             self._render_frame()
 
     def _render_frame(self):
+        import pygame
+        from octospace.envs.map_assets import BORDER, BORDER_SCORE
+        from octospace.envs.rendering import (_render_terrain, _render_ionized_fields, _get_occupation_flags,
+                                              _render_planet_occupation, _render_ongoing_planet_capture,
+                                              _render_players, _render_ships, _render_turn, _render_team_names,
+                                              _render_resources, _render_effects, _render_vision_debug, _render_score)
+
         if self.window is None and self.render_mode == "human":
             pygame.init()
             pygame.display.init()
             self.window = pygame.display.set_mode((WINDOW_SIZE + 2*GUI_SIZE + 2*BORDER_WIDTH, WINDOW_SIZE))
+            pygame.display.set_caption(f"Octospace {VERSION}")
+            self._canvas = None
         if self.clock is None and self.render_mode == "human":
             self.clock = pygame.time.Clock()
 
-        canvas = pygame.Surface((WINDOW_SIZE, WINDOW_SIZE))
-        _render_background(canvas)
+        # Terrain is rendered once per map, planets' flags once per change of their owners
+        if self._terrain_surface is None:
+            self._terrain_surface = _render_terrain(game_map=self._map, state_ids_map=self._state_ids)
+            self._canvas = None
+        if self._occupation_flags is None:
+            self._occupation_flags = _get_occupation_flags(game_map=self._map, planets_centers=self._planets_centers,
+                                                           player_1_id=self.player_1_id, player_2_id=self.player_2_id)
+
+        # Only the parts of the canvas drawn over in the previous frame are restored from the terrain
+        if self._canvas is None:
+            self._canvas = self._terrain_surface.copy()
+            full_redraw = True
+        else:
+            for rect in self._dirty_rects:
+                self._canvas.blit(self._terrain_surface, rect, area=rect)
+            full_redraw = False
+        canvas = self._canvas
+        previous_rects = self._dirty_rects
+
+        rects = []
 
-        # Render planets
-        _render_planets(canvas, game_map=self._map, state_ids_map=self._state_ids, ionized_field_id=self.ionized_field_id)
+        # Render ionized fields
+        rects += _render_ionized_fields(canvas, ionized_field_id=self.ionized_field_id)
 
         # Render planets occupation
-        _render_planet_occupation(canvas, game_map=self._map, planets_centers=self._planets_centers, player_1_id=self.player_1_id, player_2_id=self.player_2_id)
+        rects += _render_planet_occupation(canvas, occupation_flags=self._occupation_flags)
 
         # Render ongoing planet capture
-        _render_ongoing_planet_capture(canvas, planets_occupation=self._planets_occupation_progress,
-                                       planets_centers=self._planets_centers, player_1_id=self.player_1_id, player_2_id=self.player_2_id)
+        rects += _render_ongoing_planet_capture(canvas, planets_occupation=self._planets_occupation_progress,
+                                                planets_centers=self._planets_centers, player_1_id=self.player_1_id, player_2_id=self.player_2_id)
 
         # Render players
-        _render_players(canvas, player_1_id=self.player_1_id, player_2_id=self.player_2_id)
+        rects += _render_players(canvas, player_1_id=self.player_1_id, player_2_id=self.player_2_id)
 
         # Render ships
-        _render_ships(canvas, player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships,
-                      player_1_ships_facing=self._player_1_ships_facing, player_2_ships_facing=self._player_2_ships_facing)
+        rects += _render_ships(canvas, player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships)
 
         # Display which turn currently is it
-        _render_turn(canvas, turn=self.turn)
+        rects += _render_turn(canvas, turn=self.turn)
 
         # Render effects
-        _render_effects(canvas, game_map=self._map, effects=self.effects, player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships,
-                        player_1_ships_facing=self._player_1_ships_facing, player_2_ships_facing=self._player_2_ships_facing)
+        rects += _render_effects(canvas, game_map=self._map, effects=self.effects, player_1_ships=self._player_1_ships, player_2_ships=self._player_2_ships)
 
         # Vision debug
         if self.debug:
-            _render_vision_debug(canvas, player_1_visibility_mask=self._player_1_visibility_mask,
-                                 player_2_visibility_mask=self._player_2_visibility_mask, player_1_id=self.player_1_id,
-                                 player_2_id=self.player_2_id)
+            rects += _render_vision_debug(canvas, player_1_visibility_mask=self._player_1_visibility_mask,
+                                          player_2_visibility_mask=self._player_2_visibility_mask, player_1_id=self.player_1_id,
+                                          player_2_id=self.player_2_id)
+
+        self._dirty_rects = [rect.clip(canvas.get_rect()) for rect in rects]
 
         if self.render_mode == "human":
             self.window.blit(canvas, (GUI_SIZE + BORDER_WIDTH, 0))
@@ -459,15 +741,20 @@ class OctoSpaceEnv(gym.Env):
             self.window.blit(BORDER_SCORE, (GUI_SIZE+25, 0))
 
             if self.player_1_id == self._players_rendering_order[0]:
-                _render_resources(self.window, player_1_resources=self._player_1_resources, player_2_resources=self._player_2_resources)
+                window_rects = _render_resources(self.window, player_1_resources=self._player_1_resources, player_2_resources=self._player_2_resources)
             else:
-                _render_resources(self.window, player_1_resources=self._player_2_resources,
-                                 player_2_resources=self._player_1_resources)
+                window_rects = _render_resources(self.window, player_1_resources=self._player_2_resources,
+                                                 player_2_resources=self._player_1_resources)
             _render_team_names(self.window, player_ids=[self.player_1_id, self.player_2_id])
-            _render_score(self.window, player_1_score=self._player_1_score, player_2_score=self._player_2_score)
+            window_rects += _render_score(self.window, player_1_score=self._player_1_score, player_2_score=self._player_2_score)
 
             pygame.event.pump()
-            pygame.display.update()
+            if full_redraw:
+                pygame.display.update()
+            else:
+                # Only the parts of the window, which could have changed, are sent to the display
+                pygame.display.update([rect.move(GUI_SIZE + BORDER_WIDTH, 0) for rect in previous_rects + self._dirty_rects]
+                                      + window_rects)
 
             self.clock.tick(self.metadata["render_fps"])
         else:
@@ -493,7 +780,11 @@ class OctoSpaceEnv(gym.Env):
         self.player_1_id, self.player_2_id = self.player_2_id, self.player_1_id
 
     def close(self):
+        if self._turn_on_music:
+            stop_audio_worker()
+
         if self.window is not None:
+            import pygame
             if self._turn_on_music:
                 pygame.mixer.music.stop()
             pygame.display.quit()
@@ -0,0 +1,51 @@
+import time
+
+"""
+Opt-in timing of the phases of OctoSpaceEnv.step, enabled by OctoSpaceEnv(profile=True) and read by env.stats().
+
+step marks the end of every phase with lap(), which adds the time elapsed since the previous mark to the phase.
+Without profiling the environment has no timer and every mark is a single check of a local variable, so a step
+costs the same as before.
+"""
+
+# Phases of step in the order of their execution
+PHASES = ("cooldowns", "decode", "firing", "movement", "construction", "ownership", "production", "occupation",
+          "land_interaction", "death", "visibility", "observation")
+
+
+class PhaseTimer:
+    def __init__(self):
+        self._times = dict.fromkeys(PHASES, 0.0)
+        self._calls = dict.fromkeys(PHASES, 0)
+        self._steps = 0
+        self._last = 0.0
+
+    def clear(self):
+        self.__init__()
+
+    def start(self):
+        """
+        Marks the beginning of a step.
+        """
+        self._steps += 1
+        self._last = time.perf_counter()
+
+    def lap(self, phase: str):
+        """
+        Marks the end of the phase.
+        """
+        now = time.perf_counter()
+        self._times[phase] += now - self._last
+        self._calls[phase] += 1
+        self._last = now
+
+    def stats(self) -> dict:
+        """
+        Returns the number of timed steps and for every phase its number of calls, total and mean time in milliseconds.
+        """
+        return {
+            "steps": self._steps,
+            "phases": {phase: {"calls": self._calls[phase], "total_ms": self._times[phase] * 1e3,
+                               "mean_ms": self._times[phase] * 1e3 / max(self._calls[phase], 1)}
+                       for phase in PHASES}
+        }
@@ -0,0 +1,120 @@
+from typing import Optional
+
+import numpy as np
+
+from octospace.envs.game_config import MAP_MAX_VALUE, RF_CODING_TO_ID
+from octospace.envs.ships import ShipStore
+
+"""
+Rendering of the board straight into RGB arrays, without pygame.
+
+Every tile is drawn as a square of pixels_per_tile x pixels_per_tile pixels of a single color, looked up in a palette
+indexed by the map code. The palette has a few more entries past the map codes, for the ships of both players and for
+the tiles a player hasn't seen yet, so the ships and the fog of war are stamped onto the index map before the single
+palette lookup. Whole batches of maps are rendered at once, which is what the vectorized environment uses.
+
+Copying 3-byte pixels one by one is slow, so the palette lookup already returns whole rows of a tile: every entry of
+a scaled palette is the color repeated pixels_per_tile times. The rows are then repeated pixels_per_tile times
+with a single contiguous copy.
+"""
+
+SPACE_COLOR = (0, 0, 0)
+LAND_COLOR = (96, 96, 96)
+ASTEROID_COLOR = (120, 84, 48)
+ROUGH_TERRAIN_COLOR = (56, 56, 56)
+IONIZED_FIELD_COLOR = (150, 60, 210)
+RESOURCE_FIELD_COLORS = ((230, 200, 40), (60, 200, 90), (40, 170, 220), (230, 120, 40))
+PLAYER_COLORS = ((255, 64, 64), (64, 128, 255))
+FOG_COLOR = (32, 32, 32)
+
+# Share of the player's color in the color of a tile owned by the player
+OWNERSHIP_TINT = 0.4
+
+# Palette entries past the map codes
+SHIP_INDEX = (MAP_MAX_VALUE + 1, MAP_MAX_VALUE + 2)
+FOG_INDEX = MAP_MAX_VALUE + 3
+
+
+def _build_palette() -> np.ndarray:
+    codes = np.arange(MAP_MAX_VALUE + 1)
+    colors = np.zeros((len(codes), 3))
+    colors[:] = SPACE_COLOR
+    colors[codes & 4 == 4] = IONIZED_FIELD_COLOR
+    colors[codes & 3 == 1] = LAND_COLOR
+    colors[codes & 3 == 2] = ASTEROID_COLOR
+    colors[codes & 3 == 3] = ROUGH_TERRAIN_COLOR
+    for rf_coding, rf_id in RF_CODING_TO_ID.items():
+        colors[(codes & 3 == 1) & (codes & 57 == rf_coding)] = RESOURCE_FIELD_COLORS[rf_id]
+
+    # Owned tiles are tinted with the color of their owner
+    for player, ownership_bit in enumerate((64, 128)):
+        owned = codes & ownership_bit == ownership_bit
+        colors[owned] = (1 - OWNERSHIP_TINT) * colors[owned] + OWNERSHIP_TINT * np.array(PLAYER_COLORS[player])
+
+    palette = np.concatenate([colors, PLAYER_COLORS, [FOG_COLOR]])
+    return np.rint(palette).astype(np.uint8)
+
+
+PALETTE = _build_palette()
+
+# Palettes with the colors repeated pixels_per_tile times, as single opaque items, keyed by pixels_per_tile
+_scaled_palettes = {}
+
+
+def _get_scaled_palette(pixels_per_tile: int) -> np.ndarray:
+    scaled_palette = _scaled_palettes.get(pixels_per_tile)
+    if scaled_palette is None:
+        scaled_palette = np.ascontiguousarray(np.tile(PALETTE, (1, pixels_per_tile)))
+        scaled_palette = _scaled_palettes[pixels_per_tile] = scaled_palette.view(f"V{3 * pixels_per_tile}")[:, 0]
+    return scaled_palette
+
+
+def _raster_frames(
+    maps: np.ndarray,
+    ship_games: np.ndarray,
+    ship_players: np.ndarray,
+    ship_x: np.ndarray,
+    ship_y: np.ndarray,
+    pixels_per_tile: int = 1,
+    visibility_masks: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Renders N maps of shape (N, B, B) into an (N, B * pixels_per_tile, B * pixels_per_tile, 3) uint8 array.
+
+    Ships are given as flat arrays of their games, players (0 or 1) and positions, a tile with ships of both players
+    gets the color of the 2nd player. With (N, B, B) visibility masks the tiles outside of them are covered by fog,
+    together with the ships on them.
+    """
+    indices = maps.astype(np.intp)
+    indices[ship_games, ship_y, ship_x] = np.take(SHIP_INDEX, ship_players)
+    if visibility_masks is not None:
+        np.copyto(indices, FOG_INDEX, where=~visibility_masks)
+
+    n, height, width = maps.shape
+    rows = np.take(_get_scaled_palette(pixels_per_tile), indices).view(np.uint8)
+    rows = rows.reshape(n, height, 1, width * pixels_per_tile * 3)
+    if pixels_per_tile > 1:
+        rows = np.broadcast_to(rows, (n, height, pixels_per_tile, width * pixels_per_tile * 3))
+    return rows.reshape(n, height * pixels_per_tile, width * pixels_per_tile, 3)
+
+
+def _raster_frame(
+    game_map: np.ndarray,
+    player_1_ships: ShipStore,
+    player_2_ships: ShipStore,
+    pixels_per_tile: int = 1,
+    visibility_mask: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Renders a single game, see _raster_frames.
+    """
+    slots = [player_1_ships.active_slots(), player_2_ships.active_slots()]
+    ship_x = np.concatenate([player_1_ships.x[slots[0]], player_2_ships.x[slots[1]]])
+    ship_y = np.concatenate([player_1_ships.y[slots[0]], player_2_ships.y[slots[1]]])
+    ship_players = np.repeat([0, 1], [len(slots[0]), len(slots[1])])
+
+    return _raster_frames(
+        maps=game_map[None], ship_games=np.zeros(len(ship_x), dtype=int), ship_players=ship_players,
+        ship_x=ship_x, ship_y=ship_y, pixels_per_tile=pixels_per_tile,
+        visibility_masks=None if visibility_mask is None else visibility_mask[None]
+    )[0]
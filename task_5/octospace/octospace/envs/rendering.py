@@ -12,6 +12,9 @@ from octospace.envs.map_assets import (LAND, RESOURCE_FIELDS_MARKERS, ASTEROIDS,
     PLAYER_ICON, RESOURCE_FIELDS_ICONS, RESOURCE_FIELDS_BARS, DEATH_EFFECT_ANIMATION, HEALING_EFFECT_ANIMATION,
                         FIRING_EFFECT_ANIMATION, CAPTURE_EFFECT_ANIMATION, SPACE_JUMP_EFFECT_ANIMATION, ROUGH_TERRAIN,
                         ROUGH_TERRAIN_FLAG, ROUGH_TERRAIN_CORNER)
+from octospace.envs.effects import (EffectsQueue, EFFECT_FRAMES, DEATH_EFFECT, HEALING_EFFECT, FIRING_EFFECT,
+                                    CAPTURE_EFFECT, SPACE_JUMP_EFFECT)
+from octospace.envs.ships import ShipStore
 
 from matches_config import TEAMS_ABBREVIATIONS
 
@@ -28,59 +31,72 @@ def _render_background(canvas: pygame.Surface):
     canvas.blit(pygame.transform.scale(BACKGROUND, (WINDOW_SIZE, WINDOW_SIZE)), BACKGROUND.get_rect())
 
 
-def _render_planets(
-        canvas: pygame.Surface,
+def _render_terrain(
         game_map: np.ndarray,
-        state_ids_map: np.ndarray,
-        ionized_field_id: dict):
-    for y in range(BOARD_SIZE):
-        for x in range(BOARD_SIZE):
-            block = game_map[y, x]
-            if block & 3 == 1:
-                canvas.blit(LAND[state_ids_map[y, x]], (x * TILE_SIZE, y * TILE_SIZE))
-                # Render resource fields marks
-                if block & 57 != 1:
-                    rf_coding = block & 57
-                    canvas.blit(RESOURCE_FIELDS_MARKERS[RF_CODING_TO_ID[rf_coding]],
-                                (x * TILE_SIZE + RF_MARKER_ADJUSTMENT, y * TILE_SIZE + RF_MARKER_ADJUSTMENT))
-            elif block & 3 == 2:
-                canvas.blit(ASTEROIDS[state_ids_map[y, x]], (x * TILE_SIZE, y * TILE_SIZE))
-            elif block & 3 == 3:
-                if game_map[y-1, x] & 57 != 1:
-                    if game_map[y, x-1] & 57 != 1:
-                        canvas.blit(ROUGH_TERRAIN_CORNER[3], (x * TILE_SIZE, y * TILE_SIZE))
-                    elif game_map[y, x+1] & 57 != 1:
-                        canvas.blit(ROUGH_TERRAIN_CORNER[2], (x * TILE_SIZE, y * TILE_SIZE))
-                    else:
-                        canvas.blit(ROUGH_TERRAIN[1], (x * TILE_SIZE, y * TILE_SIZE))
-                elif game_map[y+1, x] & 57 != 1:
-                    if game_map[y, x-1] & 57 != 1:
-                        canvas.blit(ROUGH_TERRAIN_CORNER[0], (x * TILE_SIZE, y * TILE_SIZE))
-                    elif game_map[y, x+1] & 57 != 1:
-                        canvas.blit(ROUGH_TERRAIN_CORNER[1], (x * TILE_SIZE, y * TILE_SIZE))
-                    else:
-                        canvas.blit(ROUGH_TERRAIN[3], (x * TILE_SIZE, y * TILE_SIZE))
-                elif game_map[y, x-1] & 57 != 1:
-                    canvas.blit(ROUGH_TERRAIN[2], (x * TILE_SIZE, y * TILE_SIZE))
+        state_ids_map: np.ndarray):
+    """
+    Renders the background with the land, asteroid and rough terrain tiles, which don't change during the match.
+    """
+    terrain = pygame.Surface((WINDOW_SIZE, WINDOW_SIZE))
+    _render_background(terrain)
+
+    for y, x in np.argwhere(game_map & 3).tolist():
+        block = game_map[y, x]
+        if block & 3 == 1:
+            terrain.blit(LAND[state_ids_map[y, x]], (x * TILE_SIZE, y * TILE_SIZE))
+            # Render resource fields marks
+            if block & 57 != 1:
+                rf_coding = block & 57
+                terrain.blit(RESOURCE_FIELDS_MARKERS[RF_CODING_TO_ID[rf_coding]],
+                             (x * TILE_SIZE + RF_MARKER_ADJUSTMENT, y * TILE_SIZE + RF_MARKER_ADJUSTMENT))
+        elif block & 3 == 2:
+            terrain.blit(ASTEROIDS[state_ids_map[y, x]], (x * TILE_SIZE, y * TILE_SIZE))
+        else:
+            if game_map[y-1, x] & 57 != 1:
+                if game_map[y, x-1] & 57 != 1:
+                    terrain.blit(ROUGH_TERRAIN_CORNER[3], (x * TILE_SIZE, y * TILE_SIZE))
                 elif game_map[y, x+1] & 57 != 1:
-                    canvas.blit(ROUGH_TERRAIN[0], (x * TILE_SIZE, y * TILE_SIZE))
+                    terrain.blit(ROUGH_TERRAIN_CORNER[2], (x * TILE_SIZE, y * TILE_SIZE))
                 else:
-                    canvas.blit(ROUGH_TERRAIN_FLAG, (x * TILE_SIZE, y * TILE_SIZE))
+                    terrain.blit(ROUGH_TERRAIN[1], (x * TILE_SIZE, y * TILE_SIZE))
+            elif game_map[y+1, x] & 57 != 1:
+                if game_map[y, x-1] & 57 != 1:
+                    terrain.blit(ROUGH_TERRAIN_CORNER[0], (x * TILE_SIZE, y * TILE_SIZE))
+                elif game_map[y, x+1] & 57 != 1:
+                    terrain.blit(ROUGH_TERRAIN_CORNER[1], (x * TILE_SIZE, y * TILE_SIZE))
+                else:
+                    terrain.blit(ROUGH_TERRAIN[3], (x * TILE_SIZE, y * TILE_SIZE))
+            elif game_map[y, x-1] & 57 != 1:
+                terrain.blit(ROUGH_TERRAIN[2], (x * TILE_SIZE, y * TILE_SIZE))
+            elif game_map[y, x+1] & 57 != 1:
+                terrain.blit(ROUGH_TERRAIN[0], (x * TILE_SIZE, y * TILE_SIZE))
+            else:
+                terrain.blit(ROUGH_TERRAIN_FLAG, (x * TILE_SIZE, y * TILE_SIZE))
+    return terrain
 
-            # Render ionized fields
-            elif block & 4 == 4:
-                effect_loc_adjustment = TILE_SIZE // 2 - EFFECT_IONIZED_FIELD_SIZE // 2
-                canvas.blit(IONIZED_FIELDS[ionized_field_id[(y, x)]],
-                            (x * TILE_SIZE + effect_loc_adjustment, y * TILE_SIZE + effect_loc_adjustment))
-                ionized_field_id[(y, x)] = (ionized_field_id[(y, x)] + 1) % len(IONIZED_FIELDS)
 
-def _render_planet_occupation(
-    canvas: pygame.Surface,
+def _render_ionized_fields(
+        canvas: pygame.Surface,
+        ionized_field_id: dict):
+    rects = []
+    effect_loc_adjustment = TILE_SIZE // 2 - EFFECT_IONIZED_FIELD_SIZE // 2
+    for (y, x), frame in ionized_field_id.items():
+        rects.append(canvas.blit(IONIZED_FIELDS[frame],
+                                 (x * TILE_SIZE + effect_loc_adjustment, y * TILE_SIZE + effect_loc_adjustment)))
+        ionized_field_id[(y, x)] = (frame + 1) % len(IONIZED_FIELDS)
+    return rects
+
+
+def _get_occupation_flags(
     game_map: np.ndarray,
     planets_centers: list,
     player_1_id: int,
     player_2_id: int
 ):
+    """
+    Returns the flags of the planets' owners as (image, position) pairs, they only change when a planet is captured.
+    """
+    occupation_flags = []
     for center in planets_centers:
         if game_map[center[0], center[1]] & 64 == 64:
             flag_image = OCCUPATION_FLAG.copy()
@@ -91,7 +107,17 @@ def _render_planet_occupation(
         else:
             flag_image = OCCUPATION_FLAG_CROSSED
 
-        canvas.blit(flag_image,(center[1] * TILE_SIZE + FLAG_ICON_ADJUSTMENT, center[0] * TILE_SIZE + FLAG_ICON_ADJUSTMENT))
+        occupation_flags.append((flag_image, (center[1] * TILE_SIZE + FLAG_ICON_ADJUSTMENT,
+                                              center[0] * TILE_SIZE + FLAG_ICON_ADJUSTMENT)))
+    return occupation_flags
+
+
+def _render_planet_occupation(
+    canvas: pygame.Surface,
+    occupation_flags: list
+):
+    return [canvas.blit(flag_image, position) for flag_image, position in occupation_flags]
+
 
 def _render_ongoing_planet_capture(
     canvas: pygame.Surface,
@@ -100,6 +126,7 @@ def _render_ongoing_planet_capture(
     player_1_id: int,
     player_2_id: int
 ):
+    rects = []
     for e, occupation in enumerate(planets_occupation):
         if occupation not in [-1, 0, 100]:
             planet_y, planet_x = planets_centers[e]
@@ -121,50 +148,40 @@ def _render_ongoing_planet_capture(
                              (OCCUPATION_BAR_COLOR_MARGIN + player_1_color_surface_width, OCCUPATION_BAR_COLOR_MARGIN),
                              special_flags=BLEND_MULT)
 
-            canvas.blit(bar_filling, ((planet_x - 4) * TILE_SIZE + 15, (planet_y + 5) * TILE_SIZE + 5))
+            rects.append(canvas.blit(bar_filling, ((planet_x - 4) * TILE_SIZE + 15, (planet_y + 5) * TILE_SIZE + 5)))
+    return rects
 
 def _render_players(
     canvas: pygame.Surface,
     player_1_id: int,
     player_2_id: int
 ):
-    canvas.blit(TEAM_ICONS[player_1_id], (ABS_PLAYER_1_ICON_POS, ABS_PLAYER_1_ICON_POS))
-    canvas.blit(TEAM_ICONS[player_2_id], (ABS_PLAYER_2_ICON_POS, ABS_PLAYER_2_ICON_POS))
+    return [canvas.blit(TEAM_ICONS[player_1_id], (ABS_PLAYER_1_ICON_POS, ABS_PLAYER_1_ICON_POS)),
+            canvas.blit(TEAM_ICONS[player_2_id], (ABS_PLAYER_2_ICON_POS, ABS_PLAYER_2_ICON_POS))]
 
 
 def _render_ships(
     canvas: pygame.Surface,
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict,
+    player_1_ships: ShipStore,
+    player_2_ships: ShipStore
 ):
-    for key in player_1_ships.keys():
-        ship = player_1_ships[key]
-        x, y = ship[0], ship[1]
-        ship_loc_adjustment = TILE_SIZE // 2 - (
-            SHIP_SIZE // 2 if player_1_ships_facing[key] in [1, 3] else SIDE_SHIP_SIZE // 2)
-        ship_x = x * TILE_SIZE + ship_loc_adjustment
-        ship_y = y * TILE_SIZE + ship_loc_adjustment
-        canvas.blit(SHIP_ORIENTATIONS_1[player_1_ships_facing[key]], (ship_x, ship_y))
-        ship_text = ship_font.render(f"{ship[2]}%", False, _get_ship_text_color(ship))
-        canvas.blit(ship_text, (ship_x, ship_y - 12))
-
-    for key in player_2_ships.keys():
-        ship = player_2_ships[key]
-        x, y = ship[0], ship[1]
-        ship_loc_adjustment = TILE_SIZE // 2 - (
-            SHIP_SIZE // 2 if player_2_ships_facing[key] in [1, 3] else SIDE_SHIP_SIZE // 2)
-        ship_x = x * TILE_SIZE + ship_loc_adjustment
-        ship_y = y * TILE_SIZE + ship_loc_adjustment
-        canvas.blit(SHIP_ORIENTATIONS_2[player_2_ships_facing[key]], (ship_x, ship_y))
-        ship_text = ship_font.render(f"{ship[2]}%", False, _get_ship_text_color(ship))
-        canvas.blit(ship_text, (ship_x, ship_y - 12))
+    rects = []
+    for ships, ship_orientations in ((player_1_ships, SHIP_ORIENTATIONS_1), (player_2_ships, SHIP_ORIENTATIONS_2)):
+        for slot in ships.active_slots():
+            x, y, facing = int(ships.x[slot]), int(ships.y[slot]), int(ships.facing[slot])
+            ship_loc_adjustment = TILE_SIZE // 2 - (
+                SHIP_SIZE // 2 if facing in [1, 3] else SIDE_SHIP_SIZE // 2)
+            ship_x = x * TILE_SIZE + ship_loc_adjustment
+            ship_y = y * TILE_SIZE + ship_loc_adjustment
+            rects.append(canvas.blit(ship_orientations[facing], (ship_x, ship_y)))
+            ship_text = ship_font.render(f"{ships.hp[slot]}%", False, _get_ship_text_color(ships.hp[slot]))
+            rects.append(canvas.blit(ship_text, (ship_x, ship_y - 12)))
+    return rects
 
 
 def _render_turn(canvas, turn):
     turn_text = turn_counter_font.render(f'TURN: {turn}', False, (255, 255, 255))
-    canvas.blit(turn_text, (WINDOW_SIZE - 200, 50))
+    return [canvas.blit(turn_text, (WINDOW_SIZE - 200, 50))]
 
 
 # Team rendering is always performed in the same order
@@ -197,6 +214,7 @@ def _render_resources(
     player_1_resources: np.ndarray,
     player_2_resources: np.ndarray
 ):
+    rects = []
     for player in range(2):
         resource_surface = pygame.Surface((GUI_SIZE+20, WINDOW_SIZE))
 
@@ -211,7 +229,8 @@ def _render_resources(
             resource_surface.blit(RESOURCE_FIELDS_BARS[rf_id][bar_state_id], (30, 100 + 100 * rf_id))
             resource_surface.blit(resource_text, (42, 120 + rf_id * 100))
 
-        window.blit(resource_surface, (player * (WINDOW_SIZE + GUI_SIZE + 2*BORDER_WIDTH - 30), player * (WINDOW_SIZE - 500)))
+        rects.append(window.blit(resource_surface, (player * (WINDOW_SIZE + GUI_SIZE + 2*BORDER_WIDTH - 30), player * (WINDOW_SIZE - 500))))
+    return rects
 
 
 def _render_score(
@@ -232,72 +251,44 @@ def _render_score(
     upper_dist = int(WINDOW_SIZE * 0.01)
 
     score_text = scoreboard_font.render(f"{player_1_score} : {player_2_score}", False, (255, 255, 255))
-    window.blit(score_text, (left_dist, upper_dist))
+    return [window.blit(score_text, (left_dist, upper_dist))]
 
 
 
 def _render_effects(
     canvas: pygame.Surface,
     game_map: np.ndarray,
-    effects: list,
-    player_1_ships: dict,
-    player_2_ships: dict,
-    player_1_ships_facing: dict,
-    player_2_ships_facing: dict
+    effects: EffectsQueue,
+    player_1_ships: ShipStore,
+    player_2_ships: ShipStore
 ):
     """
     Effects
     """
-    # Delete all expired effects
-    i = 0
-    while i < len(effects):
-        if effects[i][0] == 0 and effects[i][3] == 15:
-            effects.pop(i)
-        elif effects[i][0] == 1 and effects[i][3] == 15:
-            # Reset frame counter
-            effects[i][3] %= 15
-        elif effects[i][0] == 2 and effects[i][4] == 5:
-            effects.pop(i)
-        elif effects[i][0] == 3 and effects[i][3] == 12:
-            effects.pop(i)
-        elif effects[i][0] == 4 and effects[i][3] == 9:
-            effects.pop(i)
-        else:
-            i += 1
-
-    for e, effect in enumerate(effects):
-        effect_id = effect[0]
-
-        # Death effect
-        if effect_id == 0:
-            pos_x, pos_y, frame = effect[1], effect[2], effect[3]
-            canvas.blit(DEATH_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_DEATH_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_DEATH_ADJUSTMENT))
+    rects = []
 
-            # Proceed to the next frame
-            effects[e][3] += 1
+    # Healing effect
+    for (player, ship_id), frame in effects.healing.items():
+        if player == 0:
+            ally_ships = player_1_ships
+        else:
+            ally_ships = player_2_ships
 
-        # Healing effect
-        elif effect_id == 1:
-            player, ship_id, frame = effect[1], effect[2], effect[3]
-            if player == 0:
-                ally_ships = player_1_ships
-            else:
-                ally_ships = player_2_ships
+        slot = ally_ships.slot_of(ship_id)
+        if slot != -1:
+            pos_x, pos_y = int(ally_ships.x[slot]), int(ally_ships.y[slot])
+            rects.append(canvas.blit(HEALING_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_HEALING_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_HEALING_ADJUSTMENT)))
 
-            if ship_id in ally_ships.keys():
-                pos_x, pos_y = ally_ships[ship_id][0], ally_ships[ship_id][1]
-                canvas.blit(HEALING_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_HEALING_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_HEALING_ADJUSTMENT))
+            # Next frame, the animation loops
+            effects.healing[player, ship_id] = (frame + 1) % int(EFFECT_FRAMES[HEALING_EFFECT])
 
-                # Next frame
-                effects[e][3] += 1
+    for effect_id, pos_x, pos_y, facing, frame in effects.active().tolist():
+        # Death effect
+        if effect_id == DEATH_EFFECT:
+            rects.append(canvas.blit(DEATH_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_DEATH_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_DEATH_ADJUSTMENT)))
 
         # Firing effect:
-        elif effect_id == 2:
-            ship_x = effect[1]
-            ship_y = effect[2]
-            facing = effect[3]
-            frame = effect[4]
-
+        elif effect_id == FIRING_EFFECT:
             if facing == 0:
                 facing_adjustment = 15+SHIP_SIZE, -12
             elif facing == 1:
@@ -307,25 +298,21 @@ def _render_effects(
             else:
                 facing_adjustment = -12, -SHIP_SIZE - 27
 
-            canvas.blit(FIRING_EFFECT_ANIMATION[facing][frame],
-                        (ship_x*TILE_SIZE+EFFECT_FIRING_ADJUSTMENT + facing_adjustment[0],
-                         ship_y*TILE_SIZE+EFFECT_FIRING_ADJUSTMENT + facing_adjustment[1]))
-
-            effects[e][4] += 1
+            rects.append(canvas.blit(FIRING_EFFECT_ANIMATION[facing][frame],
+                                     (pos_x*TILE_SIZE+EFFECT_FIRING_ADJUSTMENT + facing_adjustment[0],
+                                      pos_y*TILE_SIZE+EFFECT_FIRING_ADJUSTMENT + facing_adjustment[1])))
 
         # Capture effect
-        elif effect_id == 3:
-            pos_x, pos_y, frame = effect[1], effect[2], effect[3]
-            canvas.blit(CAPTURE_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_CAPTURE_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_CAPTURE_ADJUSTMENT))
-
-            effects[e][3] += 1
+        elif effect_id == CAPTURE_EFFECT:
+            rects.append(canvas.blit(CAPTURE_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_CAPTURE_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_CAPTURE_ADJUSTMENT)))
 
         # Space jump effect
-        elif effect_id == 4:
-            pos_x, pos_y, frame = effect[1], effect[2], effect[3]
-            canvas.blit(SPACE_JUMP_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_SPACE_JUMP_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_SPACE_JUMP_ADJUSTMENT))
+        elif effect_id == SPACE_JUMP_EFFECT:
+            rects.append(canvas.blit(SPACE_JUMP_EFFECT_ANIMATION[frame], (pos_x*TILE_SIZE+EFFECT_SPACE_JUMP_ADJUSTMENT, pos_y*TILE_SIZE+EFFECT_SPACE_JUMP_ADJUSTMENT)))
 
-            effects[e][3] += 1
+    # Proceed to the next frame, finished effects are dropped
+    effects.next_frame()
+    return rects
 
 
 def _render_vision_debug(
@@ -355,12 +342,13 @@ def _render_vision_debug(
         vision_surface.set_alpha(64)
         vision_surface = vision_surface.convert_alpha()
         canvas.blit(vision_surface, (0, 0))
+    return [canvas.get_rect()]
 
 
-def _get_ship_text_color(ship: list):
-    if ship[2] <= 33:
+def _get_ship_text_color(hp: int):
+    if hp <= 33:
         return (255, 0, 0)
-    elif ship[2] >= 66:
+    elif hp >= 66:
         return (255, 255, 255)
     else:
         return (255, 255, 0)
\ No newline at end of file
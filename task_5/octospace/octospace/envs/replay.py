@@ -0,0 +1,420 @@
+import argparse
+import io
+import json
+import os
+import struct
+import zlib
+from typing import Any, Optional, Union
+
+import gymnasium as gym
+import numpy as np
+
+from octospace.envs.game_config import VERSION, BOARD_SIZE
+from octospace.envs.game_logic import PLAYER_KEYS
+from octospace.envs.octospace import OctoSpaceEnv
+
+"""
+Replays: games recorded as their map and the actions of both players, so that they can be watched or analysed again
+without running the agents. The engine is deterministic, so stepping a fresh environment on the recorded map with
+the recorded actions reproduces every turn of the game exactly.
+
+A replay file starts with MAGIC and the format version (uint16), followed by records. Every record is its tag
+(4 bytes), the length of its payload (uint32) and the payload compressed with zlib:
+    HEAD: JSON with the players, the seed and max_steps of the environment, the number of turns per TURN record and
+        the number of turns between keyframes
+    MAP : arrays of the map at the start of the game, in the format of the map bank (see map_bank.py)
+    TURN: arrays with the actions of up to block_turns consecutive turns:
+        construction: (n_turns, 2) ships constructed by both players
+        counts: (n_turns, 2) number of ship commands of both players
+        commands: (sum of counts, 4) rows of (ship id, command, direction, speed), ordered by turn and player.
+            Fire commands have speed 0, commands other than fire and move are dropped, as the engine ignores them
+    KEYF: keyframe, the whole state of the game at the turn 1 + i * keyframe_turns (see OctoSpaceEnv._save_state)
+    END : JSON with the number of turns and the rewards of the last turn, missing if the game was interrupted
+Arrays are stored in the .npz format. Records are written as the game goes, so an interrupted game keeps all of
+its completed TURN records.
+
+Keyframes make replays seekable: any turn is reached by restoring the last keyframe before it and stepping forward
+at most keyframe_turns - 1 turns. Keyframes are unpacked only when they are restored.
+"""
+
+MAGIC = b"OCTR"
+FORMAT_VERSION = 1
+
+# Number of turns in a TURN record
+BLOCK_TURNS = 100
+
+# Number of turns between consecutive keyframes
+KEYFRAME_TURNS = 100
+
+_RECORD_HEADER = struct.Struct("<4sI")
+
+
+def _write_record(file, tag: bytes, payload: bytes):
+    payload = zlib.compress(payload)
+    file.write(_RECORD_HEADER.pack(tag, len(payload)))
+    file.write(payload)
+
+
+def _read_records(file):
+    while True:
+        record_header = file.read(_RECORD_HEADER.size)
+        if len(record_header) < _RECORD_HEADER.size:
+            return
+        tag, length = _RECORD_HEADER.unpack(record_header)
+        payload = file.read(length)
+        if len(payload) < length:
+            # Record cut off by an interrupted write
+            return
+        yield tag, zlib.decompress(payload)
+
+
+def _pack_arrays(**arrays) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _unpack_arrays(payload: bytes) -> dict:
+    with np.load(io.BytesIO(payload), allow_pickle=False) as arrays:
+        return {name: arrays[name] for name in arrays.files}
+
+
+def _encode_actions(actions: dict):
+    """
+    Converts the actions of both players for a single turn into (construction, counts, commands) rows.
+    """
+    construction = []
+    counts = []
+    commands = []
+    for player in PLAYER_KEYS:
+        construction.append(int(actions[player]["construction"]))
+        player_commands = [command for command in actions[player]["ships_actions"] if command[1] in (0, 1)]
+        counts.append(len(player_commands))
+        for command in player_commands:
+            if command[1] == 1:
+                ship_id, act, direction = command
+                commands.append((int(ship_id), 1, int(direction), 0))
+            else:
+                ship_id, act, direction, velocity = command
+                commands.append((int(ship_id), 0, int(direction), int(velocity)))
+    return construction, counts, commands
+
+
+class _ReplayWriter:
+    def __init__(self, path: str, env: OctoSpaceEnv, block_turns: int, keyframe_turns: int):
+        self.path = path
+        self.block_turns = block_turns
+        self.keyframe_turns = keyframe_turns
+        self._env = env
+        self._file = open(path, "wb")
+        self._file.write(MAGIC + struct.pack("<H", FORMAT_VERSION))
+
+        header = {
+            "version": VERSION,
+            "board_size": BOARD_SIZE,
+            "player_1_id": env.player_1_id,
+            "player_2_id": env.player_2_id,
+            "sides_changed": env.player_1_id != env.player_1_id_original,
+            "max_steps": env.max_steps,
+            "seed": env.seed,
+            "block_turns": block_turns,
+            "keyframe_turns": keyframe_turns,
+        }
+        _write_record(self._file, b"HEAD", json.dumps(header).encode())
+        _write_record(self._file, b"MAP ", _pack_arrays(
+            maps=env._map.astype(np.uint8),
+            planets_centers=env._planets_centers[2:].astype(np.int16),
+            ionized_fields=np.array([(y, x, frame) for (y, x), frame in env.ionized_field_id.items()],
+                                    dtype=np.int16).reshape(-1, 3),
+            state_ids=env._state_ids.astype(np.uint8),
+        ))
+        self._file.flush()
+
+        self._construction = []
+        self._counts = []
+        self._commands = []
+
+    def add_turn(self, actions: dict):
+        construction, counts, commands = _encode_actions(actions)
+        self._construction.append(construction)
+        self._counts.append(counts)
+        self._commands.extend(commands)
+        if len(self._counts) == self.block_turns:
+            self._write_block()
+        if (self._env.turn - 1) % self.keyframe_turns == 0:
+            _write_record(self._file, b"KEYF", _pack_arrays(**self._env._save_state()))
+            self._file.flush()
+
+    def _write_block(self):
+        if not self._counts:
+            return
+        _write_record(self._file, b"TURN", _pack_arrays(
+            construction=np.array(self._construction, dtype=np.int32),
+            counts=np.array(self._counts, dtype=np.int32),
+            commands=np.array(self._commands, dtype=np.int32).reshape(-1, 4),
+        ))
+        self._file.flush()
+        self._construction.clear()
+        self._counts.clear()
+        self._commands.clear()
+
+    def close(self, result: Optional[dict] = None):
+        self._write_block()
+        if result is not None:
+            _write_record(self._file, b"END ", json.dumps(result).encode())
+        self._file.close()
+
+
+class ReplayRecorder(gym.Wrapper):
+    """
+    Records every game played in the wrapped OctoSpaceEnv into its own replay file: {directory}/game_{i:04d}.replay.
+    A game is recorded from reset() until it ends, the next reset() or close().
+
+    Args:
+        env: OctoSpaceEnv, possibly already wrapped
+        directory: directory of the replays, created if it doesn't exist
+        block_turns: number of turns in a TURN record
+        keyframe_turns: number of turns between keyframes
+    """
+
+    def __init__(self, env: gym.Env, directory: str, block_turns: int = BLOCK_TURNS,
+                 keyframe_turns: int = KEYFRAME_TURNS):
+        super().__init__(env)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.block_turns = block_turns
+        self.keyframe_turns = keyframe_turns
+        self.paths = []
+        self._writer = None
+
+    def reset(self, *, seed: Optional[int] = None, options: Optional[dict[str, Any]] = None):
+        self._close_writer()
+        obs, info = self.env.reset(seed=seed, options=options)
+
+        path = os.path.join(self.directory, f"game_{len(self.paths):04d}.replay")
+        self._writer = _ReplayWriter(path, self.env.unwrapped, block_turns=self.block_turns,
+                                     keyframe_turns=self.keyframe_turns)
+        self.paths.append(path)
+        return obs, info
+
+    def step(self, actions: dict):
+        obs, reward, terminated, truncated, info = self.env.step(actions)
+        if self._writer is not None:
+            self._writer.add_turn(actions)
+            if terminated or truncated or sum(reward.values()) != 0:
+                self._close_writer(result={"turns": self.env.unwrapped.turn, "reward": reward})
+        return obs, reward, terminated, truncated, info
+
+    def close(self):
+        self._close_writer()
+        super().close()
+
+    def _close_writer(self, result: Optional[dict] = None):
+        if self._writer is not None:
+            self._writer.close(result=result)
+            self._writer = None
+
+
+class Replay:
+    """
+    Contents of a replay file, see load_replay.
+
+    Attributes:
+        header: HEAD record
+        result: END record, None if the game was interrupted
+        construction, counts, commands: arrays of all TURN records concatenated
+        keyframe_turns: sorted turns of the keyframes
+    """
+
+    def __init__(self, header: dict, map_arrays: dict, blocks: list, keyframes: dict, result: Optional[dict]):
+        self.header = header
+        self.result = result
+        self._map_arrays = map_arrays
+
+        # Uncompressed, but still packed keyframes, keyed by their turns
+        self._keyframes = keyframes
+        self.keyframe_turns = np.array(sorted(keyframes), dtype=int)
+
+        self.construction = np.concatenate([block["construction"] for block in blocks]).reshape(-1, 2)
+        self.counts = np.concatenate([block["counts"] for block in blocks]).reshape(-1, 2)
+        self.commands = np.concatenate([block["commands"] for block in blocks]).reshape(-1, 4)
+
+        # Index of the first command of every turn and player
+        self._offsets = np.concatenate([[0], np.cumsum(self.counts.reshape(-1))])
+
+    def __len__(self):
+        """
+        Number of recorded steps, the game lasted from turn 1 to turn len(replay) + 1.
+        """
+        return len(self.counts)
+
+    def game_map(self):
+        """
+        Returns a copy of the map of the game, in the format of MapBank.get.
+        """
+        return (self._map_arrays["maps"].astype(int), self._map_arrays["planets_centers"].astype(int),
+                {(y, x): frame for y, x, frame in self._map_arrays["ionized_fields"].tolist()},
+                self._map_arrays["state_ids"].astype(int))
+
+    def keyframe(self, turn: int) -> dict:
+        """
+        Returns the state saved in the keyframe at the turn.
+        """
+        return _unpack_arrays(self._keyframes[turn])
+
+    def last_keyframe_turn(self, turn: int) -> Optional[int]:
+        """
+        Returns the turn of the last keyframe at or before the turn, None if there is no such keyframe.
+        """
+        i = np.searchsorted(self.keyframe_turns, turn, side="right")
+        return int(self.keyframe_turns[i - 1]) if i > 0 else None
+
+    def actions(self, step: int) -> dict:
+        """
+        Returns the actions of the step, which advanced the game from the turn step + 1 to step + 2.
+        """
+        actions = {}
+        for player, player_key in enumerate(PLAYER_KEYS):
+            i = 2 * step + player
+            ships_actions = [command[:3] if command[1] == 1 else command
+                             for command in self.commands[self._offsets[i]:self._offsets[i + 1]].tolist()]
+            actions[player_key] = {"ships_actions": ships_actions, "construction": int(self.construction[step, player])}
+        return actions
+
+
+def load_replay(path: str) -> Replay:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a replay file")
+        format_version, = struct.unpack("<H", f.read(2))
+        if format_version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported replay format version {format_version}")
+
+        header = map_arrays = result = None
+        keyframes = {}
+        blocks = [{"construction": np.zeros((0, 2), dtype=np.int32), "counts": np.zeros((0, 2), dtype=np.int32),
+                   "commands": np.zeros((0, 4), dtype=np.int32)}]
+        for tag, payload in _read_records(f):
+            if tag == b"HEAD":
+                header = json.loads(payload)
+            elif tag == b"MAP ":
+                map_arrays = _unpack_arrays(payload)
+            elif tag == b"TURN":
+                blocks.append(_unpack_arrays(payload))
+            elif tag == b"KEYF":
+                with np.load(io.BytesIO(payload), allow_pickle=False) as arrays:
+                    keyframes[int(arrays["turn"])] = payload
+            elif tag == b"END ":
+                result = json.loads(payload)
+
+    if header is None or map_arrays is None:
+        raise ValueError(f"{path} is missing the header or the map of the game")
+    if header["board_size"] != BOARD_SIZE:
+        raise ValueError("The replay was recorded on a different board")
+    return Replay(header=header, map_arrays=map_arrays, blocks=blocks, keyframes=keyframes, result=result)
+
+
+class ReplayPlayer:
+    """
+    Plays a recorded game back in a fresh OctoSpaceEnv at the speed of the engine, no agents are involved.
+
+    The environment (`env`) is always at the turn `turn`, seek() moves it to any turn of the game by stepping forward,
+    from the current turn or from the last keyframe before the turn, whichever is closer. The observations of
+    the current turn are in `obs`.
+
+    Args:
+        replay: path to a replay file or a loaded Replay
+        render_mode, raster_scale: passed to OctoSpaceEnv, the environment is headless if nothing is rendered
+    """
+
+    def __init__(self, replay: Union[str, Replay], render_mode: Optional[str] = None,
+                 raster_scale: Optional[int] = None):
+        self.replay = load_replay(replay) if isinstance(replay, str) else replay
+
+        header = self.replay.header
+        self.env = OctoSpaceEnv(player_1_id=header["player_1_id"], player_2_id=header["player_2_id"],
+                                render_mode=render_mode, max_steps=header["max_steps"], seed=header["seed"],
+                                raster_scale=raster_scale)
+        if header["sides_changed"]:
+            # Rewards are given with respect to the sides, on which the players started the match
+            self.env.player_1_id_original, self.env.player_2_id_original = header["player_2_id"], header["player_1_id"]
+
+        self.obs = None
+        self.reward = None
+        self.restart()
+
+    @property
+    def turn(self) -> int:
+        return self.env.turn
+
+    @property
+    def last_turn(self) -> int:
+        return len(self.replay) + 1
+
+    def restart(self):
+        # Every reset but the first one of an environment swaps the players' sides, the replayed game starts
+        # on the recorded sides every time
+        self.env._round = 0
+        self.env.player_1_id, self.env.player_2_id = self.replay.header["player_1_id"], self.replay.header["player_2_id"]
+        self.obs, _ = self.env.reset(options={"map": self.replay.game_map()})
+        self.reward = None
+
+    def step(self):
+        """
+        Advances the game by one recorded turn.
+        """
+        if self.turn >= self.last_turn:
+            raise IndexError("The end of the replay has been reached")
+        self.obs, self.reward, *_ = self.env.step(self.replay.actions(self.turn - 1))
+
+    def seek(self, turn: int) -> dict:
+        """
+        Moves the game to the turn and returns its observations.
+        """
+        if not 1 <= turn <= self.last_turn:
+            raise IndexError(f"Turn {turn} is out of the replay's range [1, {self.last_turn}]")
+
+        keyframe_turn = self.replay.last_keyframe_turn(turn)
+        if keyframe_turn is None:
+            if turn < self.turn:
+                self.restart()
+        elif not keyframe_turn <= self.turn <= turn:
+            self.env._load_state(self.replay.keyframe(keyframe_turn))
+            self.obs = self.env._get_obs()
+            self.reward = None
+
+        while self.turn < turn:
+            self.step()
+        return self.obs
+
+    def close(self):
+        self.env.close()
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Watch a recorded game')
+    parser.add_argument('path', type=str, help='Replay file')
+    parser.add_argument('--turn', type=int, default=1, help='Turn, from which the game is shown')
+    parser.add_argument('--render_mode', type=str, default='human', help='Render mode')
+    return parser
+
+
+if __name__ == '__main__':
+    parse = get_parser()
+    args = parse.parse_args()
+
+    player = ReplayPlayer(args.path, render_mode=args.render_mode)
+    player.seek(args.turn)
+    while True:
+        player.env.render()
+        if player.turn == player.last_turn:
+            break
+        player.step()
+    player.close()
+
+    """
+    Example execution:
+        python -m octospace.envs.replay replays/game_0000.replay --turn=500
+
+    Games are recorded by wrapping the environment: ReplayRecorder(env, "replays/"), see simulation.py
+    """
@@ -0,0 +1,319 @@
+import numpy as np
+
+from octospace.envs.game_config import MAX_SHIPS
+
+
+class ShipStore:
+    """
+    Structure-of-arrays storage of a single player's ships.
+
+    Every ship occupies one slot of the preallocated arrays. New ships are always appended after the last used slot
+    and dead slots are only reclaimed by compaction, which keeps the order of the slots equal to the order in which
+    the ships were built (the same order the ships had in the old dict representation).
+
+    Ship ids are handed out by the store, starting from 0 after it is cleared.
+
+    Arrays (valid up to `size`, slots with alive == False are free):
+        ship_id: id of the ship visible to the agents
+        x, y: position of the ship
+        hp: current health points
+        fire_cooldown: turns left until the ship can fire again
+        move_cooldown: turns left until the ship can move again
+        facing: 0 - right, 1 - down, 2 - left, 3 - up
+        alive: whether the slot holds an existing ship
+        seen_x, seen_y: position, around which the ship last added its vision, -1 if it hasn't yet
+    """
+
+    _FIELDS = ("ship_id", "x", "y", "hp", "fire_cooldown", "move_cooldown", "facing", "alive", "seen_x", "seen_y")
+
+    def __init__(self, capacity: int = MAX_SHIPS):
+        self.capacity = capacity
+        self.size = 0
+        self.next_id = 0
+
+        self.ship_id = np.zeros(capacity, dtype=int)
+        self.x = np.zeros(capacity, dtype=int)
+        self.y = np.zeros(capacity, dtype=int)
+        self.hp = np.zeros(capacity, dtype=int)
+        self.fire_cooldown = np.zeros(capacity, dtype=int)
+        self.move_cooldown = np.zeros(capacity, dtype=int)
+        self.facing = np.zeros(capacity, dtype=int)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.seen_x = np.zeros(capacity, dtype=int)
+        self.seen_y = np.zeros(capacity, dtype=int)
+
+        # Maps a ship id to its slot, -1 means there is no such ship
+        self._slot_of_id = np.full(capacity, -1, dtype=int)
+
+    def clear(self):
+        self.alive[:self.size] = False
+        self._slot_of_id[:] = -1
+        self.size = 0
+        self.next_id = 0
+
+    def __len__(self):
+        return int(np.count_nonzero(self.alive[:self.size]))
+
+    def __contains__(self, ship_id) -> bool:
+        return self.slot_of(ship_id) != -1
+
+    def add(self, x: int, y: int, hp: int = 100, facing: int = 0) -> int:
+        """
+        Adds a new ship with the next free id and returns its slot.
+        """
+        ship_id = self.next_id
+        if self.size == self.capacity:
+            self._compact()
+        if self.size == self.capacity:
+            self._grow(2 * self.capacity)
+        if ship_id >= len(self._slot_of_id):
+            self._grow_ids(max(2 * len(self._slot_of_id), ship_id + 1))
+
+        slot = self.size
+        self.ship_id[slot] = ship_id
+        self.x[slot] = x
+        self.y[slot] = y
+        self.hp[slot] = hp
+        self.fire_cooldown[slot] = 0
+        self.move_cooldown[slot] = 0
+        self.facing[slot] = facing
+        self.alive[slot] = True
+        self.seen_x[slot] = -1
+        self.seen_y[slot] = -1
+        self._slot_of_id[ship_id] = slot
+        self.size += 1
+        self.next_id += 1
+        return slot
+
+    def remove(self, slots):
+        """
+        Removes ships in the given slots (a single slot or an array of them).
+        """
+        self.alive[slots] = False
+        self._slot_of_id[self.ship_id[slots]] = -1
+
+    def slot_of(self, ship_id) -> int:
+        """
+        Returns the slot of a ship with the given id or -1 if there is no such ship.
+        """
+        if not isinstance(ship_id, (int, np.integer)) or not 0 <= ship_id < len(self._slot_of_id):
+            return -1
+        return int(self._slot_of_id[ship_id])
+
+    def active_slots(self) -> np.ndarray:
+        """
+        Returns slots of all existing ships in the order of their creation.
+        """
+        return np.flatnonzero(self.alive[:self.size])
+
+    def to_array(self, slots: np.ndarray = None) -> np.ndarray:
+        """
+        Returns ships in the observation format, a read-only (n_ships, 6) array with rows:
+        [ship_id, x, y, hp, firing_cooldown, move_cooldown]
+        """
+        if slots is None:
+            slots = self.active_slots()
+        ships = np.stack([self.ship_id[slots], self.x[slots], self.y[slots], self.hp[slots],
+                          self.fire_cooldown[slots], self.move_cooldown[slots]], axis=1)
+        ships.flags.writeable = False
+        return ships
+
+    def get_state(self) -> dict:
+        """
+        Returns copies of the used slots of all arrays and the id counter, restored by set_state.
+        """
+        state = {field: getattr(self, field)[:self.size].copy() for field in self._FIELDS}
+        state["next_id"] = self.next_id
+        return state
+
+    def set_state(self, state: dict):
+        size = len(state["alive"])
+        if size > self.capacity:
+            self._grow(max(2 * self.capacity, size))
+        self.clear()
+        for field in self._FIELDS:
+            getattr(self, field)[:size] = state[field]
+        self.size = size
+        self.next_id = int(state["next_id"])
+
+        if self.next_id > len(self._slot_of_id):
+            self._grow_ids(self.next_id)
+        slots = self.active_slots()
+        self._slot_of_id[self.ship_id[slots]] = slots
+
+    def _compact(self):
+        slots = self.active_slots()
+        n = len(slots)
+        for field in self._FIELDS:
+            array = getattr(self, field)
+            array[:n] = array[slots]
+        self.alive[n:self.size] = False
+        self._slot_of_id[self.ship_id[:n]] = np.arange(n)
+        self.size = n
+
+    def _grow(self, capacity: int):
+        for field in self._FIELDS:
+            array = getattr(self, field)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self.capacity] = array
+            setattr(self, field, grown)
+        self.capacity = capacity
+
+    def _grow_ids(self, length: int):
+        grown = np.full(length, -1, dtype=int)
+        grown[:len(self._slot_of_id)] = self._slot_of_id
+        self._slot_of_id = grown
+
+
+class BatchShipStore:
+    """
+    Ships of both players in N independent games, kept in (N, 2, capacity) arrays with the same fields as ShipStore.
+
+    Every row [game, player] behaves like a ShipStore: ships are appended after the last used slot of the row, so the
+    slots keep the order of creation, and dead slots are reclaimed by compacting the row. Ship ids are handed out per
+    row, starting from 0 after the row is cleared.
+    """
+
+    _FIELDS = ShipStore._FIELDS
+
+    def __init__(self, n_games: int, capacity: int = 64):
+        self.n_games = n_games
+        self.capacity = capacity
+
+        shape = (n_games, 2, capacity)
+        self.ship_id = np.zeros(shape, dtype=int)
+        self.x = np.zeros(shape, dtype=int)
+        self.y = np.zeros(shape, dtype=int)
+        self.hp = np.zeros(shape, dtype=int)
+        self.fire_cooldown = np.zeros(shape, dtype=int)
+        self.move_cooldown = np.zeros(shape, dtype=int)
+        self.facing = np.zeros(shape, dtype=int)
+        self.alive = np.zeros(shape, dtype=bool)
+        self.seen_x = np.zeros(shape, dtype=int)
+        self.seen_y = np.zeros(shape, dtype=int)
+
+        self.size = np.zeros((n_games, 2), dtype=int)
+        self.next_id = np.zeros((n_games, 2), dtype=int)
+
+        # Maps a ship id to its slot in the row, -1 means there is no such ship
+        self._slot_of_id = np.full(shape, -1, dtype=int)
+
+    def clear(self, game: int):
+        self.alive[game] = False
+        self._slot_of_id[game] = -1
+        self.size[game] = 0
+        self.next_id[game] = 0
+
+    def add(self, games: np.ndarray, players: np.ndarray, x: np.ndarray, y: np.ndarray, facing: np.ndarray):
+        """
+        Adds one new ship with 100 health points for every given (game, player) pair, pairs may repeat.
+        Ships added to the same row get consecutive ids in the order of the arguments. Returns their slots.
+        """
+        games, players = np.asarray(games, dtype=int), np.asarray(players, dtype=int)
+        rows = games * 2 + players
+
+        # Position of every new ship among the new ships of its row
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        rank = np.empty(len(rows), dtype=int)
+        rank[order] = np.arange(len(rows)) - np.searchsorted(sorted_rows, sorted_rows)
+
+        counts = np.bincount(rows, minlength=2 * self.n_games).reshape(self.n_games, 2)
+        self._reserve(counts)
+
+        slots = self.size[games, players] + rank
+        ship_ids = self.next_id[games, players] + rank
+        if len(ship_ids) and ship_ids.max() >= self._slot_of_id.shape[2]:
+            self._grow_ids(max(2 * self._slot_of_id.shape[2], ship_ids.max() + 1))
+
+        self.ship_id[games, players, slots] = ship_ids
+        self.x[games, players, slots] = x
+        self.y[games, players, slots] = y
+        self.hp[games, players, slots] = 100
+        self.fire_cooldown[games, players, slots] = 0
+        self.move_cooldown[games, players, slots] = 0
+        self.facing[games, players, slots] = facing
+        self.alive[games, players, slots] = True
+        self.seen_x[games, players, slots] = -1
+        self.seen_y[games, players, slots] = -1
+        self._slot_of_id[games, players, ship_ids] = slots
+
+        self.size += counts
+        self.next_id += counts
+        return slots
+
+    def take(self, games: np.ndarray) -> "BatchShipStore":
+        """
+        Returns a new store with copies of the given games, in the given order. Games may repeat.
+        """
+        games = np.asarray(games, dtype=int)
+        ships = BatchShipStore(n_games=0, capacity=self.capacity)
+        ships.n_games = len(games)
+        for field in (*self._FIELDS, "size", "next_id", "_slot_of_id"):
+            setattr(ships, field, getattr(self, field)[games])
+        return ships
+
+    def remove(self, games: np.ndarray, players: np.ndarray, slots: np.ndarray):
+        self.alive[games, players, slots] = False
+        self._slot_of_id[games, players, self.ship_id[games, players, slots]] = -1
+
+    def slot_of(self, game: int, player: int, ship_id) -> int:
+        """
+        Returns the slot of a ship with the given id or -1 if there is no such ship.
+        """
+        if not isinstance(ship_id, (int, np.integer)) or not 0 <= ship_id < self._slot_of_id.shape[2]:
+            return -1
+        return int(self._slot_of_id[game, player, ship_id])
+
+    def active_slots(self, game: int, player: int) -> np.ndarray:
+        """
+        Returns slots of all existing ships of the player in the order of their creation.
+        """
+        return np.flatnonzero(self.alive[game, player, :self.size[game, player]])
+
+    def to_array(self, game: int, player: int, slots: np.ndarray = None) -> np.ndarray:
+        """
+        Returns ships in the observation format, a read-only (n_ships, 6) array with rows:
+        [ship_id, x, y, hp, firing_cooldown, move_cooldown]
+        """
+        if slots is None:
+            slots = self.active_slots(game, player)
+        ships = np.stack([self.ship_id[game, player, slots], self.x[game, player, slots], self.y[game, player, slots],
+                          self.hp[game, player, slots], self.fire_cooldown[game, player, slots],
+                          self.move_cooldown[game, player, slots]], axis=1)
+        ships.flags.writeable = False
+        return ships
+
+    def _reserve(self, counts: np.ndarray):
+        """
+        Makes room for counts[game, player] new ships in every row.
+        """
+        for game, player in zip(*np.nonzero(self.size + counts > self.capacity)):
+            self._compact(game, player)
+
+        needed = int((self.size + counts).max(initial=0))
+        if needed > self.capacity:
+            self._grow(max(2 * self.capacity, needed))
+
+    def _compact(self, game: int, player: int):
+        slots = self.active_slots(game, player)
+        n = len(slots)
+        for field in self._FIELDS:
+            array = getattr(self, field)
+            array[game, player, :n] = array[game, player, slots]
+        self.alive[game, player, n:self.size[game, player]] = False
+        self._slot_of_id[game, player, self.ship_id[game, player, :n]] = np.arange(n)
+        self.size[game, player] = n
+
+    def _grow(self, capacity: int):
+        for field in self._FIELDS:
+            array = getattr(self, field)
+            grown = np.zeros((self.n_games, 2, capacity), dtype=array.dtype)
+            grown[:, :, :self.capacity] = array
+            setattr(self, field, grown)
+        self.capacity = capacity
+
+    def _grow_ids(self, length: int):
+        grown = np.full((self.n_games, 2, length), -1, dtype=int)
+        grown[:, :, :self._slot_of_id.shape[2]] = self._slot_of_id
+        self._slot_of_id = grown
@@ -1,5 +1,9 @@
+import queue
+import threading
+
 import numpy as np
-import pygame
+
+# pygame is imported only once the music or a sound is actually played, so that headless environments never load it
 
 
 TRACKS = [
@@ -17,8 +21,33 @@ TRACKS = [
 
 current_track_id = 0
 
+# Sound effects: file, volume relative to the music volume and the mixer channel they are played on
+SOUNDS = {
+    "shoot": ('shot_1.wav', 2.0, 1),
+    "ship_explosion": ('ship_explosion.ogg', 0.75, 2),
+    "space_jump": ('space_jump.mp3', 2.0, 3),
+    "capture": ('capture.mp3', 0.5, 4),
+}
+
+# Maximum number of turns, whose sounds wait for the audio worker
+MAX_QUEUED_TURNS = 4
+
+# Longest time in seconds, for which stopping the audio waits for the worker
+AUDIO_WORKER_STOP_TIMEOUT = 1.0
+
+"""
+Sound effects are decoded once and played by a background thread, so that the game never waits for the audio.
+Sounds requested during a turn are collected and handed over to the thread together by flush_sounds, a sound
+requested many times in a turn (e.g. by every firing ship) is played only once, as it would cut itself off anyway.
+"""
+_loaded_sounds = {}
+_requested_sounds = {}
+_sounds_queue = None
+_audio_worker = None
+
 
 def get_new_track():
+    import pygame
     next_track_id = np.random.randint(0, len(TRACKS))
     while next_track_id == current_track_id:
         next_track_id = np.random.randint(0, len(TRACKS))
@@ -27,31 +56,113 @@ def get_new_track():
     pygame.mixer.music.play()
 
 
+def play_next_track_if_ended():
+    import pygame
+    if not pygame.mixer.music.get_busy():
+        get_new_track()
+
+
 def setup_music_loop(volume: float = 0.25):
+    import pygame
     pygame.mixer.init()
     pygame.mixer.music.set_volume(volume)
+    _preload_sounds()
     get_new_track()
 
 
 def play_shoot_sound(volume: float):
-    shoot_sound = pygame.mixer.Sound('assets/sounds/shot_1.wav')
-    shoot_sound.set_volume(volume*2.0)
-    pygame.mixer.Channel(1).play(shoot_sound)
+    _request_sound("shoot", volume)
 
 
 def play_space_jump_sound(volume: float):
-    space_jump_sound = pygame.mixer.Sound('assets/sounds/space_jump.mp3')
-    space_jump_sound.set_volume(volume * 2.0)
-    pygame.mixer.Channel(3).play(space_jump_sound)
+    _request_sound("space_jump", volume)
 
 
 def play_capture_sound(volume: float):
-    capture_sound = pygame.mixer.Sound('assets/sounds/capture.mp3')
-    capture_sound.set_volume(volume * 0.5)
-    pygame.mixer.Channel(4).play(capture_sound)
+    _request_sound("capture", volume)
 
 
 def play_ship_explosion_sound(volume: float):
-    sound_file = pygame.mixer.Sound('assets/sounds/ship_explosion.ogg')
-    sound_file.set_volume(volume * 0.75)
-    pygame.mixer.Channel(2).play(sound_file)
\ No newline at end of file
+    _request_sound("ship_explosion", volume)
+
+
+def _request_sound(name: str, volume: float):
+    _requested_sounds[name] = volume
+
+
+def flush_sounds():
+    """
+    Hands the sounds requested during the turn over to the audio worker, every sound at most once per turn.
+    If the worker falls behind, the turn's sounds are dropped instead of blocking the game.
+    """
+    if not _requested_sounds:
+        return
+
+    _start_audio_worker()
+    try:
+        _sounds_queue.put_nowait(dict(_requested_sounds))
+    except queue.Full:
+        pass
+    _requested_sounds.clear()
+
+
+def stop_audio_worker():
+    """
+    Stops the audio worker, waiting for it at most AUDIO_WORKER_STOP_TIMEOUT. A worker, which died or got stuck in
+    the mixer, is left behind, it is a daemon thread and doesn't keep the process alive.
+    """
+    global _sounds_queue, _audio_worker
+    if _audio_worker is None:
+        return
+
+    _requested_sounds.clear()
+    if _audio_worker.is_alive():
+        # The sounds still waiting won't be heard anyway, dropping them makes room for the stop request
+        while True:
+            try:
+                _sounds_queue.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            _sounds_queue.put_nowait(None)
+        except queue.Full:
+            pass
+        _audio_worker.join(timeout=AUDIO_WORKER_STOP_TIMEOUT)
+    _sounds_queue, _audio_worker = None, None
+
+
+def _start_audio_worker():
+    global _sounds_queue, _audio_worker
+    if _audio_worker is not None and _audio_worker.is_alive():
+        return
+
+    _sounds_queue = queue.Queue(maxsize=MAX_QUEUED_TURNS)
+    _audio_worker = threading.Thread(target=_play_sounds, args=(_sounds_queue,), name="octospace-audio", daemon=True)
+    _audio_worker.start()
+
+
+def _play_sounds(sounds_queue: queue.Queue):
+    import pygame
+    while True:
+        sounds = sounds_queue.get()
+        if sounds is None:
+            return
+
+        for name, volume in sounds.items():
+            file, volume_factor, channel = SOUNDS[name]
+            sound = _load_sound(name)
+            sound.set_volume(volume * volume_factor)
+            pygame.mixer.Channel(channel).play(sound)
+
+
+def _load_sound(name: str):
+    import pygame
+    if name not in _loaded_sounds:
+        file, volume_factor, channel = SOUNDS[name]
+        _loaded_sounds[name] = pygame.mixer.Sound(f'assets/sounds/{file}')
+    return _loaded_sounds[name]
+
+
+def _preload_sounds():
+    for name in SOUNDS:
+        _load_sound(name)
@@ -0,0 +1,110 @@
+import numpy as np
+
+from octospace.envs.observation import _build_masked_map
+from octospace.envs.ships import ShipStore
+
+"""
+Snapshots of the game state for lookahead search (rollouts, MCTS) and replay keyframes.
+
+A state holds only what changes during a game. The terrain, the planets and everything derived from them stay in
+the environment and are shared by all its states and clones.
+
+The map and the masked maps are the largest arrays, and most steps don't modify them. They are shared by reference
+between the environment and its states: OctoSpaceEnv copies them just before they would be modified in place (see
+OctoSpaceEnv._own), so saving and restoring a state doesn't copy them at all. The other arrays are small and are
+always copied.
+"""
+
+_SHIP_FIELDS = (*ShipStore._FIELDS, "next_id")
+
+
+class EngineState:
+    """
+    State of a single game, returned by OctoSpaceEnv.get_state and restored by OctoSpaceEnv.set_state.
+    States are immutable, a state can be restored any number of times into the environment, which saved it,
+    or into its clones.
+    """
+
+    __slots__ = ("turn", "game_map", "visibility_masks", "masked_maps", "unseen_tiles", "resources", "occupied_rf",
+                 "planets_occupation_progress", "planets_ongoing_occupation", "victorious_player", "terminated",
+                 "scores", "ships")
+
+    def __init__(
+        self,
+        turn: int,
+        game_map: np.ndarray,
+        visibility_masks: tuple,
+        masked_maps: tuple,
+        unseen_tiles: np.ndarray,
+        resources: tuple,
+        occupied_rf: tuple,
+        planets_occupation_progress: tuple,
+        planets_ongoing_occupation: tuple,
+        victorious_player: tuple,
+        terminated: bool,
+        scores: tuple,
+        ships: tuple
+    ):
+        self.turn = turn
+        self.game_map = game_map
+        self.visibility_masks = visibility_masks
+        self.masked_maps = masked_maps
+        self.unseen_tiles = unseen_tiles
+        self.resources = resources
+        self.occupied_rf = occupied_rf
+        self.planets_occupation_progress = planets_occupation_progress
+        self.planets_ongoing_occupation = planets_ongoing_occupation
+        self.victorious_player = victorious_player
+        self.terminated = terminated
+        self.scores = scores
+        self.ships = ships
+
+    def to_arrays(self) -> dict:
+        """
+        Returns the state as a flat dict of arrays, which can be stored in an .npz file.
+        The masked maps are left out, they are rebuilt from the map and the visibility masks by from_arrays.
+        """
+        arrays = {
+            "turn": self.turn,
+            "map": self.game_map,
+            "unseen_tiles": self.unseen_tiles,
+            "planets_occupation_progress": np.array(self.planets_occupation_progress),
+            "planets_ongoing_occupation": np.array(self.planets_ongoing_occupation),
+            "victorious_player": np.array(self.victorious_player),
+            "terminated": self.terminated,
+            "scores": np.array(self.scores),
+        }
+        for player in range(2):
+            prefix = f"player_{player + 1}"
+            arrays[f"{prefix}_visibility_mask"] = self.visibility_masks[player]
+            arrays[f"{prefix}_resources"] = self.resources[player]
+            arrays[f"{prefix}_occupied_rf"] = self.occupied_rf[player]
+            for field in _SHIP_FIELDS:
+                arrays[f"{prefix}_ships_{field}"] = self.ships[player][field]
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "EngineState":
+        game_map = np.array(arrays["map"], dtype=int)
+        visibility_masks = tuple(np.array(arrays[f"player_{player}_visibility_mask"], dtype=bool)
+                                 for player in (1, 2))
+        masked_maps = tuple(np.empty_like(game_map) for _ in range(2))
+        for visibility_mask, masked_map in zip(visibility_masks, masked_maps):
+            _build_masked_map(game_map, visibility_mask, masked_map)
+
+        return cls(
+            turn=int(arrays["turn"]),
+            game_map=game_map,
+            visibility_masks=visibility_masks,
+            masked_maps=masked_maps,
+            unseen_tiles=np.array(arrays["unseen_tiles"], dtype=int),
+            resources=tuple(np.array(arrays[f"player_{player}_resources"], dtype=int) for player in (1, 2)),
+            occupied_rf=tuple(np.array(arrays[f"player_{player}_occupied_rf"], dtype=int) for player in (1, 2)),
+            planets_occupation_progress=tuple(np.asarray(arrays["planets_occupation_progress"]).tolist()),
+            planets_ongoing_occupation=tuple(np.asarray(arrays["planets_ongoing_occupation"]).tolist()),
+            victorious_player=tuple(np.asarray(arrays["victorious_player"]).tolist()),
+            terminated=bool(arrays["terminated"]),
+            scores=tuple(np.asarray(arrays["scores"]).tolist()),
+            ships=tuple({field: np.asarray(arrays[f"player_{player}_ships_{field}"]) for field in _SHIP_FIELDS}
+                        for player in (1, 2))
+        )
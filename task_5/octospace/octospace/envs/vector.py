@@ -0,0 +1,240 @@
+from typing import Any, Optional, Tuple
+
+import numpy as np
+from gymnasium.utils import seeding
+
+from octospace.envs.game_config import BOARD_SIZE, N_PLANETS, PLAYER_1_ORIGIN, PLAYER_2_ORIGIN
+from octospace.envs.map_generation import (_generate_map, _add_base_planet_occupation, _reset_planets_occupation,
+                                           _build_planets_index, _build_planets_lookup)
+from octospace.envs.game_logic import PLAYER_KEYS, _add_planet_visibility
+from octospace.envs.batch_logic import (_batch_decode_actions, _batch_decrease_cooldowns, _batch_ship_firing,
+                                        _batch_ship_movement, _batch_ship_construction,
+                                        _batch_change_ownership_of_planets, _batch_resource_production,
+                                        _batch_occupation_progress, _batch_ship_land_interaction,
+                                        _batch_handle_ship_death, _batch_handle_visibility,
+                                        _batch_check_victory_conditions)
+from octospace.envs.raster import _raster_frames
+from octospace.envs.schemes import PLANET_MASK
+from octospace.envs.ships import BatchShipStore
+
+
+class OctoSpaceVecEnv:
+    """
+    N independent OctoSpace games advanced in lockstep by one batched implementation of the game logic.
+    There is no music or effects tracking, every game behaves like a headless OctoSpaceEnv. The games can still be
+    rendered into pixel arrays by NumPy with render(), see raster.py.
+
+    Args:
+        num_envs: number of games
+        max_steps: number of turns after which a game ends with a draw
+        seed: seed of the random generator shared by all games, reset(seed=...) reseeds it
+        map_bank: path to a map bank (see map_bank.py), new maps are drawn from it instead of being generated
+        raster_scale: number of pixels per tile along each axis of the frames returned by render()
+
+    Observations and actions are lists with one OctoSpaceEnv observation / action dict per game.
+    step() returns rewards as an (N, 2) array, terminated is set when a player captured the other one's base and
+    truncated when the game reached max_steps.
+
+    Finished games are reset automatically on the next call to step(): their actions are ignored and the first
+    observation of the new game is returned with zero rewards.
+    """
+
+    def __init__(self, num_envs: int, max_steps: int = 2000, seed: Optional[int] = None,
+                 map_bank: Optional[str] = None, raster_scale: int = 1):
+        assert num_envs > 0
+        assert raster_scale > 0
+
+        self.num_envs = num_envs
+        self.max_steps = max_steps
+        self.raster_scale = raster_scale
+        self.np_random, _ = seeding.np_random(seed)
+        self._map_bank = None
+        if map_bank is not None:
+            # Imported here, so that the map bank module can also be run as a script
+            from octospace.envs.map_bank import MapBank
+            self._map_bank = MapBank(map_bank)
+
+        n_planets = N_PLANETS + 2
+        self._maps = np.zeros((num_envs, BOARD_SIZE, BOARD_SIZE), dtype=int)
+        self._visibility_masks = np.zeros((num_envs, 2, BOARD_SIZE, BOARD_SIZE), dtype=bool)
+        self._unseen_tiles = np.zeros((num_envs, 2), dtype=int)
+        self._planets_centers = np.zeros((num_envs, n_planets, 2), dtype=int)
+        self._planets_cells = np.zeros((num_envs, n_planets, np.count_nonzero(PLANET_MASK)), dtype=int)
+        self._planets_rf = np.zeros((num_envs, n_planets, 4), dtype=int)
+        self._planets_lookups = np.zeros((num_envs, BOARD_SIZE, BOARD_SIZE), dtype=np.int16)
+        self._planets_occupation_progress = np.zeros((num_envs, n_planets), dtype=int)
+        self._planets_ongoing_occupation = np.zeros((num_envs, n_planets), dtype=int)
+        self._resources = np.zeros((num_envs, 2, 4), dtype=int)
+        self._occupied_rf = np.zeros((num_envs, 2, 4), dtype=int)
+        self._ships = BatchShipStore(num_envs)
+
+        self.turns = np.zeros(num_envs, dtype=int)
+        self._done = np.zeros(num_envs, dtype=bool)
+
+    def reset(
+        self,
+        *,
+        seed: int = None,
+        options: dict[str, Any] = None,
+    ) -> Tuple[list, dict]:
+        if seed is not None:
+            self.np_random, _ = seeding.np_random(seed)
+
+        for game in range(self.num_envs):
+            self._reset_game(game)
+        self._done[:] = False
+
+        return self._get_obs(), {}
+
+    def _reset_game(self, game: int):
+        if self._map_bank is not None:
+            game_map, new_planet_centers, _, _ = self._map_bank.sample(self.np_random)
+        else:
+            game_map, new_planet_centers, _ = _generate_map(rng=self.np_random)
+        planets_centers = np.concatenate([[PLAYER_1_ORIGIN, PLAYER_2_ORIGIN], new_planet_centers]).astype(int)
+
+        _reset_planets_occupation(game_map=game_map)
+        _add_base_planet_occupation(game_map=game_map, centers=planets_centers)
+        self._maps[game] = game_map
+        self._planets_centers[game] = planets_centers
+        self._planets_cells[game], self._planets_rf[game] = _build_planets_index(game_map=game_map,
+                                                                                 planets_centers=planets_centers)
+        self._planets_lookups[game] = _build_planets_lookup(planets_centers=planets_centers)
+
+        self._planets_occupation_progress[game] = -1
+        self._planets_occupation_progress[game, 0] = 0
+        self._planets_occupation_progress[game, 1] = 100
+        self._planets_ongoing_occupation[game] = 0
+
+        self._resources[game] = 100
+        self._occupied_rf[game] = 4
+
+        # On start both players have 1 battleship at their base
+        self._ships.clear(game)
+        self._ships.add(games=[game, game], players=[0, 1],
+                        x=[PLAYER_1_ORIGIN[0] + 7, PLAYER_2_ORIGIN[0] - 8], y=[PLAYER_1_ORIGIN[1], PLAYER_2_ORIGIN[1]],
+                        facing=[1, 3])
+
+        self._visibility_masks[game] = False
+        _add_planet_visibility(planets_centers[0][1], planets_centers[0][0], self._visibility_masks[game, 0])
+        _add_planet_visibility(planets_centers[1][1], planets_centers[1][0], self._visibility_masks[game, 1])
+        self._unseen_tiles[game] = np.count_nonzero(~self._visibility_masks[game], axis=(1, 2))
+
+        self.turns[game] = 1
+
+    def step(self, actions: list) -> Tuple[list, np.ndarray, np.ndarray, np.ndarray, dict]:
+        assert len(actions) == self.num_envs
+
+        # Games finished on the previous step are advanced like the others (without any actions) and then reset
+        finished = self._done.copy()
+        if finished.any():
+            empty_action = {player: {"ships_actions": [], "construction": 0} for player in PLAYER_KEYS}
+            actions = [empty_action if done else game_actions for game_actions, done in zip(actions, finished)]
+        playing = ~finished
+
+        self.turns += 1
+
+        _batch_decrease_cooldowns(ships=self._ships)
+
+        (fire_games, fire_players, fire_slots, fire_directions), \
+            (move_games, move_players, move_slots, move_directions, move_velocities) = \
+            _batch_decode_actions(actions=actions, ships=self._ships)
+
+        # Ships firing
+        _batch_ship_firing(ships=self._ships, games=fire_games, players=fire_players, slots=fire_slots,
+                           directions=fire_directions)
+
+        # Ship movement
+        _batch_ship_movement(maps=self._maps, ships=self._ships, games=move_games, players=move_players,
+                             slots=move_slots, directions=move_directions, velocities=move_velocities)
+
+        # Construction
+        construction = np.array([[game_actions[player]["construction"] for player in PLAYER_KEYS]
+                                 for game_actions in actions], dtype=int)
+        _batch_ship_construction(ships=self._ships, construction=construction, resources=self._resources)
+
+        # Change the ownership of newly captured planets
+        capture_games = _batch_change_ownership_of_planets(
+            maps=self._maps, planets_centers=self._planets_centers, planets_cells=self._planets_cells,
+            planets_rf=self._planets_rf, planets_occupation_progress=self._planets_occupation_progress,
+            occupied_rf=self._occupied_rf, visibility_masks=self._visibility_masks
+        )
+
+        # Captured planets reveal their surroundings
+        self._unseen_tiles[capture_games] = np.count_nonzero(~self._visibility_masks[capture_games], axis=(2, 3))
+
+        # Resource production
+        _batch_resource_production(resources=self._resources, occupied_rf=self._occupied_rf)
+
+        # Occupation progress
+        _batch_occupation_progress(planets_occupation_progress=self._planets_occupation_progress,
+                                   planets_ongoing_occupation=self._planets_ongoing_occupation)
+
+        # Planet capture and ship healing
+        _batch_ship_land_interaction(maps=self._maps, planets_lookups=self._planets_lookups,
+                                     planets_occupation_progress=self._planets_occupation_progress,
+                                     planets_ongoing_occupation=self._planets_ongoing_occupation, ships=self._ships)
+
+        _batch_handle_ship_death(ships=self._ships)
+
+        _batch_handle_visibility(ships=self._ships, visibility_masks=self._visibility_masks,
+                                 unseen_tiles=self._unseen_tiles)
+
+        player_1_victory, player_2_victory = _batch_check_victory_conditions(maps=self._maps,
+                                                                             planets_centers=self._planets_centers)
+        victorious = np.stack([player_1_victory, player_2_victory], axis=1) & playing[:, None]
+        terminated = victorious.any(axis=1)
+        out_of_time = playing & (self.turns == self.max_steps)
+        truncated = out_of_time & ~terminated
+
+        # Draw occurs when the match reaches max number of steps or both players are victorious
+        rewards = victorious.astype(float)
+        draw = out_of_time | victorious.all(axis=1)
+        rewards[draw] = 0.5
+
+        self._done = terminated | truncated
+        for game in np.flatnonzero(finished):
+            self._reset_game(game)
+
+        return self._get_obs(), rewards, terminated, truncated, {}
+
+    def render(self, player: Optional[int] = None) -> np.ndarray:
+        """
+        Returns the frames of all games as an (N, BOARD_SIZE * raster_scale, BOARD_SIZE * raster_scale, 3) uint8 array.
+        With player (0 or 1) the frames show only what that player sees, the rest of the board is covered by fog.
+        """
+        games, players, slots = np.nonzero(self._ships.alive)
+        return _raster_frames(
+            maps=self._maps, ship_games=games, ship_players=players, ship_x=self._ships.x[games, players, slots],
+            ship_y=self._ships.y[games, players, slots], pixels_per_tile=self.raster_scale,
+            visibility_masks=None if player is None else self._visibility_masks[:, player]
+        )
+
+    def _get_obs(self) -> list:
+        maps = np.where(self._visibility_masks, self._maps[:, None], -1)
+        return [
+            {
+                PLAYER_KEYS[player]: self._get_player_obs(game, player, maps[game, player])
+                for player in range(2)
+            }
+            for game in range(self.num_envs)
+        ]
+
+    def _get_player_obs(self, game: int, player: int, player_map: np.ndarray) -> dict:
+        visibility_mask = self._visibility_masks[game, player]
+        enemy = 1 - player
+        enemy_slots = self._ships.active_slots(game, enemy)
+        enemy_slots = enemy_slots[visibility_mask[self._ships.y[game, enemy, enemy_slots],
+                                                  self._ships.x[game, enemy, enemy_slots]]]
+
+        planets_centers = self._planets_centers[game]
+        visible_planets = visibility_mask[planets_centers[:, 0], planets_centers[:, 1]]
+        return {
+            "map": player_map,
+            "allied_ships": self._ships.to_array(game, player),
+            "enemy_ships": self._ships.to_array(game, enemy, enemy_slots),
+            "planets_occupation": [(planet_x, planet_y, occupation) for (planet_x, planet_y), occupation in
+                                   zip(planets_centers[visible_planets].tolist(),
+                                       self._planets_occupation_progress[game, visible_planets].tolist())],
+            "resources": self._resources[game, player].copy()
+        }
@@ -17,6 +17,8 @@ def get_parser():
     parser.add_argument('--verbose', action='store_true', help='Print additional information')
     parser.add_argument('--render_mode', type=str, default=None, help='Render mode')
     parser.add_argument('--turn_on_music', type=bool, default=False, help='Music')
+    parser.add_argument('--turn_deadline', type=float, default=None,
+                        help='Time in seconds an agent has to return its action, otherwise it skips the turn')
     return parser
 
 
@@ -26,7 +28,8 @@ def run_match(
         agent_2_path: str,
         render_mode: str = None,
         verbose: bool = False,
-        turn_on_music: bool = False
+        turn_on_music: bool = False,
+        turn_deadline: float = None
 ):
     # Disable warnings in the gym
     if not verbose:
@@ -38,11 +41,19 @@ def run_match(
     agent_1 = SourceFileLoader('agent_1', agent_1_path).load_module()
     agent_2 = SourceFileLoader('agent_2', agent_2_path).load_module()
 
-    score = simulate_game(player_1_id=player_1_id, player_2_id=player_2_id, player_1_agent_class=agent_1.Agent,
+    result = simulate_game(player_1_id=player_1_id, player_2_id=player_2_id, player_1_agent_class=agent_1.Agent,
                             player_2_agent_class=agent_2.Agent, n_games=n_matches,
-                            render_mode=render_mode, verbose=False, turn_on_music=turn_on_music)
+                            render_mode=render_mode, verbose=False, turn_on_music=turn_on_music,
+                            turn_deadline=turn_deadline, return_latency=True)
+    # The window was closed
+    if isinstance(result, int):
+        return
 
+    score, latency = result
     print(f'{TEAMS[player_1_id]} vs {TEAMS[player_2_id]}: {score}')
+    for player_id, agent_latency in zip((player_1_id, player_2_id), latency.values()):
+        print(f'{TEAMS[player_id]}: p50 {agent_latency["p50_ms"]:.1f} ms, p95 {agent_latency["p95_ms"]:.1f} ms, '
+              f'max {agent_latency["max_ms"]:.1f} ms, missed deadlines {agent_latency["missed_deadlines"]}')
 
 
 if __name__ == '__main__':
@@ -50,11 +61,13 @@ if __name__ == '__main__':
     args = parse.parse_args()
 
     run_match(n_matches=args.n_matches, agent_1_path=args.path_to_agent_1, agent_2_path=args.path_to_agent_2,
-              verbose=args.verbose, render_mode=args.render_mode, turn_on_music=args.turn_on_music)
+              verbose=args.verbose, render_mode=args.render_mode, turn_on_music=args.turn_on_music,
+              turn_deadline=args.turn_deadline)
 
     """
     Example execution:
         python run_match.py ../agent.py ../agent.py --n_matches=1 --render_mode=human --turn_on_music=True
+        python run_match.py cudabot/cuda_agent.py dummy_agent.py --n_matches=1 --turn_deadline=0.1
         
     !IMPORTANT!
     If it happens, that you have a smaller screen on your computer and the game window doesn't render correctly,
@@ -1,17 +1,102 @@
 import gymnasium as gym
 import numpy as np
 import os
+import signal
+import threading
+import time
 import torch
+from contextlib import contextmanager
+from typing import Optional
 
 # Don't delete this! It allows the environment to be registered
 import octospace
-import pygame
 
 from dummy_agent import Agent
+from octospace.envs.replay import ReplayRecorder
 
 
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+# Upper bounds of the buckets of the agents' latency histograms in milliseconds, the last bucket has no upper bound
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class TurnDeadlineExceeded(BaseException):
+    """
+    Interrupts an agent at the deadline. Like KeyboardInterrupt it isn't an Exception, so an agent catching
+    the Exceptions of its own code can't swallow it.
+    """
+
+
+@contextmanager
+def _turn_deadline(deadline: Optional[float]):
+    """
+    Interrupts the code inside with TurnDeadlineExceeded after deadline seconds. It relies on SIGALRM, which is only
+    available on Unix and in the main thread, elsewhere the code always runs to completion.
+    """
+    if deadline is None or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def interrupt(signum, frame):
+        raise TurnDeadlineExceeded()
+
+    previous_handler = signal.signal(signal.SIGALRM, interrupt)
+    signal.setitimer(signal.ITIMER_REAL, deadline)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+class AgentTimer:
+    """
+    Measures the time of the agent's decisions and enforces the per-turn deadline (in seconds, None for no deadline).
+
+    An agent, which doesn't return its action before the deadline, gets an empty action for that turn. A runaway
+    agent is interrupted at the deadline, so it can't stall the game, except for the platforms without SIGALRM,
+    where its late action is only discarded.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self.latencies = []
+        self.missed_deadlines = 0
+
+    def get_action(self, agent: Agent, obs: dict) -> dict:
+        interrupted = False
+        start = time.perf_counter()
+        try:
+            with _turn_deadline(self.deadline):
+                action = agent.get_action(obs)
+        except TurnDeadlineExceeded:
+            interrupted = True
+        latency = time.perf_counter() - start
+        self.latencies.append(latency)
+
+        if interrupted or (self.deadline is not None and latency > self.deadline):
+            self.missed_deadlines += 1
+            return {"ships_actions": [], "construction": 0}
+        return action
+
+    def summary(self) -> dict:
+        """
+        Returns the percentiles and the histogram (see LATENCY_BUCKETS_MS) of the latencies and the number of the
+        missed deadlines.
+        """
+        latencies_ms = np.array(self.latencies) * 1e3
+        histogram = np.bincount(np.searchsorted(LATENCY_BUCKETS_MS, latencies_ms),
+                                minlength=len(LATENCY_BUCKETS_MS) + 1)
+        return {
+            "turns": len(latencies_ms),
+            "p50_ms": float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else 0.0,
+            "p95_ms": float(np.percentile(latencies_ms, 95)) if len(latencies_ms) else 0.0,
+            "max_ms": float(latencies_ms.max(initial=0.0)),
+            "missed_deadlines": self.missed_deadlines,
+            "histogram": histogram.tolist(),
+        }
+
 
 def setup_agent(agent_class: Agent.__class__, player_id: int, side: int):
     agent = agent_class(side=side)
@@ -30,17 +115,36 @@ def simulate_game(
     render_mode: str = "human",
     verbose: bool = False,
     turn_on_music: bool = False,
+    seed: int = None,
+    replay_dir: str = None,
+    turn_deadline: float = None,
+    return_latency: bool = False,
 ):
+    """
+    Plays n_games rounds with the agents swapping sides after every round.
+
+    :param turn_deadline: time in seconds an agent has to return its action, otherwise it gets an empty action
+        for the turn (see AgentTimer)
+    :param return_latency: also return the latencies of the agents, see AgentTimer.summary
+    :return: score of both agents, with return_latency=True a tuple of the score and a dict with the latencies
+        of agent_1 and agent_2 (the agents of player_1_agent_class and player_2_agent_class)
+    """
     if not verbose:
         gym.logger.min_level = 40
 
     env = gym.make('OctoSpace-v0', player_1_id=player_1_id, player_2_id=player_2_id, max_steps=2000,
-                   render_mode=render_mode, turn_on_music=turn_on_music, volume=0.1)
+                   render_mode=render_mode, turn_on_music=turn_on_music, volume=0.1, seed=seed)
+    if replay_dir is not None:
+        env = ReplayRecorder(env, directory=replay_dir)
     obs, info = env.reset()
 
     agent_1 = setup_agent(agent_class=player_1_agent_class, player_id=player_1_id, side=0)
     agent_2 = setup_agent(agent_class=player_2_agent_class, player_id=player_2_id, side=1)
 
+    # Timers follow the agents, when they swap sides
+    timers = [AgentTimer(deadline=turn_deadline), AgentTimer(deadline=turn_deadline)]
+    timer_1, timer_2 = timers
+
     terminated = False
     reward = {}
 
@@ -56,14 +160,16 @@ def simulate_game(
             if curr_round % 2 == 1:
                 agent_2 = setup_agent(agent_class=player_1_agent_class, player_id=player_1_id, side=(curr_round % 2))
                 agent_1 = setup_agent(agent_class=player_2_agent_class, player_id=player_2_id, side=((curr_round + 1) % 2))
+                timer_2, timer_1 = timers
             else:
                 agent_1 = setup_agent(agent_class=player_1_agent_class, player_id=player_1_id, side=(curr_round % 2))
                 agent_2 = setup_agent(agent_class=player_2_agent_class, player_id=player_2_id, side=((curr_round + 1) % 2))
+                timer_1, timer_2 = timers
 
         env.render()
 
-        action_1 = agent_1.get_action(obs["player_1"])
-        action_2 = agent_2.get_action(obs["player_2"])
+        action_1 = timer_1.get_action(agent_1, obs["player_1"])
+        action_2 = timer_2.get_action(agent_2, obs["player_2"])
 
         obs, reward, terminated, _, info = env.step(
             {
@@ -73,10 +179,13 @@ def simulate_game(
         )
 
         if render_mode is not None:
+            import pygame
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     return -1
 
+    if return_latency:
+        return score, {"agent_1": timers[0].summary(), "agent_2": timers[1].summary()}
     return score
 
 
@@ -1,6 +1,6 @@
 import random
-from cudabot.brain import Brain
-from cudabot.state import GameState
+from src.brain import Brain
+from src.state import GameState
 
 class Agent:
     def __init__(self, side):
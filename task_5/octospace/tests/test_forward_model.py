@@ -0,0 +1,103 @@
+import copy
+
+import numpy as np
+import pytest
+
+from octospace.envs.forward_model import ForwardModel, encode_actions
+from octospace.envs.octospace import OctoSpaceEnv
+
+PLAYERS = ("player_1", "player_2")
+N_CANDIDATES = 6
+
+
+def _scripted_action(obs: dict, side: int, rng: np.random.Generator) -> dict:
+    """
+    Ships fire at the closest visible enemy or head to the enemy's base, landing on the planets on the way.
+    """
+    ships_actions = []
+    enemies = obs["enemy_ships"].tolist()
+    for ship_id, x, y, *_ in obs["allied_ships"].tolist():
+        if enemies and rng.random() < 0.6:
+            enemy_x, enemy_y = min(((ex, ey) for _, ex, ey, *_ in enemies),
+                                   key=lambda enemy: abs(enemy[0] - x) + abs(enemy[1] - y))
+            dx, dy = enemy_x - x, enemy_y - y
+        else:
+            dx, dy = (1, 1) if side == 0 else (-1, -1)
+            if rng.random() < 0.3:
+                dx, dy = rng.integers(-1, 2, size=2).tolist()
+
+        direction = (0 if dx > 0 else 2) if abs(dx) >= abs(dy) else (1 if dy > 0 else 3)
+        if enemies and rng.random() < 0.5:
+            ships_actions.append([ship_id, 1, direction])
+        else:
+            ships_actions.append([ship_id, 0, direction, int(rng.integers(1, 4))])
+    return {"ships_actions": ships_actions, "construction": int(rng.integers(0, 3))}
+
+
+def _sorted_ships(ships: np.ndarray, ship_ids) -> np.ndarray:
+    ships = np.asarray(ships, dtype=int).reshape(-1, 6)
+    ships = ships[np.isin(ships[:, 0], list(ship_ids))]
+    return ships[np.argsort(ships[:, 0])]
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_forward_model_matches_engine(seed):
+    env = OctoSpaceEnv(player_1_id=1, player_2_id=2, max_steps=1000)
+    obs, info = env.reset(seed=seed)
+    rng = np.random.default_rng(seed)
+
+    n_hits, n_removed, n_batches = 0, 0, 0
+    for step in range(700):
+        actions = {player: _scripted_action(obs[player], side, rng) for side, player in enumerate(PLAYERS)}
+        player_obs = obs["player_1"]
+
+        # The ongoing occupations aren't observed, the model is given the true ones of the visible planets
+        visible_planets = [env._player_1_visibility_mask[x, y] for x, y in env._planets_centers]
+        ongoing_occupation = [ongoing for ongoing, visible in zip(env._planets_ongoing_occupation, visible_planets)
+                              if visible]
+        model = ForwardModel(player_obs, player=0, planets_ongoing_occupation=ongoing_occupation)
+
+        # Candidates of the player against the recorded actions of the enemy, one of them is the recorded one
+        recorded = int(rng.integers(0, N_CANDIDATES))
+        candidates = np.stack([
+            encode_actions((actions["player_1"] if candidate == recorded else
+                            _scripted_action(player_obs, 0, rng))["ships_actions"], player_obs["allied_ships"])
+            for candidate in range(N_CANDIDATES)
+        ])
+        enemy_commands = encode_actions(actions["player_2"]["ships_actions"], player_obs["enemy_ships"])
+        result = model.simulate(candidates, enemy_commands)
+        assert result.n_games == N_CANDIDATES
+
+        allied_ids = player_obs["allied_ships"][:, 0].tolist()
+        enemy_ids = player_obs["enemy_ships"][:, 0].tolist()
+        obs, reward, terminated, truncated, info = env.step(copy.deepcopy(actions))
+        message = f"step {step}"
+
+        # Ships built in this turn aren't known to the model
+        np.testing.assert_array_equal(_sorted_ships(result.allied_ships(recorded), allied_ids),
+                                      _sorted_ships(obs["player_1"]["allied_ships"], allied_ids), err_msg=message)
+
+        # The enemy ships, which moved onto the tiles the player hasn't seen, can hit unseen asteroids
+        enemy_ships = _sorted_ships(obs["player_2"]["allied_ships"], enemy_ids)
+        unseen = enemy_ships[player_obs["map"][enemy_ships[:, 2], enemy_ships[:, 1]] == -1, 0]
+        known_ids = set(enemy_ids) - set(unseen.tolist())
+        np.testing.assert_array_equal(_sorted_ships(result.enemy_ships(recorded), known_ids),
+                                      _sorted_ships(enemy_ships, known_ids), err_msg=message)
+
+        n_hits += int((result.allied_hp[recorded] < player_obs["allied_ships"][:, 3]).sum() +
+                      (result.enemy_hp[recorded] < player_obs["enemy_ships"][:, 3]).sum())
+        n_removed += int((~result.allied_alive[recorded]).sum() + (~result.enemy_alive[recorded]).sum())
+
+        # Every candidate of the batch is played like on its own
+        if len(enemy_ids):
+            n_batches += 1
+            for candidate in range(N_CANDIDATES):
+                single = model.simulate(candidates[candidate], enemy_commands)
+                for ships, expected_ships in ((result.allied_ships(candidate), single.allied_ships()),
+                                              (result.enemy_ships(candidate), single.enemy_ships())):
+                    np.testing.assert_array_equal(ships, expected_ships, err_msg=message)
+
+        if terminated:
+            break
+
+    assert n_hits > 0 and n_removed > 0 and n_batches > 0
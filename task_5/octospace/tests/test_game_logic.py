@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from octospace.envs.game_config import MAX_SHIP_FIRE_RANGE, MOVEMENT_DIRECTIONS
+from octospace.envs.game_logic import _get_targets
+from octospace.envs.ships import ShipStore
+
+
+def _get_target(ship_x: int, ship_y: int, direction: int, enemy_ships: dict):
+    """
+    The per-shooter targeting from before _get_targets: returns id of the first ship, that the ship is facing,
+    if it is in firing range.
+    """
+    if len(enemy_ships.keys()) == 0:
+        return -1
+
+    ship_vec = np.array([ship_x, ship_y], dtype=int)
+    target_vec = np.array([ship_x, ship_y], dtype=int) + MOVEMENT_DIRECTIONS[direction] * MAX_SHIP_FIRE_RANGE
+    target_vec -= ship_vec
+    vec_to_other_ships = np.array([(x, y) for ship_id, (x, y, hp, firing_cooldown, move_cooldown)
+                                   in enemy_ships.items()], dtype=int)
+    vec_to_other_ships = vec_to_other_ships - ship_vec
+    vec_angles = [np.arccos(np.clip(np.dot(vec/np.linalg.norm(vec), target_vec/np.linalg.norm(target_vec)), -1.0, 1.0))
+                  if np.linalg.norm(vec) != 0 else 0 for vec in vec_to_other_ships]
+
+    target_id = -1
+    min_dist = MAX_SHIP_FIRE_RANGE + 1
+    for i in range(len(enemy_ships.keys())):
+
+        # Get all ships between -15 and 15 degrees
+        if -np.pi/12 <= vec_angles[i] <= np.pi/12 and min_dist > np.linalg.norm(vec_to_other_ships[i]):
+            target_id = list(enemy_ships.keys())[i]
+            min_dist = np.linalg.norm(vec_to_other_ships[i])
+    return target_id
+
+
+def _random_fleet(rng: np.random.Generator, n_ships: int, area: int) -> ShipStore:
+    ships = ShipStore()
+    for x, y in rng.integers(0, area, size=(n_ships, 2)).tolist():
+        ships.add(x, y)
+
+    # Some of the ships are already dead, their slots are left behind
+    ships.remove(np.flatnonzero(rng.random(ships.size) < 0.2))
+    return ships
+
+
+def _assert_same_targets(shooters_x, shooters_y, directions, enemy_ships: ShipStore):
+    target_slots = _get_targets(ships_x=shooters_x, ships_y=shooters_y, directions=directions,
+                                enemy_ships=enemy_ships)
+    target_ids = np.where(target_slots != -1, enemy_ships.ship_id[target_slots], -1)
+
+    # Dicts of the old representation kept the ships in the order of their creation
+    slots = enemy_ships.active_slots()
+    enemy_dict = {ship_id: (x, y, 100, 0, 0) for ship_id, x, y
+                  in zip(enemy_ships.ship_id[slots].tolist(), enemy_ships.x[slots].tolist(),
+                         enemy_ships.y[slots].tolist())}
+    expected_ids = [_get_target(x, y, direction, enemy_dict)
+                    for x, y, direction in zip(shooters_x.tolist(), shooters_y.tolist(), directions.tolist())]
+    np.testing.assert_array_equal(target_ids, expected_ids)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_targets_match_per_shooter_targeting(seed):
+    rng = np.random.default_rng(seed)
+
+    # A small area makes ships share tiles and distances, a large one puts them out of range
+    area = int(rng.choice([4, 12, 30]))
+    enemy_ships = _random_fleet(rng, n_ships=int(rng.integers(0, 40)), area=area)
+    n_shooters = int(rng.integers(1, 30))
+    shooters_x, shooters_y = rng.integers(0, area, size=(2, n_shooters))
+    directions = rng.integers(0, 4, size=n_shooters)
+
+    _assert_same_targets(shooters_x, shooters_y, directions, enemy_ships)
+
+
+def test_targets_ties_and_range():
+    enemy_ships = ShipStore()
+    # Two ships at the same distance in the cone, the older one is hit
+    enemy_ships.add(15, 11)
+    enemy_ships.add(15, 9)
+    # Exactly at the firing range, just beyond it, behind the shooter and just outside the cone
+    enemy_ships.add(10 + MAX_SHIP_FIRE_RANGE, 30)
+    enemy_ships.add(10 + MAX_SHIP_FIRE_RANGE + 1, 50)
+    enemy_ships.add(5, 30)
+    enemy_ships.add(14, 72)
+    # On the shooter's tile
+    enemy_ships.add(40, 40)
+    # A younger ship on the tile of the first one
+    enemy_ships.add(15, 11)
+
+    shooters_x = np.array([10, 10, 10, 10, 10, 10, 40])
+    shooters_y = np.array([10, 30, 50, 30, 70, 10, 40])
+    directions = np.array([0, 0, 0, 2, 0, 3, 1])
+    _assert_same_targets(shooters_x, shooters_y, directions, enemy_ships)
+
+    target_slots = _get_targets(ships_x=shooters_x, ships_y=shooters_y, directions=directions,
+                                enemy_ships=enemy_ships)
+    np.testing.assert_array_equal(target_slots, [0, 2, -1, 4, -1, -1, 6])
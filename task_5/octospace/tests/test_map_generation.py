@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+from octospace.envs import map_bank
+from octospace.envs.game_config import (PLANETS_DIAMETER, PLANETS_OFFSET, PLANETS_DISTANCE, FRAC_OF_ASTEROID_AREA,
+                                        BOARD_SIZE, PLAYER_1_ORIGIN, PLAYER_2_ORIGIN, N_PLANETS,
+                                        N_IONIZED_FIELD_FRAMES)
+from octospace.envs.map_bank import MapBank, generate_map_bank
+from octospace.envs.map_generation import (N_IONIZED_FIELDS, _generate_map, _generate_planet,
+                                           _add_base_planet_occupation, _sample_planet_centers)
+from octospace.envs.schemes import ASTEROID_ID_TO_SCHEME, ASTEROID_AREA
+from octospace.envs.utils import NoSpaceOnMapException
+
+N_MAPS = 400
+
+
+def _rejection_sampling_map(rng: np.random.Generator):
+    """
+    The map generator from before the rejection-free sampling, without its attempt limits.
+    """
+    game_map = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=int)
+    centers = [PLAYER_1_ORIGIN, PLAYER_2_ORIGIN]
+    for _ in range(N_PLANETS):
+        new_planet_center = rng.integers(PLANETS_OFFSET, BOARD_SIZE - PLANETS_OFFSET, size=2, dtype=int)
+        while np.min(np.linalg.norm(np.array(centers) - new_planet_center, axis=1)) <= PLANETS_DISTANCE:
+            new_planet_center = rng.integers(PLANETS_OFFSET, BOARD_SIZE - PLANETS_OFFSET, size=2, dtype=int)
+        centers.append(new_planet_center)
+
+    _add_base_planet_occupation(game_map=game_map, centers=centers)
+    centers = np.array(centers[2:], dtype=int)
+    for planet_center in centers:
+        left_upper = (planet_center[0] - 4, planet_center[1] - 4)
+        game_map[left_upper[0]:left_upper[0] + PLANETS_DIAMETER, left_upper[1]:left_upper[1] + PLANETS_DIAMETER] = (
+            _generate_planet(rng))
+
+    area_left = int(BOARD_SIZE ** 2 * FRAC_OF_ASTEROID_AREA)
+    max_asteroid_area = np.max(list(ASTEROID_AREA.values()))
+    while area_left >= max_asteroid_area:
+        asteroid_id = rng.integers(0, len(ASTEROID_AREA.keys()), size=1, dtype=int)[0]
+        asteroid_scheme = ASTEROID_ID_TO_SCHEME[asteroid_id]
+        while True:
+            top = rng.integers(0, BOARD_SIZE - asteroid_scheme.shape[0], size=1, dtype=int)[0]
+            left = rng.integers(0, BOARD_SIZE - asteroid_scheme.shape[1], size=1, dtype=int)[0]
+            area = game_map[top:top + asteroid_scheme.shape[0], left:left + asteroid_scheme.shape[1]]
+            if np.sum(asteroid_scheme * area) == 0:
+                break
+        area += asteroid_scheme
+        area_left -= ASTEROID_AREA[asteroid_id]
+
+    ionized_field_id = {}
+    while len(ionized_field_id) < N_IONIZED_FIELDS:
+        y, x = rng.integers(0, BOARD_SIZE, size=2, dtype=int)
+        if not game_map[y, x]:
+            game_map[y, x] = 4
+            ionized_field_id[(y, x)] = rng.integers(0, N_IONIZED_FIELD_FRAMES - 1)
+    return game_map, centers, ionized_field_id
+
+
+def _map_statistics(generate_map, seeds):
+    """
+    Returns the distances from every unoccupied planet to its closest planet, the numbers of asteroid tiles per map
+    and the (n_maps, 10, 10) densities of the asteroid tiles in the 10x10 blocks of every map.
+    """
+    spacings, asteroid_counts, asteroid_densities = [], [], []
+    for seed in seeds:
+        game_map, centers, ionized_field_id = generate_map(np.random.default_rng(seed))
+        assert len(ionized_field_id) == N_IONIZED_FIELDS
+
+        all_centers = np.concatenate([[PLAYER_1_ORIGIN, PLAYER_2_ORIGIN], centers])
+        distances = np.linalg.norm(all_centers[:, None] - all_centers[None], axis=2)
+        np.fill_diagonal(distances, np.inf)
+        spacings.extend(distances[2:].min(axis=1))
+
+        asteroids = game_map == 2
+        asteroid_counts.append(np.count_nonzero(asteroids))
+        asteroid_densities.append(asteroids.reshape(10, BOARD_SIZE // 10, 10, BOARD_SIZE // 10).mean(axis=(1, 3)))
+    return np.array(spacings), np.array(asteroid_counts), np.array(asteroid_densities)
+
+
+def _assert_same_distribution(samples, expected_samples):
+    # Two-sample Kolmogorov-Smirnov test at the significance level of 0.001
+    values = np.union1d(samples, expected_samples)
+    cdf = np.searchsorted(np.sort(samples), values, side="right") / len(samples)
+    expected_cdf = np.searchsorted(np.sort(expected_samples), values, side="right") / len(expected_samples)
+    n, m = len(samples), len(expected_samples)
+    assert np.abs(cdf - expected_cdf).max() < 1.95 * np.sqrt((n + m) / (n * m))
+
+
+def test_generated_maps_match_rejection_sampling():
+    spacings, asteroid_counts, asteroid_densities = _map_statistics(_generate_map, range(N_MAPS))
+    expected_spacings, expected_asteroid_counts, expected_asteroid_densities = _map_statistics(
+        _rejection_sampling_map, range(N_MAPS, 2 * N_MAPS))
+
+    _assert_same_distribution(spacings, expected_spacings)
+    _assert_same_distribution(asteroid_counts, expected_asteroid_counts)
+
+    # Mean asteroid density of every block of the board, within 4 standard errors of the difference
+    standard_errors = np.sqrt((asteroid_densities.var(axis=0) + expected_asteroid_densities.var(axis=0)) / N_MAPS)
+    difference = np.abs(asteroid_densities.mean(axis=0) - expected_asteroid_densities.mean(axis=0))
+    assert np.all(difference <= 4 * standard_errors + 1e-3)
+
+
+def test_map_bank_stores_maps_with_fewer_ionized_fields(tmp_path, monkeypatch):
+    generate_map_bank(str(tmp_path), n_maps=3, first_seed=5, n_workers=1)
+    bank = MapBank(str(tmp_path))
+    for seed in range(5, 8):
+        game_map, planets_centers, ionized_field_id, state_ids = bank.get(seed)
+        expected_map, expected_centers, expected_ionized_field_id = _generate_map(np.random.default_rng(seed))
+        np.testing.assert_array_equal(game_map, expected_map)
+        assert ionized_field_id == expected_ionized_field_id
+
+    # A map, on which not all the ionized fields fit
+    def generate_crowded_map(rng):
+        game_map, centers, ionized_field_id = _generate_map(rng)
+        return game_map, centers, dict(list(ionized_field_id.items())[:N_IONIZED_FIELDS - 4])
+
+    monkeypatch.setattr(map_bank, "_generate_map", generate_crowded_map)
+    map_bank._generate_maps(str(tmp_path), first_seed=5, start=0, stop=3)
+
+    bank = MapBank(str(tmp_path))
+    for seed in range(5, 8):
+        ionized_field_id = bank.get(seed)[2]
+        assert len(ionized_field_id) == N_IONIZED_FIELDS - 4
+        assert ionized_field_id == generate_crowded_map(np.random.default_rng(seed))[2]
+
+
+def test_planets_never_overlap():
+    # A planet further than PLANETS_DISTANCE from the others doesn't touch them, when there is no such position left
+    # the generator fails instead of placing overlapping planets
+    rng = np.random.default_rng(0)
+    with pytest.raises(NoSpaceOnMapException):
+        _sample_planet_centers([PLAYER_1_ORIGIN, PLAYER_2_ORIGIN], n_planets=40, rng=rng)
+
+    for seed in range(50):
+        centers = np.concatenate([[PLAYER_1_ORIGIN, PLAYER_2_ORIGIN],
+                                  _sample_planet_centers([PLAYER_1_ORIGIN, PLAYER_2_ORIGIN], N_PLANETS,
+                                                         np.random.default_rng(seed))])
+        distances = np.linalg.norm(centers[:, None] - centers[None], axis=2)
+        np.fill_diagonal(distances, np.inf)
+        assert distances.min() > PLANETS_DISTANCE > PLANETS_DIAMETER
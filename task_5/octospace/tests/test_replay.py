@@ -0,0 +1,49 @@
+import numpy as np
+
+from octospace.envs.octospace import OctoSpaceEnv
+from octospace.envs.replay import ReplayRecorder, ReplayPlayer
+
+
+def _record_game(directory, n_steps=120, keyframe_turns=20):
+    env = ReplayRecorder(OctoSpaceEnv(player_1_id=46, player_2_id=47, max_steps=n_steps, seed=3),
+                         directory=str(directory), keyframe_turns=keyframe_turns)
+    rng = np.random.default_rng(0)
+    obs, info = env.reset()
+    for _ in range(n_steps):
+        actions = {}
+        for player in ("player_1", "player_2"):
+            ships_actions = [[int(ship[0]), 0, int(rng.integers(4)), int(rng.integers(1, 4))]
+                             for ship in obs[player]["allied_ships"]]
+            actions[player] = {"ships_actions": ships_actions, "construction": 1}
+        obs, reward, terminated, truncated, info = env.step(actions)
+        if terminated or sum(reward.values()) != 0:
+            break
+    env.close()
+    return env.paths[0]
+
+
+def _assert_same_state(env, expected_env):
+    assert (env.player_1_id, env.player_2_id) == (expected_env.player_1_id, expected_env.player_2_id)
+    arrays, expected_arrays = env.get_state().to_arrays(), expected_env.get_state().to_arrays()
+    assert arrays.keys() == expected_arrays.keys()
+    for key in arrays:
+        np.testing.assert_array_equal(arrays[key], expected_arrays[key], err_msg=key)
+
+
+def test_seek_backwards_past_keyframe_keeps_sides(tmp_path):
+    path = _record_game(tmp_path)
+
+    player = ReplayPlayer(path)
+    player.seek(100)
+    player.seek(5)
+
+    fresh_player = ReplayPlayer(path)
+    fresh_player.seek(5)
+
+    assert (player.env.player_1_id, player.env.player_2_id) == (46, 47)
+    _assert_same_state(player.env, fresh_player.env)
+
+    # The game goes on as recorded after the restart
+    player.seek(100)
+    fresh_player.seek(100)
+    _assert_same_state(player.env, fresh_player.env)
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+pytest.importorskip("torch")
+
+from simulation import AgentTimer
+
+
+class RunawayAgent:
+    """
+    Busy loops for seconds and swallows every Exception raised in the loop.
+    """
+
+    def get_action(self, obs: dict) -> dict:
+        end = time.perf_counter() + 5.0
+        while time.perf_counter() < end:
+            try:
+                sum(range(1000))
+            except Exception:
+                pass
+        return {"ships_actions": [[0, 0, 1, 1]], "construction": 1}
+
+
+class SlowAgent:
+    def get_action(self, obs: dict) -> dict:
+        time.sleep(0.05)
+        return {"ships_actions": [[0, 0, 1, 1]], "construction": 1}
+
+
+class FastAgent:
+    def get_action(self, obs: dict) -> dict:
+        return {"ships_actions": [[0, 0, 1, 1]], "construction": 1}
+
+
+def test_deadline_interrupts_agent_catching_exceptions():
+    timer = AgentTimer(deadline=0.05)
+
+    start = time.perf_counter()
+    action = timer.get_action(RunawayAgent(), obs={})
+
+    assert time.perf_counter() - start < 1.0
+    assert action == {"ships_actions": [], "construction": 0}
+    assert timer.missed_deadlines == 1
+
+
+def test_late_action_is_replaced_and_counted():
+    timer = AgentTimer(deadline=0.01)
+    for _ in range(3):
+        assert timer.get_action(SlowAgent(), obs={}) == {"ships_actions": [], "construction": 0}
+    assert timer.get_action(FastAgent(), obs={}) == {"ships_actions": [[0, 0, 1, 1]], "construction": 1}
+
+    summary = timer.summary()
+    assert summary["turns"] == 4
+    assert summary["missed_deadlines"] == 3
+    assert summary["max_ms"] >= 10
+    assert sum(summary["histogram"]) == 4
+
+
+def test_no_deadline_only_measures():
+    timer = AgentTimer()
+    assert timer.get_action(SlowAgent(), obs={}) == {"ships_actions": [[0, 0, 1, 1]], "construction": 1}
+    assert timer.summary()["missed_deadlines"] == 0
@@ -0,0 +1,66 @@
+import threading
+import time
+
+import pytest
+
+from octospace.envs import sound
+
+
+@pytest.fixture
+def audio_worker(monkeypatch):
+    """
+    Replaces the playing of the sounds with the given function of the sounds queue.
+    """
+    monkeypatch.setattr(sound, "AUDIO_WORKER_STOP_TIMEOUT", 0.2)
+
+    def start(play_sounds):
+        monkeypatch.setattr(sound, "_play_sounds", play_sounds)
+        for _ in range(sound.MAX_QUEUED_TURNS + 2):
+            sound.play_shoot_sound(volume=1.0)
+            sound.flush_sounds()
+        return sound._audio_worker
+
+    yield start
+    sound.stop_audio_worker()
+
+
+def _stop_time() -> float:
+    start = time.perf_counter()
+    sound.stop_audio_worker()
+    return time.perf_counter() - start
+
+
+def test_stop_audio_worker(audio_worker):
+    def play_sounds(sounds_queue):
+        while sounds_queue.get() is not None:
+            time.sleep(0.01)
+
+    worker = audio_worker(play_sounds)
+    assert _stop_time() < 1.0
+    assert not worker.is_alive()
+    assert sound._audio_worker is None
+
+
+def test_stop_stuck_audio_worker(audio_worker):
+    # The worker never takes anything from the full queue
+    release = threading.Event()
+    worker = audio_worker(lambda sounds_queue: release.wait())
+    assert sound._sounds_queue.full()
+
+    assert _stop_time() < 1.0
+    assert sound._audio_worker is None
+    release.set()
+    worker.join()
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_stop_dead_audio_worker(audio_worker):
+    def play_sounds(sounds_queue):
+        sounds_queue.get()
+        raise RuntimeError("mixer failed")
+
+    worker = audio_worker(play_sounds)
+    worker.join()
+
+    assert _stop_time() < 0.1
+    assert sound._audio_worker is None
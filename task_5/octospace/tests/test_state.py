@@ -0,0 +1,80 @@
+import numpy as np
+
+from octospace.envs.octospace import OctoSpaceEnv
+
+PLAYERS = ("player_1", "player_2")
+
+
+def _scripted_actions(obs: dict, rng: np.random.Generator) -> dict:
+    """
+    Ships wander towards the enemy's base, capturing the planets on the way, and fire at random.
+    """
+    actions = {}
+    for side, player in enumerate(PLAYERS):
+        ships_actions = []
+        for ship_id in obs[player]["allied_ships"][:, 0].tolist():
+            if rng.random() < 0.2:
+                ships_actions.append([ship_id, 1, int(rng.integers(4))])
+            else:
+                direction = int(rng.choice([0, 1] if side == 0 else [2, 3])) if rng.random() < 0.7 else int(
+                    rng.integers(4))
+                ships_actions.append([ship_id, 0, direction, int(rng.integers(1, 4))])
+        actions[player] = {"ships_actions": ships_actions, "construction": int(rng.integers(0, 2))}
+    return actions
+
+
+def _assert_same_state(env, expected_env, message: str = ""):
+    arrays, expected_arrays = env.get_state().to_arrays(), expected_env.get_state().to_arrays()
+    assert arrays.keys() == expected_arrays.keys()
+    for key in arrays:
+        np.testing.assert_array_equal(arrays[key], expected_arrays[key], err_msg=f"{message} {key}")
+
+
+def _play(env, obs: dict, n_steps: int, rng: np.random.Generator):
+    for _ in range(n_steps):
+        obs, reward, terminated, truncated, info = env.step(_scripted_actions(obs, rng))
+    return obs
+
+
+def test_restored_states_continue_like_replayed_game():
+    # On this map both of the branches below capture planets, which modifies the shared map
+    n_steps = 50
+    env = OctoSpaceEnv(player_1_id=1, player_2_id=2, max_steps=1000, seed=3)
+    obs, info = env.reset()
+    obs = _play(env, obs, n_steps, np.random.default_rng(0))
+
+    state = env.get_state()
+    saved_arrays = {key: np.copy(value) for key, value in state.to_arrays().items()}
+    clone = env.clone()
+    _assert_same_state(clone, env)
+
+    # Both of them play their own game on the shared arrays, with different actions
+    _play(env, obs, 2 * n_steps, np.random.default_rng(1))
+    _play(clone, obs, 2 * n_steps, np.random.default_rng(2))
+    assert np.any(env._map != state.game_map) and np.any(clone._map != state.game_map)
+    assert np.any(env._map != clone._map)
+
+    # Neither of them wrote into the saved state
+    arrays = state.to_arrays()
+    for key in saved_arrays:
+        np.testing.assert_array_equal(arrays[key], saved_arrays[key], err_msg=key)
+
+    env.set_state(state)
+    clone.set_state(state)
+
+    # A new environment plays the same game up to the saved state
+    fresh_env = OctoSpaceEnv(player_1_id=1, player_2_id=2, max_steps=1000, seed=3)
+    fresh_obs, info = fresh_env.reset()
+    fresh_obs = _play(fresh_env, fresh_obs, n_steps, np.random.default_rng(0))
+    _assert_same_state(env, fresh_env)
+    _assert_same_state(clone, fresh_env)
+
+    rng = np.random.default_rng(3)
+    for step in range(2 * n_steps):
+        actions = _scripted_actions(fresh_obs, rng)
+        fresh_obs, *_ = fresh_env.step(actions)
+        for restored_env in (env, clone):
+            obs, *_ = restored_env.step(actions)
+            _assert_same_state(restored_env, fresh_env, f"step {step}")
+            for player in PLAYERS:
+                np.testing.assert_array_equal(obs[player]["map"], fresh_obs[player]["map"])
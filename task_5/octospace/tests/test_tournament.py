@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+pytest.importorskip("torch")
+
+from tournament import MATCH_POINTS, run_tournament, _load_results
+
+IDLE_AGENT = '''
+class Agent:
+    def __init__(self, side):
+        self.side = side
+
+    def get_action(self, obs):
+        return {"ships_actions": [], "construction": 0}
+
+    def load(self, abs_path):
+        pass
+
+    def eval(self):
+        pass
+
+    def to(self, device):
+        pass
+'''
+
+CRASHING_AGENT = IDLE_AGENT.replace('return {"ships_actions": [], "construction": 0}',
+                                    'raise RuntimeError("crashed")')
+
+
+def _write_agents(tmp_path, **sources):
+    paths = []
+    for name, source in sources.items():
+        path = tmp_path / f"{name}.py"
+        path.write_text(source)
+        paths.append(str(path))
+    return paths
+
+
+def test_crashing_agent_forfeits_and_tournament_goes_on(tmp_path):
+    idle_1, crashing, idle_2 = _write_agents(tmp_path, idle_1=IDLE_AGENT, crashing=CRASHING_AGENT, idle_2=IDLE_AGENT)
+    results_path = tmp_path / "results.jsonl"
+
+    points = run_tournament([idle_1, crashing, idle_2], n_matches=1, n_workers=1, results_path=str(results_path))
+
+    results = [json.loads(line) for line in results_path.read_text().splitlines()]
+    assert len(results) == 3
+
+    forfeits = [result for result in results if "forfeit" in result]
+    assert len(forfeits) == 2
+    for result in forfeits:
+        assert result["forfeit"] == crashing
+        assert "crashed" in result["error"]
+        assert result["score"][[result["agent_1"], result["agent_2"]].index(crashing)] == 0.0
+
+    played = [result for result in results if "forfeit" not in result]
+    assert len(played) == 1 and "latency" in played[0]
+
+    assert points[crashing] == 0.0
+    assert points[idle_1] == points[idle_2] == MATCH_POINTS + sum(played[0]["score"]) / 2
+
+
+def test_crashed_worker_is_recorded_and_replayed_on_resume(tmp_path):
+    exiting_agent = IDLE_AGENT.replace('return {"ships_actions": [], "construction": 0}', 'import os; os._exit(1)')
+    idle, exiting = _write_agents(tmp_path, idle=IDLE_AGENT, exiting=exiting_agent)
+    results_path = tmp_path / "results.jsonl"
+
+    points = run_tournament([idle, exiting], n_matches=1, n_workers=1, results_path=str(results_path))
+
+    results = [json.loads(line) for line in results_path.read_text().splitlines()]
+    assert len(results) == 1
+    assert "error" in results[0] and "forfeit" not in results[0]
+    assert points == {idle: 0.0, exiting: 0.0}
+
+    # The failed match isn't taken for finished
+    assert _load_results(str(results_path)) == {}
+
+
+def test_swiss_tournament_finishes_after_worker_crash(tmp_path):
+    exiting_agent = IDLE_AGENT.replace('return {"ships_actions": [], "construction": 0}', 'import os; os._exit(1)')
+    agent_paths = _write_agents(tmp_path, idle_1=IDLE_AGENT, exiting=exiting_agent, idle_2=IDLE_AGENT,
+                                idle_3=IDLE_AGENT)
+    results_path = tmp_path / "results.jsonl"
+
+    points = run_tournament(agent_paths, tournament_format="swiss", n_matches=1, n_rounds=2, n_workers=1,
+                            results_path=str(results_path))
+
+    results = [json.loads(line) for line in results_path.read_text().splitlines()]
+    assert len(results) == 4
+    assert set(points) == set(agent_paths)
@@ -0,0 +1,106 @@
+import copy
+
+import numpy as np
+import pytest
+
+from octospace.envs.game_config import N_PLANETS
+from octospace.envs.octospace import OctoSpaceEnv
+from octospace.envs.vector import OctoSpaceVecEnv
+
+PLAYERS = ("player_1", "player_2")
+
+
+def _scripted_action(obs: dict, side: int, rng: np.random.Generator) -> dict:
+    """
+    Ships fire at the closest visible enemy or head to the enemy's base, so that the games have fights, captures and
+    asteroid fields on the way.
+    """
+    ships_actions = []
+    enemies = obs["enemy_ships"].tolist()
+    for ship_id, x, y, *_ in obs["allied_ships"].tolist():
+        if enemies and rng.random() < 0.5:
+            enemy_x, enemy_y = min(((ex, ey) for _, ex, ey, *_ in enemies),
+                                   key=lambda enemy: abs(enemy[0] - x) + abs(enemy[1] - y))
+            dx, dy = enemy_x - x, enemy_y - y
+        else:
+            dx, dy = (1, 1) if side == 0 else (-1, -1)
+            if rng.random() < 0.3:
+                dx, dy = rng.integers(-1, 2, size=2).tolist()
+
+        direction = (0 if dx > 0 else 2) if abs(dx) >= abs(dy) else (1 if dy > 0 else 3)
+        if enemies and rng.random() < 0.5:
+            ships_actions.append([ship_id, 1, direction])
+        else:
+            ships_actions.append([ship_id, 0, direction, int(rng.integers(1, 4))])
+    return {"ships_actions": ships_actions, "construction": int(rng.integers(0, 3))}
+
+
+def _single_env(vec_env: OctoSpaceVecEnv, game: int, max_steps: int) -> tuple[OctoSpaceEnv, dict]:
+    """
+    Returns a new environment playing the current game of the vector environment from its first turn, and the
+    environment's first observation.
+    """
+    game_map = vec_env._maps[game].copy()
+    ionized_field_id = {(y, x): 0 for y, x in np.argwhere(game_map == 4).tolist()}
+    env = OctoSpaceEnv(player_1_id=1, player_2_id=2, max_steps=max_steps)
+    obs, info = env.reset(options={"map": (game_map, vec_env._planets_centers[game, 2:].copy(), ionized_field_id,
+                                           np.zeros_like(game_map))})
+    return env, obs
+
+
+def _assert_same_obs(obs: dict, expected_obs: dict, message: str):
+    for player in PLAYERS:
+        for key in ("map", "allied_ships", "enemy_ships", "resources"):
+            np.testing.assert_array_equal(obs[player][key], expected_obs[player][key],
+                                          err_msg=f"{message} {player} {key}")
+        assert ([tuple(map(int, planet)) for planet in obs[player]["planets_occupation"]] ==
+                [tuple(map(int, planet)) for planet in expected_obs[player]["planets_occupation"]]), \
+            f"{message} {player} planets_occupation"
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_vector_env_matches_single_envs(seed):
+    # The fleets meet after about 250 turns, shorter games are truncated and reset without fights
+    max_steps, n_games, n_steps = 350, 3, 800
+    vec_env = OctoSpaceVecEnv(num_envs=n_games, max_steps=max_steps, seed=seed)
+    vec_obs, info = vec_env.reset()
+    assert vec_env._planets_centers.shape[1] == N_PLANETS + 2
+
+    envs, done = [], np.zeros(n_games, dtype=bool)
+    for game in range(n_games):
+        env, obs = _single_env(vec_env, game, max_steps)
+        _assert_same_obs(vec_obs[game], obs, f"reset of game {game}")
+        envs.append(env)
+
+    rng = np.random.default_rng(seed)
+    n_finished, n_enemies_seen = 0, 0
+    for step in range(n_steps):
+        actions = [{player: _scripted_action(vec_obs[game][player], side, rng) for side, player in enumerate(PLAYERS)}
+                   for game in range(n_games)]
+        vec_obs, rewards, terminated, truncated, info = vec_env.step(copy.deepcopy(actions))
+
+        for game in range(n_games):
+            message = f"game {game} at step {step}"
+            if done[game]:
+                # The finished game was reset, the new one starts with zero rewards
+                envs[game], obs = _single_env(vec_env, game, max_steps)
+                _assert_same_obs(vec_obs[game], obs, message)
+                assert not terminated[game] and not truncated[game]
+                np.testing.assert_array_equal(rewards[game], [0, 0])
+                done[game] = False
+                continue
+
+            obs, reward, env_terminated, env_truncated, env_info = envs[game].step(copy.deepcopy(actions[game]))
+            _assert_same_obs(vec_obs[game], obs, message)
+            np.testing.assert_array_equal(rewards[game], [reward[player] for player in PLAYERS], err_msg=message)
+
+            # The single environment reports the end of the time limit as terminated
+            assert env_terminated == (terminated[game] or truncated[game]), message
+            assert not (terminated[game] and truncated[game]), message
+            assert not env_truncated
+            done[game] = env_terminated
+            n_finished += int(env_terminated)
+            n_enemies_seen += len(obs["player_1"]["enemy_ships"])
+
+    assert n_finished >= 2 * n_games
+    assert n_enemies_seen > 0
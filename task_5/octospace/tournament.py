@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import random
+import traceback
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from importlib.machinery import SourceFileLoader
+
+import gymnasium as gym
+import numpy as np
+
+from simulation import simulate_game
+
+# Points of both rounds of a match, all of them go to the opponent of an agent, which forfeits the match
+MATCH_POINTS = 2.0
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Run a tournament between agents on a pool of processes')
+    parser.add_argument('agent_paths', type=str, nargs='+', help="Paths to the agents' files")
+    parser.add_argument('--format', type=str, default='round_robin', choices=['round_robin', 'swiss'],
+                        help='Tournament format')
+    parser.add_argument('--n_matches', type=int, default=3, help='Number of matches between every pair of agents')
+    parser.add_argument('--n_rounds', type=int, default=3, help='Number of rounds of the swiss tournament')
+    parser.add_argument('--n_workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--seed', type=int, default=0, help='Base seed of the tournament')
+    parser.add_argument('--results', type=str, default='tournament_results.jsonl',
+                        help='File with the results, the tournament resumes from it if it already exists')
+    parser.add_argument('--replays', type=str, default=None,
+                        help='Directory, where the games are recorded, in a subdirectory named after the match seed')
+    parser.add_argument('--turn_deadline', type=float, default=None,
+                        help='Time in seconds an agent has to return its action, otherwise it skips the turn')
+    return parser
+
+
+def _match_key(tournament_round: int, agent_1_path: str, agent_2_path: str, match: int) -> str:
+    return f"{tournament_round}:{agent_1_path}:{agent_2_path}:{match}"
+
+
+def _match_seed(seed: int, key: str) -> int:
+    # Seeds depend only on the match itself, not on the order in which the workers pick the matches up
+    return zlib.crc32(f"{seed}:{key}".encode())
+
+
+def _play_match(agent_1_path: str, agent_2_path: str, seed: int, replay_dir: str = None, turn_deadline: float = None):
+    """
+    Plays a single match (2 rounds, so that both agents play on both sides) in a worker process.
+    Returns the fields of the match's result: the score and the latencies of the agents. An agent, which raises
+    an exception, forfeits the match, then the result names it and holds the error instead of the latencies.
+    """
+    gym.logger.min_level = 40
+
+    # The environment is seeded through simulate_game, the global generators are seeded for the agents
+    random.seed(seed)
+    np.random.seed(seed)
+
+    try:
+        agent_1 = SourceFileLoader('agent_1', agent_1_path).load_module()
+        agent_2 = SourceFileLoader('agent_2', agent_2_path).load_module()
+
+        score, latency = simulate_game(player_1_id=46, player_2_id=47, player_1_agent_class=agent_1.Agent,
+                                       player_2_agent_class=agent_2.Agent, n_games=1, render_mode=None, seed=seed,
+                                       replay_dir=replay_dir, turn_deadline=turn_deadline, return_latency=True)
+    except Exception as e:
+        failing_agent_path = _failing_agent(e, agent_1_path, agent_2_path)
+        if failing_agent_path is None:
+            raise
+        score = [0.0, MATCH_POINTS] if failing_agent_path == agent_1_path else [MATCH_POINTS, 0.0]
+        return {"score": score, "forfeit": failing_agent_path, "error": repr(e)}
+    return {"score": score.tolist(), "latency": latency}
+
+
+def _failing_agent(error: Exception, agent_1_path: str, agent_2_path: str):
+    """
+    Returns the path of the agent, in whose code the error was raised, None if it wasn't raised by an agent.
+    """
+    agent_paths = {os.path.abspath(agent_path): agent_path for agent_path in (agent_1_path, agent_2_path)}
+    for frame in reversed(traceback.extract_tb(error.__traceback__)):
+        agent_path = agent_paths.get(os.path.abspath(frame.filename))
+        if agent_path is not None:
+            return agent_path
+    return None
+
+
+def _load_results(results_path: str) -> dict:
+    """
+    Reads the results of the matches finished so far. A line cut off by an interrupted write and a match, which
+    failed without a fault of an agent (see _play_matches), are skipped, so the match will be played again.
+    """
+    results = {}
+    if not os.path.exists(results_path):
+        return results
+
+    with open(results_path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" in result and "forfeit" not in result:
+                continue
+            results[result["key"]] = result
+    return results
+
+
+def _play_matches(
+    pairs: list,
+    tournament_round: int,
+    n_matches: int,
+    seed: int,
+    results: dict,
+    results_path: str,
+    executor: ProcessPoolExecutor,
+    replays_path: str = None,
+    turn_deadline: float = None
+):
+    """
+    Plays n_matches between every pair of agents, skipping the matches already present in the results.
+    Every finished match is immediately appended to the results file.
+
+    A failed match doesn't stop the tournament. If an agent raised an exception, it forfeits the match. Any other
+    failure (a crashed worker, an error of the engine) is recorded with no points for either agent and the match
+    is played again when the tournament is resumed.
+    """
+    futures = {}
+    failed = []
+    for agent_1_path, agent_2_path in pairs:
+        for match in range(n_matches):
+            key = _match_key(tournament_round, agent_1_path, agent_2_path, match)
+            if key in results:
+                continue
+
+            match_seed = _match_seed(seed, key)
+            replay_dir = None if replays_path is None else os.path.join(replays_path, str(match_seed))
+            match_info = {"key": key, "round": tournament_round, "agent_1": agent_1_path, "agent_2": agent_2_path,
+                          "match": match, "seed": match_seed}
+            if replay_dir is not None:
+                match_info["replays"] = replay_dir
+
+            # A worker, which crashed in an earlier round, leaves the pool broken
+            try:
+                futures[executor.submit(_play_match, agent_1_path, agent_2_path, match_seed, replay_dir,
+                                        turn_deadline)] = match_info
+            except BrokenProcessPool as e:
+                failed.append(dict(match_info, score=[0.0, 0.0], error=repr(e)))
+
+    def finished_matches():
+        yield from failed
+        for future in as_completed(futures):
+            try:
+                yield dict(futures[future], **future.result())
+            except Exception as e:
+                yield dict(futures[future], score=[0.0, 0.0], error=repr(e))
+
+    with open(results_path, 'a') as f:
+        for result in finished_matches():
+            results[result["key"]] = result
+
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+            if "forfeit" in result:
+                print(f'{result["agent_1"]} vs {result["agent_2"]}: {result["score"]}, '
+                      f'{result["forfeit"]} forfeits: {result["error"]}')
+            elif "error" in result:
+                print(f'{result["agent_1"]} vs {result["agent_2"]}: failed: {result["error"]}')
+            else:
+                latency = result["latency"]
+                print(f'{result["agent_1"]} vs {result["agent_2"]}: {result["score"]}, '
+                      f'p95 latency {latency["agent_1"]["p95_ms"]:.1f} / {latency["agent_2"]["p95_ms"]:.1f} ms, '
+                      f'missed deadlines {latency["agent_1"]["missed_deadlines"]} / '
+                      f'{latency["agent_2"]["missed_deadlines"]}')
+
+
+def _get_standings(agent_paths: list, results: dict) -> dict:
+    points = {agent_path: 0.0 for agent_path in agent_paths}
+    for result in results.values():
+        if result["agent_1"] in points and result["agent_2"] in points:
+            points[result["agent_1"]] += result["score"][0]
+            points[result["agent_2"]] += result["score"][1]
+    return points
+
+
+def _swiss_pairs(agent_paths: list, results: dict, tournament_round: int) -> list:
+    """
+    Pairs the agents with similar points, avoiding rematches if possible. Ties are broken by the order of the agents
+    on the command line, so the pairing is fully determined by the results of the previous rounds.
+    With an odd number of agents the last one in the standings gets a bye.
+    """
+    previous = {result_key: result for result_key, result in results.items() if result["round"] < tournament_round}
+    points = _get_standings(agent_paths, previous)
+    played = {frozenset((result["agent_1"], result["agent_2"])) for result in previous.values()}
+
+    unpaired = sorted(agent_paths, key=lambda agent_path: (-points[agent_path], agent_paths.index(agent_path)))
+    pairs = []
+    while len(unpaired) > 1:
+        agent_path = unpaired.pop(0)
+        opponent = next((other for other in unpaired if frozenset((agent_path, other)) not in played), unpaired[0])
+        unpaired.remove(opponent)
+        pairs.append((agent_path, opponent))
+    return pairs
+
+
+def run_tournament(
+        agent_paths: list,
+        tournament_format: str = 'round_robin',
+        n_matches: int = 3,
+        n_rounds: int = 3,
+        n_workers: int = None,
+        seed: int = 0,
+        results_path: str = 'tournament_results.jsonl',
+        replays_path: str = None,
+        turn_deadline: float = None
+):
+    agent_paths = [os.path.normpath(agent_path) for agent_path in agent_paths]
+    assert len(set(agent_paths)) == len(agent_paths) >= 2, "The tournament requires at least 2 distinct agents"
+
+    results = _load_results(results_path)
+    if results:
+        print(f'Resuming the tournament, {len(results)} matches already played')
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        try:
+            if tournament_format == 'round_robin':
+                pairs = [(agent_1_path, agent_2_path) for i, agent_1_path in enumerate(agent_paths)
+                         for agent_2_path in agent_paths[i + 1:]]
+                _play_matches(pairs=pairs, tournament_round=0, n_matches=n_matches, seed=seed, results=results,
+                              results_path=results_path, executor=executor, replays_path=replays_path,
+                              turn_deadline=turn_deadline)
+            else:
+                for tournament_round in range(n_rounds):
+                    pairs = _swiss_pairs(agent_paths, results, tournament_round)
+                    _play_matches(pairs=pairs, tournament_round=tournament_round, n_matches=n_matches, seed=seed,
+                                  results=results, results_path=results_path, executor=executor,
+                                  replays_path=replays_path, turn_deadline=turn_deadline)
+        except KeyboardInterrupt:
+            # Finished matches are already saved, running them again will resume the tournament
+            executor.shutdown(wait=False, cancel_futures=True)
+            print(f'Tournament stopped, {len(results)} matches saved to {results_path}')
+            raise
+
+    points = _get_standings(agent_paths, results)
+    for place, agent_path in enumerate(sorted(agent_paths, key=lambda agent_path: -points[agent_path])):
+        print(f'{place + 1}. {agent_path}: {points[agent_path]}')
+    return points
+
+
+if __name__ == '__main__':
+    parse = get_parser()
+    args = parse.parse_args()
+
+    run_tournament(agent_paths=args.agent_paths, tournament_format=args.format, n_matches=args.n_matches,
+                   n_rounds=args.n_rounds, n_workers=args.n_workers, seed=args.seed, results_path=args.results,
+                   replays_path=args.replays, turn_deadline=args.turn_deadline)
+
+    """
+    Example execution:
+        python tournament.py cudabot/cuda_agent.py src/*_agent.py --n_workers=8 --results=results.jsonl
+
+    Stopping the tournament (Ctrl+C) keeps the results of the finished matches,
+    running the same command again plays only the missing ones.
+
+    With --replays=replays/ every game is recorded and can be watched again without the agents:
+        python -m octospace.envs.replay replays/<match seed>/game_0000.replay
+    """